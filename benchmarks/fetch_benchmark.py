@@ -0,0 +1,127 @@
+# Fetch throughput benchmark against the local mock GeoGuessr API
+#
+#   python -m benchmarks.fetch_benchmark --games 500 --latency-ms 50 --concurrency 8
+#
+# Starts benchmarks/mock_server.py in-process (or uses --url), runs a full fetch in each mode and prints
+# games/second. Nothing is written under output/.
+
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import tempfile
+import threading
+import time
+
+# Progress bars would interleave with the report.
+os.environ.setdefault("TQDM_DISABLE", "1")
+
+from benchmarks.mock_server import MOCK_PLAYER_ID, MockConfig, make_server, synthetic_duel
+from geoguessr.async_geoguessr import AsyncGeoguessr, async_fetch_available
+from geoguessr.game import GameType, GeoguessrDuelGame
+from geoguessr.geoguessr import Geoguessr
+from geoguessr.ratelimit import RateLimiter
+from geoguessr.usernames import UsernameCache
+
+MODES = ["sequential", "concurrent", "async"]
+
+
+def _run_fetch(mode: str, url: str, games: int, concurrency: int, rate: float, username_cache_path: str) -> tuple[Geoguessr, float]:
+    fetch_args = ("benchmark", "benchmark-cookie", "", "", "", "", "")
+    fetch_kwargs = {
+        "max_games": games,
+        "concurrency": concurrency,
+        "rate_limiter": RateLimiter(rate=rate, max_rate=rate, burst=concurrency),
+        "username_cache": UsernameCache(username_cache_path),
+        "base_url": url,
+        "game_server_url": url,
+    }
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        if mode == "async":
+            geo = AsyncGeoguessr(*fetch_args, **fetch_kwargs)
+            asyncio.run(geo.fetch())
+        else:
+            geo = Geoguessr(*fetch_args, **fetch_kwargs)
+    return geo, time.perf_counter() - started
+
+
+def _game_count(geo: Geoguessr) -> int:
+    return (
+        len(geo.daily_challenge_games)
+        + len(geo.standard_games)
+        + len(geo.ranked_duel_games)
+        + len(geo.unranked_duel_games)
+        + sum(len(games) for games in geo.ranked_team_duel_games.values())
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Measure fetch throughput against the local mock GeoGuessr API")
+    parser.add_argument("--games", type=int, default=500, help="Games in the mock feed (default: 500)")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="Mock response latency (default: 50)")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="Fraction of mock responses that are 429s (default: 0)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of mock responses that are 503s (default: 0)")
+    parser.add_argument("--concurrency", type=int, default=8, help="Workers for the concurrent mode (default: 8)")
+    parser.add_argument(
+        "--async-concurrency",
+        type=int,
+        default=None,
+        help="Requests in flight for the async mode (default: same as --concurrency)",
+    )
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=1000.0,
+        help="Client request rate limit in requests/second, high by default so latency is what is measured (default: 1000)",
+    )
+    parser.add_argument("--modes", type=str, default=",".join(MODES), help=f"Comma-separated modes to run (default: {','.join(MODES)})")
+    parser.add_argument("--url", type=str, default=None, help="Use an already running mock server instead of starting one")
+    args = parser.parse_args()
+
+    modes = [mode.strip() for mode in args.modes.split(",") if mode.strip()]
+    unknown = [mode for mode in modes if mode not in MODES]
+    if unknown:
+        parser.error(f"unknown mode(s): {', '.join(unknown)} (choose from {', '.join(MODES)})")
+    if "async" in modes and not async_fetch_available():
+        print("aiohttp is not installed; skipping the async mode.")
+        modes.remove("async")
+
+    server = None
+    url = args.url
+    if url is None:
+        config = MockConfig(games=args.games, latency_ms=args.latency_ms, rate_429=args.rate_429, error_rate=args.error_rate)
+        server = make_server(config)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    # Load the reverse geocoder up front so its start-up cost doesn't land on the first mode.
+    GeoguessrDuelGame.from_geoguessr_data(GameType.RANKED_DUELS, "duel0", MOCK_PLAYER_ID, synthetic_duel("duel0"))
+
+    print(f"Fetching {args.games} games from {url} (latency {args.latency_ms:g} ms)")
+    print(f"{'mode':<12} {'workers':>7} {'games':>6} {'requests':>8} {'retries':>7} {'secs':>7} {'games/s':>8}")
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            for mode in modes:
+                if mode == "sequential":
+                    concurrency = 1
+                elif mode == "async" and args.async_concurrency:
+                    concurrency = max(1, args.async_concurrency)
+                else:
+                    concurrency = max(1, args.concurrency)
+                # A fresh username cache per mode, so every mode resolves the same usernames.
+                geo, elapsed = _run_fetch(mode, url, args.games, concurrency, args.rate, os.path.join(tmp, f"{mode}_usernames.json"))
+                games = _game_count(geo)
+                print(
+                    f"{mode:<12} {concurrency:>7} {games:>6} {geo.request_count:>8} {geo.retry_count:>7} "
+                    f"{elapsed:>7.2f} {games / elapsed if elapsed else 0.0:>8.1f}"
+                )
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+# Local stand-in for the GeoGuessr API, for measuring fetch throughput offline
+#
+# Serves the endpoints the fetcher uses:
+#   /api/v3/profiles, /api/v4/feed/private, /api/duels/{id}, /api/v3/games/{token}, /api/v3/users/{id}
+# with synthetic games, or replaying the payloads recorded in a payload cache directory (output/cache).
+# Latency, 429 responses (with Retry-After) and server errors can be injected. GET /_stats returns the
+# number of requests served per endpoint.
+#
+#   python -m benchmarks.mock_server --games 500 --latency-ms 50 --rate-429 0.05
+#
+# Point Geoguessr(base_url=..., game_server_url=...) at http://127.0.0.1:8765, or run `python -m benchmarks.fetch_benchmark`.
+
+import argparse
+import glob
+import gzip
+import json
+import os
+import random
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import parse_qs, urlsplit
+
+from geoguessr.cache import DUELS_ENDPOINT, GAMES_ENDPOINT, PayloadCache
+
+# The id returned by /api/v3/profiles; synthetic games are played from this player's perspective.
+MOCK_PLAYER_ID = "mock-player"
+
+
+@dataclass
+class MockConfig:
+    games: int = 500
+    page_size: int = 10
+    latency_ms: float = 50.0
+    jitter_ms: float = 0.0
+    rate_429: float = 0.0
+    error_rate: float = 0.0
+    retry_after: float = 0.5
+    payload_cache: Optional[PayloadCache] = None
+    # Feed payloads replayed instead of synthetic games, and the player id reported for the profile.
+    recorded_feed: list[dict] = field(default_factory=list)
+    player_id: str = MOCK_PLAYER_ID
+    counts: dict[str, int] = field(default_factory=dict)
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+
+def synthetic_feed_payload(i: int) -> dict:
+    """Return the payload of feed entry number `i`, cycling through every game type the fetcher knows."""
+    kind = i % 5
+    if kind == 0:
+        return {"gameMode": "Duels", "competitiveGameMode": "StandardDuels", "gameId": f"duel{i}"}
+    if kind == 1:
+        return {"gameMode": "Duels", "competitiveGameMode": "None", "gameId": f"uduel{i}"}
+    if kind == 2:
+        return {"gameMode": "TeamDuels", "competitiveGameMode": "NoMoveDuels", "gameId": f"team{i}"}
+    if kind == 3:
+        return {"gameMode": "Standard", "gameToken": f"std{i}", "mapSlug": "world", "mapName": "World", "points": 20000}
+    return {"isDailyChallenge": True, "challengeToken": f"dc{i}", "points": 15000}
+
+
+def feed_entry(i: int, payload: dict) -> dict:
+    """Wrap a feed payload as entry number `i` (0 = newest) of the feed."""
+    day = 28 - (i // 24) % 28
+    hour = 23 - i % 24
+    return {"time": f"2024-01-{day:02d}T{hour:02d}:00:00.000Z", "payload": json.dumps(payload)}
+
+
+def recorded_feed_payloads(cache_root: str) -> tuple[list[dict], str]:
+    """
+    Return feed payloads for every duel and standard game recorded under a payload cache directory,
+    together with the player id that appears in most recorded duels (the player who fetched them).
+    """
+    payloads = []
+    player_ids: Counter = Counter()
+    for endpoint in (DUELS_ENDPOINT, GAMES_ENDPOINT):
+        for path in sorted(glob.glob(os.path.join(cache_root, endpoint, "*", "*.json.gz"))):
+            try:
+                with gzip.open(path, "rt", encoding="utf-8") as f:
+                    payload = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if not isinstance(payload, dict):
+                continue
+            if endpoint == GAMES_ENDPOINT:
+                if payload.get("token"):
+                    payloads.append(
+                        {
+                            "gameMode": "Standard",
+                            "gameToken": payload["token"],
+                            "mapSlug": payload.get("map", ""),
+                            "mapName": payload.get("mapName", ""),
+                        }
+                    )
+                continue
+            game_id = payload.get("gameId")
+            if not game_id:
+                continue
+            players = [p for team in payload.get("teams") or [] for p in team.get("players") or []]
+            player_ids.update(p.get("playerId") for p in players if p.get("playerId"))
+            if any(len(team.get("players") or []) > 1 for team in payload.get("teams") or []):
+                payloads.append({"gameMode": "TeamDuels", "competitiveGameMode": "StandardDuels", "gameId": game_id})
+            else:
+                rated = any((p.get("progressChange") or {}).get("rankedSystemProgress") for p in players)
+                payloads.append(
+                    {"gameMode": "Duels", "competitiveGameMode": "StandardDuels" if rated else "None", "gameId": game_id}
+                )
+    player_id = player_ids.most_common(1)[0][0] if player_ids else MOCK_PLAYER_ID
+    return payloads, player_id
+
+
+def synthetic_duel(game_id: str) -> dict:
+    """Return a finished five-round duel payload; team duels get a teammate, ranked duels a rating change."""
+    number = int("".join(c for c in game_id if c.isdigit()) or 0)
+    rated = game_id.startswith("duel")
+    rounds = [
+        {
+            "roundNumber": n,
+            "panorama": {"countryCode": "fr", "panoId": "", "lat": 48.8 + n, "lng": 2.3 + n},
+            "startTime": f"2024-01-01T10:0{n}:00+00:00",
+            "endTime": f"2024-01-01T10:0{n}:30+00:00",
+            "multiplier": 1.0 + 0.5 * (n - 1),
+            "damageMultiplier": 1.0,
+        }
+        for n in range(1, 6)
+    ]
+
+    def player(player_id: str, lat: float, lng: float, rating: bool) -> dict:
+        data = {
+            "playerId": player_id,
+            "guesses": [
+                {
+                    "roundNumber": n,
+                    "lat": lat,
+                    "lng": lng,
+                    "distance": 1000.0 * n,
+                    "score": 5000 - 200 * n,
+                    "created": f"2024-01-01T10:0{n}:15+00:00",
+                }
+                for n in range(1, 6)
+            ],
+        }
+        if rating:
+            data["progressChange"] = {"rankedSystemProgress": {"ratingBefore": 1000 + number, "ratingAfter": 1010 + number}}
+        return data
+
+    home = [player(MOCK_PLAYER_ID, 48.85, 2.35, rated)]
+    if game_id.startswith("team"):
+        home.append(player(f"mate{number % 3}", 52.5, 13.4, False))
+    away = [player(f"opponent{number % 11}", 40.4, -3.7, rated)]
+    return {
+        "status": "Finished",
+        "options": {"map": {"name": "World"}, "movementOptions": {"forbidMoving": False}},
+        "result": {"winningTeamId": "home"},
+        "rounds": rounds,
+        "teams": [
+            {"id": "home", "players": home, "roundResults": [{"roundNumber": n, "damageDealt": 500} for n in range(1, 6)]},
+            {"id": "away", "players": away, "roundResults": [{"roundNumber": n, "damageDealt": 0} for n in range(1, 6)]},
+        ],
+    }
+
+
+def synthetic_standard_game(token: str) -> dict:
+    return {
+        "token": token,
+        "map": "world",
+        "mapName": "World",
+        "mode": "standard",
+        "state": "finished",
+        "roundCount": 5,
+        "forbidMoving": False,
+        "forbidZooming": False,
+        "rounds": [{"lat": 48.8 + n, "lng": 2.3, "panoId": "", "streakLocationCode": "fr"} for n in range(5)],
+        "player": {
+            "guesses": [
+                {"lat": 41.9, "lng": 12.5, "roundScoreInPoints": 4000, "distanceInMeters": 1100000.0} for _ in range(5)
+            ]
+        },
+    }
+
+
+class MockGeoguessrHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Small responses otherwise sit in Nagle's buffer waiting for the client's delayed ACK,
+    # which adds ~40 ms to every request and swamps the configured latency.
+    disable_nagle_algorithm = True
+    config: MockConfig = MockConfig()
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+    def _send(self, status: int, body: Optional[dict] = None, headers: Optional[dict] = None) -> None:
+        data = json.dumps(body).encode("utf-8") if body is not None else b""
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _count(self, endpoint: str) -> None:
+        with self.config.lock:
+            self.config.counts[endpoint] = self.config.counts.get(endpoint, 0) + 1
+
+    def _recorded(self, endpoint: str, key: str) -> Optional[dict]:
+        if self.config.payload_cache is None:
+            return None
+        return self.config.payload_cache.get(endpoint, key)
+
+    def do_GET(self) -> None:
+        config = self.config
+        url = urlsplit(self.path)
+        path = url.path
+        if path == "/_stats":
+            with config.lock:
+                self._send(200, dict(config.counts))
+            return
+
+        delay = config.latency_ms + random.uniform(-config.jitter_ms, config.jitter_ms)
+        time.sleep(max(0.0, delay) / 1000.0)
+        roll = random.random()
+        if roll < config.rate_429:
+            self._count("429")
+            self._send(429, headers={"Retry-After": f"{config.retry_after:g}"})
+            return
+        if roll < config.rate_429 + config.error_rate:
+            self._count("5xx")
+            self._send(503)
+            return
+
+        if path == "/api/v3/profiles":
+            self._count("profiles")
+            self._send(200, {"user": {"id": config.player_id}})
+        elif path == "/api/v4/feed/private":
+            self._count("feed")
+            token = parse_qs(url.query).get("paginationToken", [""])[0]
+            start = int(token) if token.isdigit() else 0
+            total = len(config.recorded_feed) or config.games
+            end = min(total, start + config.page_size)
+            entries = [
+                feed_entry(i, config.recorded_feed[i] if config.recorded_feed else synthetic_feed_payload(i))
+                for i in range(start, end)
+            ]
+            self._send(200, {"entries": entries, "paginationToken": str(end) if end < total else None})
+        elif path.startswith("/api/duels/"):
+            self._count("duels")
+            game_id = path.rsplit("/", 1)[1]
+            self._send(200, self._recorded(DUELS_ENDPOINT, game_id) or synthetic_duel(game_id))
+        elif path.startswith("/api/v3/games/"):
+            self._count("games")
+            token = path.rsplit("/", 1)[1]
+            self._send(200, self._recorded(GAMES_ENDPOINT, token) or synthetic_standard_game(token))
+        elif path.startswith("/api/v3/users/"):
+            self._count("users")
+            user_id = path.rsplit("/", 1)[1]
+            self._send(200, {"id": user_id, "nick": f"Nick_{user_id}"})
+        else:
+            self._count("404")
+            self._send(404)
+
+
+def make_server(config: MockConfig, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    """Return a threaded mock server (port 0 picks a free port); call serve_forever() to run it."""
+    handler = type("ConfiguredMockHandler", (MockGeoguessrHandler,), {"config": config})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Local stand-in for the GeoGuessr API")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="Host to bind (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8765, help="Port to bind (default: 8765)")
+    parser.add_argument("--games", type=int, default=500, help="Number of games in the feed (default: 500)")
+    parser.add_argument("--page-size", type=int, default=10, help="Feed entries per page (default: 10)")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="Delay before every response (default: 50)")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Random +/- variation of the delay (default: 0)")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="Fraction of requests answered with 429 (default: 0)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 503 (default: 0)")
+    parser.add_argument("--retry-after", type=float, default=0.5, help="Retry-After seconds sent with 429s (default: 0.5)")
+    parser.add_argument(
+        "--payload-cache",
+        type=str,
+        default=None,
+        help="Serve the duel and standard games recorded in this payload cache directory (e.g. output/cache) instead of synthetic games",
+    )
+    args = parser.parse_args()
+
+    config = MockConfig(
+        games=args.games,
+        page_size=args.page_size,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        rate_429=args.rate_429,
+        error_rate=args.error_rate,
+        retry_after=args.retry_after,
+    )
+    if args.payload_cache:
+        config.payload_cache = PayloadCache(args.payload_cache)
+        config.recorded_feed, config.player_id = recorded_feed_payloads(args.payload_cache)
+    server = make_server(config, args.host, args.port)
+    games = len(config.recorded_feed) or config.games
+    source = "recorded" if config.recorded_feed else "synthetic"
+    print(f"Mock GeoGuessr API on http://{args.host}:{server.server_address[1]} ({games} {source} games)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+# Per-country aggregation benchmark: loops over duel rounds vs the columnar RoundTable
+#
+#   python -m benchmarks.round_table_benchmark --rounds 200000 --repeat 3
+#
+# Writes synthetic duels to a temporary output/ directory and indexes them in SQLite, then runs the
+# aggregates `analyse` prints (per-country CountryStats and mean net damage over rounds with two
+# guesses, and the wrong-country counts) end to end both ways: decoding the games and looping over
+# them, as analyse does for small selections, and reading a RoundTable from the index. Checks both
+# give the same results and prints the median times; NumPy's import time is reported on its own,
+# since a command pays it once.
+
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from geoguessr.countries import CountryStats
+from geoguessr.game import GameMode, GameType, GeoguessrDuelGame, GeoguessrDuelRound
+from geoguessr.storage import duel_games_path, read_games, write_games
+
+USERNAME = "benchmark"
+
+COUNTRIES = ["fr", "de", "us", "br", "jp", "it", "es", "ca", "au", "ru", "mx", "za", "in", "id", "ar", ""]
+PLAYER_ID = "me"
+
+
+def _synthetic_games(rounds: int, seed: int) -> list[GeoguessrDuelGame]:
+    rng = random.Random(seed)
+    games = []
+    while rounds > 0:
+        game_rounds = []
+        for _ in range(min(rounds, rng.randint(3, 9))):
+            cc = rng.choice(COUNTRIES)
+            guess_locations = {
+                player_id: {"lat": rng.uniform(-60, 70), "lng": rng.uniform(-180, 180), "country_code": rng.choice([cc] * 3 + COUNTRIES)}
+                for player_id in rng.sample([PLAYER_ID, "opp1", "opp2"], rng.choice([1, 2, 2, 2, 3]))
+            }
+            game_rounds.append(GeoguessrDuelRound(
+                country_code=cc,
+                start_time="2024-01-01T00:00:00+00:00",
+                time_secs=rng.randint(5, 120),
+                distance_meters=rng.randint(0, 5_000_000),
+                score=rng.randint(0, 5000),
+                damage_dealt=rng.choice([0, rng.randint(1, 3000)]),
+                damage_taken=rng.choice([0, rng.randint(1, 3000)]),
+                guessed_first=rng.random() < 0.5,
+                team_multiplier=rng.choice([1.0, 1.5, 2.0]),
+                opponent_multiplier=rng.choice([1.0, 1.5, 2.0]),
+                guess_locations=guess_locations,
+            ))
+        rounds -= len(game_rounds)
+        game = GeoguessrDuelGame(
+            game_type=GameType.RANKED_DUELS,
+            game_id=f"duel{len(games)}",
+            time="2024-01-01T00:00:00+00:00",
+            mode=rng.choice(list(GameMode)),
+            map="World",
+            won=rng.random() < 0.5,
+            rounds=game_rounds,
+            opponents=["opp1"],
+            start_time="2024-01-01T00:00:00+00:00",
+        )
+        game.player_id = PLAYER_ID
+        games.append(game)
+    return games
+
+
+def _net(duel_round: GeoguessrDuelRound) -> float:
+    return duel_round.damage_taken / duel_round.opponent_multiplier - duel_round.damage_dealt / duel_round.team_multiplier
+
+
+def _two_guesses(duel_round: GeoguessrDuelRound) -> bool:
+    return sum(1 for info in duel_round.guess_locations.values() if info.get("lat") is not None) >= 2
+
+
+def _loop_aggregates(games: list[GeoguessrDuelGame]) -> tuple:
+    rounds_by_country: dict[str, list] = {}
+    for game in games:
+        for duel_round in game.rounds:
+            if _two_guesses(duel_round):
+                rounds_by_country.setdefault((duel_round.country_code or "").upper() or "??", []).append(duel_round)
+    stats = [CountryStats.from_rounds(cc, rounds) for cc, rounds in rounds_by_country.items()]
+    avg_net = {cc: sum(_net(r) for r in rounds) / len(rounds) for cc, rounds in rounds_by_country.items()}
+    wrong: dict[str, tuple[int, int]] = {}
+    for game in games:
+        for duel_round in game.rounds:
+            actual_cc = (duel_round.country_code or "").upper() or "??"
+            guessed_cc = ((duel_round.guess_locations.get(PLAYER_ID) or {}).get("country_code") or "").upper()
+            if actual_cc == "??" or not guessed_cc or not _two_guesses(duel_round):
+                continue
+            w, t = wrong.get(actual_cc, (0, 0))
+            wrong[actual_cc] = (w + (guessed_cc != actual_cc), t + 1)
+    return stats, avg_net, wrong
+
+
+def _table_aggregates(table) -> tuple:
+    return (
+        table.country_stats(table.two_guesses),
+        table.mean_by_country(table.net_damage(), table.two_guesses),
+        table.wrong_country_counts(table.two_guesses),
+    )
+
+
+def _median_secs(fn, repeat: int):
+    times = []
+    result = None
+    for _ in range(max(1, repeat)):
+        started = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - started)
+    return statistics.median(times), result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare per-country aggregation with loops and with a RoundTable")
+    parser.add_argument("--rounds", type=int, default=200_000, help="Synthetic duel rounds (default: 200000)")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs of each step; the median is reported (default: 3)")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed for the synthetic games (default: 1)")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    import numpy  # noqa: F401
+    numpy_import = time.perf_counter() - started
+    from geoguessr.round_table import RoundTable
+    from geoguessr.sqlite_store import SqliteGameStore
+
+    games = _synthetic_games(args.rounds, args.seed)
+    print(f"{len(games)} games, {sum(len(game.rounds) for game in games)} rounds")
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        path = duel_games_path(USERNAME, "ranked", output_dir)
+        write_games(path, games)
+        with SqliteGameStore(os.path.join(output_dir, "games.sqlite"), output_dir) as store:
+            store.sync(USERNAME)
+
+            def decode() -> list[GeoguessrDuelGame]:
+                return [GeoguessrDuelGame.from_json(record) for record in read_games(path)]
+
+            decode_secs, decoded = _median_secs(decode, args.repeat)
+            loop_secs, expected = _median_secs(lambda: _loop_aggregates(decoded), args.repeat)
+            read_secs, table = _median_secs(lambda: store.round_table(USERNAME, ["ranked"]), args.repeat)
+            build_secs, _ = _median_secs(lambda: RoundTable.from_games(decoded), args.repeat)
+            query_secs, actual = _median_secs(lambda: _table_aggregates(table), args.repeat)
+    if actual != expected:
+        raise SystemExit("RoundTable aggregates differ from the loops")
+
+    print(f"{'step':<28} {'ms':>9}")
+    print(f"{'decode games':<28} {decode_secs * 1000:>9.1f}")
+    print(f"{'loops':<28} {loop_secs * 1000:>9.1f}")
+    print(f"{'import numpy':<28} {numpy_import * 1000:>9.1f}")
+    print(f"{'read RoundTable (SQLite)':<28} {read_secs * 1000:>9.1f}")
+    print(f"{'build RoundTable (games)':<28} {build_secs * 1000:>9.1f}")
+    print(f"{'vectorized aggregates':<28} {query_secs * 1000:>9.1f}")
+    loops_total = decode_secs + loop_secs
+    table_total = numpy_import + read_secs + query_secs
+    print(f"Speed-up: {loops_total / table_total:.1f}x end to end (decode + loops vs import + read + aggregates)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+# CLI start-up time benchmark
+#
+#   python -m benchmarks.startup_benchmark --repeat 5 [--check] [--max-ms 300]
+#
+# Runs each offline command in a fresh interpreter against a synthetic output/ directory (written to a
+# temporary directory, nothing is written under output/), and prints the median wall time together with
+# the heavy dependencies the command imported. With --check the exit status is non-zero when a command
+# imports a dependency it has no use for, or is slower than --max-ms, so start-up regressions get caught.
+
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.mock_server import MOCK_PLAYER_ID, synthetic_duel, synthetic_standard_game
+from geoguessr.game import GameType, GeoguessrDuelGame, GeoguessrStandardGame
+from geoguessr.storage import games_path, write_games
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+USERNAME = "benchmark"
+
+# Imports that are slow enough to matter and only needed by some commands.
+HEAVY_MODULES = ["requests", "aiohttp", "tqdm", "reverse_geocoder", "numpy", "scipy", "fastapi", "uvicorn"]
+
+# Interpreter arguments for each command, and the heavy modules it may import.
+COMMANDS = {
+    "python": (["-c", "pass"], set()),
+    "help": (["-m", "geoguessr", "--help"], set()),
+    "display": (["-m", "geoguessr", "display", USERNAME], set()),
+    "analyse": (["-m", "geoguessr", "analyse", USERNAME], set()),
+    "country": (["-m", "geoguessr", "country", USERNAME, "FR"], set()),
+    "web import": (["-c", "import geoguessr.web.app"], {"fastapi"}),
+}
+
+
+def _write_output(root: str, games: int) -> None:
+    """Write stored game files for USERNAME, as a fetch would, under root/output."""
+    os.makedirs(os.path.join(root, "output"))
+    # Country names are read from data/countries.json relative to the working directory.
+    shutil.copytree(os.path.join(REPO_ROOT, "data"), os.path.join(root, "data"))
+    duels = []
+    for i in range(games):
+        duel = GeoguessrDuelGame.from_geoguessr_data(
+            GameType.RANKED_DUELS, f"duel{i}", MOCK_PLAYER_ID, synthetic_duel(f"duel{i}"), resolve_countries=False
+        )
+        for duel_round in duel.rounds:
+            for location in duel_round.guess_locations.values():
+                location["country_code"] = "it"
+        duels.append(duel)
+    standard_games = []
+    for i in range(games):
+        raw = synthetic_standard_game(f"std{i}")
+        rounds = GeoguessrStandardGame.rounds_from_raw(raw)
+        for standard_round in rounds:
+            standard_round.guess_country_code = "it"
+        standard_games.append(
+            GeoguessrStandardGame(
+                game_type=GameType.STANDARD,
+                time="2024-01-01T00:00:00.000Z",
+                game_token=f"std{i}",
+                map=raw["map"],
+                map_name=raw["mapName"],
+                mode=raw["mode"],
+                state=raw["state"],
+                round_count=raw["roundCount"],
+                rounds=rounds,
+                raw=raw,
+            )
+        )
+    files = {"ranked_duels": duels, "unranked_duels": [], "standard_games": standard_games, "daily_challenge": []}
+    for name, stored in files.items():
+        write_games(games_path(USERNAME, name, os.path.join(root, "output")), stored)
+
+
+def _run(argv: list[str], cwd: str, env: dict, importtime: bool = False) -> tuple[float, str]:
+    command = [sys.executable, *(["-X", "importtime"] if importtime else []), *argv]
+    started = time.perf_counter()
+    result = subprocess.run(command, cwd=cwd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    elapsed = time.perf_counter() - started
+    if result.returncode != 0:
+        raise RuntimeError(f"{' '.join(argv)} failed:\n{result.stderr[-2000:]}")
+    return elapsed, result.stderr
+
+
+def _imported_heavy_modules(importtime_log: str) -> set[str]:
+    """Return the heavy modules listed in `python -X importtime` output."""
+    imported = set()
+    for line in importtime_log.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        name = line.rsplit("|", 1)[-1].strip()
+        imported.add(name.split(".", 1)[0])
+    return imported.intersection(HEAVY_MODULES)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Measure CLI start-up time and heavy imports per command")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per command; the median is reported (default: 5)")
+    parser.add_argument("--games", type=int, default=200, help="Stored games of each kind in the synthetic output (default: 200)")
+    parser.add_argument(
+        "--commands",
+        type=str,
+        default=",".join(COMMANDS),
+        help=f"Comma-separated commands to run (default: {','.join(COMMANDS)})",
+    )
+    parser.add_argument("--check", action="store_true", help="Exit non-zero if a command imports more than it needs")
+    parser.add_argument("--max-ms", type=float, default=None, help="With --check, also fail commands slower than this")
+    args = parser.parse_args()
+
+    names = [name.strip() for name in args.commands.split(",") if name.strip()]
+    unknown = [name for name in names if name not in COMMANDS]
+    if unknown:
+        parser.error(f"unknown command(s): {', '.join(unknown)} (choose from {', '.join(COMMANDS)})")
+
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [REPO_ROOT, env.get("PYTHONPATH")]))
+    failures = []
+    print(f"{'command':<12} {'median ms':>9} {'min ms':>7}  heavy imports")
+    with tempfile.TemporaryDirectory() as tmp:
+        _write_output(tmp, args.games)
+        for name in names:
+            argv, allowed = COMMANDS[name]
+            # The first run warms the OS file cache and writes bytecode; it is not counted.
+            _run(argv, tmp, env)
+            times = [_run(argv, tmp, env)[0] * 1000.0 for _ in range(max(1, args.repeat))]
+            heavy = _imported_heavy_modules(_run(argv, tmp, env, importtime=True)[1])
+            median = statistics.median(times)
+            print(f"{name:<12} {median:>9.0f} {min(times):>7.0f}  {', '.join(sorted(heavy)) or '-'}")
+            if heavy - allowed:
+                failures.append(f"{name} imports {', '.join(sorted(heavy - allowed))}")
+            if args.max_ms is not None and median > args.max_ms:
+                failures.append(f"{name} took {median:.0f} ms (limit {args.max_ms:g} ms)")
+
+    if failures:
+        print("\n".join(["", "Start-up regressions:", *(f"  {failure}" for failure in failures)]))
+        if args.check:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,25 +1,88 @@
+from __future__ import annotations
+
 import json
 import argparse
 import os
 import sys
-from datetime import datetime, timezone
+from datetime import datetime
 import signal
-from enum import Enum
-from typing import Optional
-from geoguessr.geoguessr import Geoguessr
-from geoguessr.user import PlayerData, RankedDuelsSummary
-from geoguessr.game import GameMode
+import time
+from typing import TYPE_CHECKING, Optional, TextIO
+# The fetch clients (and with them requests, aiohttp and tqdm), asyncio and the worker pools are imported
+# by the commands that use them, so commands that only read output/ start quickly; see
+# benchmarks/startup_benchmark.py.
+from geoguessr.cache import PayloadCache
+from geoguessr.checkpoint import MAX_DETAIL_ATTEMPTS, FetchCheckpoint, checkpoint_path
+from geoguessr.geocode import geocode_cache, resolve_guess_countries
+from geoguessr.metrics import endpoint_name
+from geoguessr.ratelimit import RateLimiter
+from geoguessr.reparse import reparse_duel_games, reparse_standard_games
+from geoguessr.storage import TEAM_DUELS_NAME, games_path, read_games, save_games
+from geoguessr.usernames import UsernameCache
+from geoguessr.user import PlayerData, RankedDuelsSummary, parse_include
+from geoguessr.game import GameMode, GameType, parse_timestamp
 from geoguessr.countries import CountryStats, country_code_to_name, name_to_country_code
 
-def enum_serializer(obj):
-    """Custom JSON serializer for objects containing enums."""
-    if isinstance(obj, Enum):
-        return obj.value
-    return obj.__dict__
+if TYPE_CHECKING:
+    from geoguessr.geoguessr import Geoguessr
 
 def fetch_command(args):
     """Fetch GeoGuessr games for a user."""
     username = args.username
+    token = _user_token(username)
+    if token is None:
+        return
+    from geoguessr.geoguessr import FeedRequestError
+
+    try:
+        if getattr(args, "use_async", False):
+            import asyncio
+            from geoguessr.async_geoguessr import async_fetch_available
+
+            if async_fetch_available():
+                args._fetch_stats = asyncio.run(_fetch_user_async(args, username, token))
+                return
+            print("aiohttp is not installed; fetching with the requests-based engine instead.")
+        args._fetch_stats = _fetch_user(args, username, token)
+    except FeedRequestError as e:
+        print(e)
+        sys.exit(1)
+
+
+async def fetch_command_async(args) -> Optional[dict]:
+    """
+    Fetch GeoGuessr games for a user from a running event loop, e.g. the web app's, and return the fetch summary.
+
+    Uses the asyncio engine, or the requests-based fetch in a worker thread when aiohttp is not installed.
+    Progress messages go to `args.output` when set (e.g. a StringIO per web request), otherwise stdout.
+    Raises FeedRequestError if a feed page could not be fetched; the fetch can then be run again to resume.
+    """
+    username = args.username
+    token = _user_token(username, getattr(args, "output", None))
+    if token is None:
+        return None
+    import asyncio
+    from geoguessr.async_geoguessr import async_fetch_available
+
+    if async_fetch_available():
+        args._fetch_stats = await _fetch_user_async(args, username, token)
+    else:
+        args._fetch_stats = await asyncio.to_thread(_fetch_user, args, username, token)
+    return args._fetch_stats
+
+
+def _user_token(username: str, output: Optional[TextIO] = None) -> Optional[str]:
+    """Return the user's cookie from users.json, or None (with a message) if the user is not listed."""
+    with open("users.json", "r") as f:
+        users = json.load(f)
+    if username not in users:
+        print(f"Username '{username}' not found in users.json.", file=output)
+        return None
+    return users[username]
+
+
+def _fetch_options(args) -> tuple[int, int, float]:
+    """Return (max_games, concurrency, rate) from fetch arguments, falling back to the defaults."""
     max_games = getattr(args, "max_games", None)
     try:
         max_games_int = int(max_games) if max_games is not None else 0
@@ -28,28 +91,117 @@ def fetch_command(args):
     if max_games_int <= 0:
         # Effectively unlimited (used by the web UI).
         max_games_int = 1_000_000_000
-    max_games = max_games_int
+    try:
+        concurrency = int(getattr(args, "concurrency", None) or 4)
+    except Exception:
+        concurrency = 4
+    try:
+        rate = float(getattr(args, "rate", None) or 10.0)
+    except Exception:
+        rate = 10.0
+    return max_games_int, concurrency, rate
+
+
+def _fetch_user(
+    args,
+    username: str,
+    token: str,
+    rate_limiter: Optional[RateLimiter] = None,
+    username_cache: Optional[UsernameCache] = None,
+    payload_cache: Optional[PayloadCache] = None,
+) -> Optional[dict]:
+    """
+    Fetch new games for one user and merge them into their output files.
+
+    The rate limiter, username cache and payload cache may be shared with fetches for other users running
+    at the same time; any not passed in are created for this fetch alone. Returns a structured summary of
+    the fetch, or None if it could not be built.
+    """
+    started = time.perf_counter()
+    plan = _plan_fetch(args, username, token, rate_limiter, username_cache, payload_cache)
+    if plan is None:
+        return None
+    user_data, checkpoint, fetch_args, fetch_kwargs = plan
+    from geoguessr.geoguessr import Geoguessr
+
+    geo = Geoguessr(*fetch_args, **fetch_kwargs)
+    return _save_fetch(args, username, geo, user_data, checkpoint, started)
+
+
+async def _fetch_user_async(args, username: str, token: str) -> Optional[dict]:
+    """Like `_fetch_user`, but fetches with the asyncio engine; file reads and writes run in a worker thread."""
+    import asyncio
+    from geoguessr.async_geoguessr import AsyncGeoguessr
+
+    started = time.perf_counter()
+    plan = await asyncio.to_thread(_plan_fetch, args, username, token)
+    if plan is None:
+        return None
+    user_data, checkpoint, fetch_args, fetch_kwargs = plan
+    geo = AsyncGeoguessr(*fetch_args, **fetch_kwargs)
+    await geo.fetch()
+    return await asyncio.to_thread(_save_fetch, args, username, geo, user_data, checkpoint, started)
+
+
+def _plan_fetch(
+    args,
+    username: str,
+    token: str,
+    rate_limiter: Optional[RateLimiter] = None,
+    username_cache: Optional[UsernameCache] = None,
+    payload_cache: Optional[PayloadCache] = None,
+):
+    """
+    Load a user's stored games and work out what to fetch.
+
+    Returns (user_data, checkpoint, fetch_args, fetch_kwargs), where the last two are the arguments for
+    Geoguessr or AsyncGeoguessr, or None if the options conflict.
+    """
+    max_games, concurrency, rate = _fetch_options(args)
+    output = getattr(args, "output", None)
 
-    def _is_rated_duel(g) -> bool:
-        return bool((getattr(g, "rating_before", 0) or 0) or (getattr(g, "rating_after", 0) or 0))
-    
-    # Load token from users.json
-    with open("users.json", "r") as f:
-        users = json.load(f)
-    if username not in users:
-        print(f"Username '{username}' not found in users.json.")
-        return
-    token = users[username]
     # Ensure output directory exists before any code that may read it
-    output_dir = "output"
-    os.makedirs(output_dir, exist_ok=True)
+    os.makedirs("output", exist_ok=True)
+
+    older = bool(getattr(args, "older", False))
+    if older and args.overwrite:
+        print("--older extends the stored history and cannot be combined with --overwrite.", file=output)
+        return None
 
     if not args.overwrite:
         user_data = PlayerData(username)
     else:
         user_data = PlayerData("")  # Empty data
 
-    geo = Geoguessr(
+    older_than = None
+    if older:
+        older_than = {
+            GameType.DAILY_CHALLENGE: user_data.oldest_challenge_seed(),
+            GameType.STANDARD: user_data.oldest_standard_game_token(),
+            GameType.RANKED_DUELS: user_data.oldest_ranked_duel_id(),
+            GameType.UNRANKED_DUELS: user_data.oldest_unranked_duel_id(),
+            GameType.RANKED_TEAM_DUELS: user_data.oldest_team_duel_id(),
+        }
+
+    last_ids = {
+        "challenge_seed": user_data.last_challenge_seed(),
+        "standard_game_token": user_data.last_standard_game_token(),
+        "ranked_duel_id": user_data.last_ranked_duel_id(),
+        "unranked_duel_id": user_data.last_unranked_duel_id(),
+        "team_duel_id": user_data.last_team_duel_id(),
+    }
+    # A checkpoint only applies to a fetch starting from the same stored games with the same options.
+    checkpoint = FetchCheckpoint.load(
+        checkpoint_path(username),
+        {
+            "overwrite": bool(args.overwrite),
+            "max_games": max_games,
+            "last_ids": last_ids,
+            "older_than": {game_type.value: game_id for game_type, game_id in older_than.items()} if older_than else None,
+        },
+    )
+
+    fetch_args = (
         username,
         token,
         user_data.last_challenge_seed(),
@@ -59,6 +211,27 @@ def fetch_command(args):
         user_data.last_team_duel_id(),
         max_games,
     )
+    fetch_kwargs = {
+        "concurrency": concurrency,
+        "rate_limiter": rate_limiter if rate_limiter is not None else RateLimiter(rate=rate, burst=max(1, concurrency)),
+        "payload_cache": payload_cache if payload_cache is not None or getattr(args, "no_cache", False) else PayloadCache(),
+        "username_cache": username_cache,
+        "checkpoint": checkpoint,
+        "older_than": older_than,
+        "known_game_ids": user_data.known_game_ids(),
+        "output": output,
+    }
+    return user_data, checkpoint, fetch_args, fetch_kwargs
+
+
+def _save_fetch(args, username: str, geo: Geoguessr, user_data: PlayerData, checkpoint: FetchCheckpoint, started: float) -> Optional[dict]:
+    """Merge the games a finished fetch found into the user's output files and return the fetch summary."""
+    output_dir = "output"
+    output = getattr(args, "output", None)
+    older = geo.older_than is not None
+
+    def _is_rated_duel(g) -> bool:
+        return bool((getattr(g, "rating_before", 0) or 0) or (getattr(g, "rating_after", 0) or 0))
 
     # Structured summary for web UI (and other callers) to consume.
     try:
@@ -69,8 +242,13 @@ def fetch_command(args):
             g for g in (getattr(geo, "unranked_duel_games", []) or []) if not _is_rated_duel(g)
         ]
         new_team_duels = sum(len(v) for v in (getattr(geo, "ranked_team_duel_games", {}) or {}).values())
-        args._fetch_stats = {
+        fetch_stats = {
             "pages_fetched": getattr(geo, "pages_fetched", None),
+            "requests": getattr(geo, "request_count", None),
+            "mean_request_ms": round(geo.mean_request_ms(), 1),
+            "retries": getattr(geo, "retry_count", None),
+            "dropped_requests": len(getattr(geo, "dropped_requests", []) or []),
+            "cache_hits": geo.payload_cache.hits if geo.payload_cache is not None else 0,
             "new": {
                 "daily_challenge": len(getattr(geo, "daily_challenge_games", []) or []),
                 "standard": len(getattr(geo, "standard_games", []) or []),
@@ -81,13 +259,52 @@ def fetch_command(args):
         }
     except Exception:
         # Best-effort; never fail the fetch.
-        args._fetch_stats = None
-
-    # Append player data to geo data to keep reverse chronological order
-    daily_challenge_games = geo.daily_challenge_games + user_data.daily_challenge_games
-    standard_games = geo.standard_games + getattr(user_data, "standard_games", [])
-    ranked_duels = geo.ranked_duel_games + user_data.ranked_duel_games
-    unranked_duels = geo.unranked_duel_games + user_data.unranked_duel_games
+        fetch_stats = None
+
+    # A game whose details could not be fetched would be skipped for good once the newer games are saved:
+    # the next incremental fetch stops at them. Keep the checkpoint instead, so running fetch again only
+    # requests what failed; a game that keeps failing is given up on after a few fetches, so it can't
+    # hold back every newer game.
+    failed_details = [endpoint for endpoint in geo.dropped_requests if endpoint_name(endpoint) in ("duels", "games")]
+    if failed_details:
+        attempts = checkpoint.record_failed_details(failed_details)
+        retry = [endpoint for endpoint, count in attempts.items() if count < MAX_DETAIL_ATTEMPTS]
+        if retry:
+            checkpoint.save()
+            print(
+                f"{len(retry)} game detail requests failed after all retries; nothing was saved. "
+                f"Run fetch again to retry them (progress is kept in {checkpoint.path}; a game is skipped "
+                f"after failing in {MAX_DETAIL_ATTEMPTS} fetches).",
+                file=output,
+            )
+            return fetch_stats
+        print(f"Warning: skipping {len(attempts)} games whose details failed in {MAX_DETAIL_ATTEMPTS} fetches:", file=output)
+        for endpoint in attempts:
+            print(f"  {endpoint}", file=output)
+
+    # Combine fetched and stored games in reverse chronological order: newer games go in front of the
+    # stored ones. A backfill (--older) also picks up games missing from within the stored range (e.g.
+    # left out by --max-games), so its games are sorted into place by time.
+    def _game_time(g) -> float:
+        if isinstance(g, dict):
+            return parse_timestamp(g.get("start_time") or g.get("time") or "")
+        return parse_timestamp(getattr(g, "start_time", "") or getattr(g, "time", "") or "")
+
+    def _combine(fetched: list, stored: list) -> list:
+        if not older:
+            return fetched + stored
+        if not fetched:
+            return list(stored)
+        return sorted(stored + fetched, key=_game_time, reverse=True)
+
+    daily_challenge_games = _combine(geo.daily_challenge_games, user_data.daily_challenge_games)
+    standard_games = _combine(geo.standard_games, getattr(user_data, "standard_games", []))
+    # Stored games from files saved before rounds were kept get their guesses geocoded now; games read
+    # through the web UI's game cache were geocoded when loaded, which leaves nothing to change here.
+    with geo.metrics.phase("geocoding"):
+        backfilled = resolve_guess_countries(getattr(user_data, "standard_games", []))
+    ranked_duels = _combine(geo.ranked_duel_games, user_data.ranked_duel_games)
+    unranked_duels = _combine(geo.unranked_duel_games, user_data.unranked_duel_games)
 
     # The feed occasionally labels unranked/quickplay duels as competitive.
     # Re-bucket based on whether we actually have rating progress.
@@ -123,7 +340,7 @@ def fetch_command(args):
 
     teammates = set(geo.ranked_team_duel_games.keys()).union(set(user_data.ranked_team_duel_games.keys()))
     for teammate in teammates:
-        ranked_team_duels[teammate] = geo.ranked_team_duel_games.get(teammate, []) + user_data.ranked_team_duel_games.get(teammate, []) 
+        ranked_team_duels[teammate] = _combine(geo.ranked_team_duel_games.get(teammate, []), user_data.ranked_team_duel_games.get(teammate, []))
 
     def _is_party_duel(g) -> bool:
         return (getattr(g, "context_type", "") or "") == "PartyV2"
@@ -152,62 +369,221 @@ def fetch_command(args):
 
     ranked_duels, unranked_duels, party_duels = _split_party_duels(ranked_duels, unranked_duels)
 
-    # Merge any previously-saved party duels (best-effort), then write out.
-    party_file = os.path.join(output_dir, f"{username}_party_games.json")
-    if not args.overwrite and os.path.exists(party_file):
-        try:
-            existing_party = []
-            with open(party_file, "r") as f:
-                existing_party = json.load(f) or []
-            # Keep as dicts or objects; serializer handles both. We de-dupe on game_id.
-            combined = []
-            combined.extend(party_duels)
-            if isinstance(existing_party, list):
-                combined.extend(existing_party)
-
-            by_id = {}
-            for g in combined:
-                gid = getattr(g, "game_id", None) if not isinstance(g, dict) else g.get("game_id")
-                gid = gid or ""
-                if gid and gid not in by_id:
-                    by_id[gid] = g
-            party_duels = list(by_id.values())
-        except Exception:
-            pass
-        
+    # Merge any previously-saved party duels, then write out.
+    existing_party = None
+    if not args.overwrite:
+        existing_party = read_games(games_path(username, "party_games", output_dir))
+        # Keep as dicts or objects; serializer handles both. We de-dupe on game_id.
+        combined = _combine(list(party_duels), existing_party)
+
+        by_id = {}
+        for g in combined:
+            gid = getattr(g, "game_id", None) if not isinstance(g, dict) else g.get("game_id")
+            gid = gid or ""
+            if gid and gid not in by_id:
+                by_id[gid] = g
+        party_duels = list(by_id.values())
+
+    # Records as loaded from each file, so files whose stored games are unchanged are only appended to.
+    stored = {
+        "daily_challenge": user_data.daily_challenge_games,
+        "standard_games": user_data.standard_games,
+        "ranked_duels": user_data.ranked_duel_games,
+        "unranked_duels": user_data.unranked_duel_games,
+        "party_games": existing_party,
+    }
+    for teammate, games in user_data.ranked_team_duel_games.items():
+        stored[f"{teammate}_{TEAM_DUELS_NAME}"] = games
+
     # `output_dir` already created above
 
-    # Save Daily challenge and Duel games
-    print(f"Saving {len(daily_challenge_games)} daily challenge games")
-    dc_file = os.path.join(output_dir, f"{username}_daily_challenge.json")
-    with open(dc_file, "w") as f:
-        json.dump(daily_challenge_games, f, default=enum_serializer, indent=2)
+    with geo.metrics.phase("saving"):
+        # Save Daily challenge and Duel games
+        _save_games(output_dir, username, "daily_challenge", daily_challenge_games, "daily challenge games", stored, output=output)
+        _save_games(
+            output_dir, username, "standard_games", standard_games, "standard games", stored, changed=bool(backfilled), output=output
+        )
+        _save_duel_games(output_dir, username, ranked_duels, unranked_duels, party_duels, ranked_team_duels, stored, output=output)
+        geocode_cache().save()
+
+    # Everything fetched is now saved, so the next fetch starts from the new last games.
+    checkpoint.clear()
+    print(geo.metrics.format_summary(), file=output)
+    if fetch_stats is not None:
+        fetch_stats["elapsed_secs"] = round(time.perf_counter() - started, 2)
+        fetch_stats["metrics"] = geo.metrics.to_dict()
+    return fetch_stats
+
+
+def _save_games(
+    output_dir: str,
+    username: str,
+    name: str,
+    games: list,
+    label: str,
+    stored: Optional[dict] = None,
+    changed: bool = False,
+    output: Optional[TextIO] = None,
+) -> None:
+    """
+    Save one of a user's game files, e.g. name="ranked_duels".
+
+    `stored` maps file names to the records loaded from them; a file whose loaded records are all still
+    there, unchanged and last, only has the new games appended. Without it the file is rewritten.
+    """
+    appended = save_games(games_path(username, name, output_dir), games, (stored or {}).get(name), changed)
+    print(f"Saving {len(games)} {label} ({'file rewritten' if appended < 0 else f'{appended} appended'})", file=output)
+
+
+def _save_duel_games(
+    output_dir: str,
+    username: str,
+    ranked_duels,
+    unranked_duels,
+    party_duels,
+    ranked_team_duels: dict,
+    stored: Optional[dict] = None,
+    output: Optional[TextIO] = None,
+) -> None:
+    """Write the ranked, unranked, party and per-teammate team duel files for a user."""
+    _save_games(output_dir, username, "ranked_duels", ranked_duels, "ranked duel games", stored, output=output)
+    _save_games(output_dir, username, "unranked_duels", unranked_duels, "unranked duel games", stored, output=output)
+    _save_games(output_dir, username, "party_games", party_duels, "party duel games", stored, output=output)
 
-    print(f"Saving {len(standard_games)} standard games")
-    standard_file = os.path.join(output_dir, f"{username}_standard_games.json")
-    with open(standard_file, "w") as f:
-        json.dump(standard_games, f, default=enum_serializer, indent=2)
+    # Save Team Duel games separately for each teammate
+    for teammate, games in ranked_team_duels.items():
+        _save_games(
+            output_dir,
+            username,
+            f"{teammate}_{TEAM_DUELS_NAME}",
+            games,
+            f"ranked team duel games with teammate '{teammate}'",
+            stored,
+            output=output,
+        )
 
-    print(f"Saving {len(ranked_duels)} ranked duel games")
-    duel_file = os.path.join(output_dir, f"{username}_ranked_duels.json")
-    with open(duel_file, "w") as f:
-        json.dump(ranked_duels, f, default=enum_serializer, indent=2)
 
-    print(f"Saving {len(unranked_duels)} unranked duel games")
-    unranked_file = os.path.join(output_dir, f"{username}_unranked_duels.json")
-    with open(unranked_file, "w") as f:
-        json.dump(unranked_duels, f, default=enum_serializer, indent=2)
+def fetch_all_command(args):
+    """Fetch every user in users.json in parallel, under one shared request limit."""
+    with open("users.json", "r") as f:
+        users = json.load(f)
+    if not users:
+        print("No users found in users.json.")
+        return
+    _max_games, concurrency, rate = _fetch_options(args)
+    max_requests = max(1, int(getattr(args, "max_requests", None) or concurrency))
+
+    # One limiter for everyone: total request rate and in-flight requests are bounded globally, however
+    # many users are fetched. Sessions stay per user, as each one carries that user's cookie.
+    rate_limiter = RateLimiter(rate=rate, burst=max_requests, max_in_flight=max_requests)
+    username_cache = UsernameCache()
+    payload_cache = None if getattr(args, "no_cache", False) else PayloadCache()
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    started = time.perf_counter()
+    results: dict[str, Optional[dict]] = {}
+    with ThreadPoolExecutor(max_workers=len(users)) as executor:
+        futures = {
+            username: executor.submit(_fetch_user, args, username, token, rate_limiter, username_cache, payload_cache)
+            for username, token in users.items()
+        }
+        for username, future in futures.items():
+            try:
+                results[username] = future.result()
+            except Exception as e:
+                print(f"Fetch failed for '{username}': {e}")
+                results[username] = None
+    username_cache.save()
+    elapsed = time.perf_counter() - started
+
+    print(f"\nFetched {len(users)} users in {elapsed:.1f}s (at most {max_requests} requests in flight):")
+    total_requests = 0
+    for username in users:
+        stats = results.get(username)
+        if not stats:
+            print(f"  {username}: failed")
+            continue
+        requests_made = stats.get("requests") or 0
+        user_secs = stats.get("elapsed_secs") or 0.0
+        total_requests += requests_made
+        new_games = sum((stats.get("new") or {}).values())
+        print(
+            f"  {username}: {new_games} new games, {requests_made} requests in {user_secs:.1f}s "
+            f"({requests_made / user_secs if user_secs else 0.0:.1f} req/s, mean latency {stats.get('mean_request_ms', 0):.0f} ms)"
+        )
+    print(f"  Total: {total_requests} requests, {total_requests / elapsed if elapsed else 0.0:.1f} req/s")
+    if payload_cache is not None:
+        print(
+            f"  Payload cache: {payload_cache.hits} hits, {payload_cache.shared} downloads shared between users, "
+            f"{payload_cache.writes} new payloads stored"
+        )
+    if username_cache.shared:
+        print(f"  Usernames: {username_cache.shared} lookups shared between users")
 
-    print(f"Saving {len(party_duels)} party duel games")
-    with open(party_file, "w") as f:
-        json.dump(party_duels, f, default=enum_serializer, indent=2)
 
-    # Save Team Duel games separately for each teammate
-    for teammate, games in ranked_team_duels.items():
-        print(f"Saving {len(games)} ranked team duel games with teammate '{teammate}'")
-        team_duel_output_path = os.path.join(output_dir, f"{username}_{teammate}_ranked_team_duels.json")
-        with open(team_duel_output_path, "w") as f:
-            json.dump(games, f, default=enum_serializer, indent=2)
+def reparse_command(args):
+    """Rebuild a user's standard game and duel files from stored and cached raw payloads, without any network requests."""
+    username = args.username
+    output_dir = "output"
+    player_data = PlayerData(username)
+
+    if player_data.standard_games:
+        started = time.perf_counter()
+        reparse_standard_games(player_data.standard_games)
+        print(f"Rebuilt the rounds of {len(player_data.standard_games)} standard games in {time.perf_counter() - started:.1f}s")
+        _save_games(output_dir, username, "standard_games", player_data.standard_games, "standard games")
+
+    # Flatten every duel category so a single process pool run covers them all.
+    categories = [
+        ("ranked", player_data.ranked_duel_games),
+        ("unranked", player_data.unranked_duel_games),
+        ("party", player_data.party_duel_games),
+    ]
+    categories.extend((f"team:{teammate}", games) for teammate, games in player_data.ranked_team_duel_games.items())
+    all_games = [game for _name, games in categories for game in games]
+    if not all_games:
+        print(f"No stored duel games found for '{username}'.")
+        geocode_cache().save()
+        return
+
+    started = time.perf_counter()
+    reparsed, reparsed_count = reparse_duel_games(all_games, workers=getattr(args, "workers", None))
+    elapsed = time.perf_counter() - started
+    print(
+        f"Reparsed {reparsed_count}/{len(all_games)} duel games from cached payloads in {elapsed:.1f}s "
+        f"({len(all_games) - reparsed_count} without a cached payload were kept as stored)"
+    )
+
+    by_category = {}
+    offset = 0
+    for name, games in categories:
+        by_category[name] = reparsed[offset:offset + len(games)]
+        offset += len(games)
+    ranked_team_duels = {
+        name.split(":", 1)[1]: games for name, games in by_category.items() if name.startswith("team:")
+    }
+    _save_duel_games(
+        output_dir,
+        username,
+        by_category["ranked"],
+        by_category["unranked"],
+        by_category["party"],
+        ranked_team_duels,
+    )
+    geocode_cache().save()
+
+
+def index_command(args):
+    """Create or update the SQLite index of a user's duels, which analyse and country then query."""
+    from geoguessr.sqlite_store import SQLITE_FILE, SqliteGameStore
+
+    os.makedirs(os.path.dirname(SQLITE_FILE), exist_ok=True)
+    started = time.perf_counter()
+    with SqliteGameStore(SQLITE_FILE) as store:
+        imported = store.sync(args.username)
+    print(f"Indexed {imported} new duel games for '{args.username}' in {SQLITE_FILE} in {time.perf_counter() - started:.1f}s")
+
 
 def display_command(args):
     """Display player data summary."""
@@ -240,7 +616,7 @@ def display_command(args):
         return
     
     if args.teammate:
-        games = player_data.ranked_team_duel_games.get(args.teammate, [])
+        games = player_data.team_duel_games(args.teammate)
     else:
         games = player_data.ranked_duel_games
     
@@ -269,29 +645,13 @@ def country_command(args):
         sys.exit(1)
 
     target_cc = country.strip().upper()
-    player_data = PlayerData(username)
 
-    if isinstance(include, str) and include.startswith("team:"):
-        teammate = include.split(":", 1)[1].strip()
-        team_games = list(player_data.ranked_team_duel_games.get(teammate, []))
-        duel_games: list[tuple[object, str]] = [(g, f"Team-{teammate}") for g in team_games]
-    elif include == "ranked":
-        duel_games = [(g, "Ranked") for g in list(player_data.ranked_duel_games)]
-    elif include == "unranked":
-        duel_games = [(g, "Unranked") for g in list(player_data.unranked_duel_games)]
-    elif include == "party":
-        duel_games = [(g, "Party") for g in list(getattr(player_data, "party_duel_games", []) or [])]
-    elif include == "both" or not include:
-        duel_games = [(g, "Ranked") for g in list(player_data.ranked_duel_games)] + [
-            (g, "Unranked") for g in list(player_data.unranked_duel_games)
-        ]
-    else:
-        print(f"Unknown --include value: {include}")
+    try:
+        parse_include(include)
+    except ValueError as e:
+        print(e)
         sys.exit(1)
 
-    if mode is not None:
-        duel_games = [(g, t) for (g, t) in duel_games if getattr(g, "mode", None) == mode]
-
     if max_days is not None:
         if max_days <= 0:
             print("--max-days must be a positive integer")
@@ -373,21 +733,11 @@ def country_command(args):
         team_multi = multiplier_safe(getattr(duel_round, "team_multiplier", 1.0))
         return (taken / opp_multi) - (dealt / team_multi)
 
-    def game_ts(game) -> float:
-        ts = getattr(game, "start_time", "") or getattr(game, "time", "") or ""
-        parsed = parse_ts(ts)
-        if parsed != float("-inf"):
-            return parsed
-        # Fallback: use the most recent round start time.
-        round_ts = [parse_ts(getattr(r, "start_time", "") or "") for r in getattr(game, "rounds", []) or []]
-        return max(round_ts) if round_ts else float("-inf")
-
-    if max_days is not None:
-        cutoff = datetime.now(timezone.utc).timestamp() - (float(max_days) * 86400.0)
-        duel_games = [(g, t) for (g, t) in duel_games if game_ts(g) >= cutoff]
-
-    if max_games is not None:
-        duel_games = sorted(duel_games, key=game_ts, reverse=True)[:max_games]
+    labels = {"ranked": "Ranked", "unranked": "Unranked", "party": "Party"}
+    selected = PlayerData(username).select_duel_games(include, mode, max_days, max_games, country=target_cc)
+    duel_games: list[tuple[object, str]] = [
+        (g, labels.get(category) or f"Team-{category.split(':', 1)[1]}") for category, g in selected
+    ]
 
     # Heuristic warning: older output JSON (fetched before multiplier support) will load with
     # default multiplier values (1.0 / False), which makes normalized net misleading.
@@ -401,7 +751,7 @@ def country_command(args):
     if sample_rounds and missing:
         print(
             f"Warning: duel multipliers appear missing for {missing}/{len(sample_rounds)} sampled rounds; "
-            "run `python -m geoguessr fetch <user> --overwrite --max-games N` to backfill.",
+            "run `python -m geoguessr reparse <user>` (or `fetch <user> --overwrite`) to backfill.",
             file=sys.stderr,
         )
 
@@ -544,71 +894,42 @@ def analyse_command(args):
         team_multi = _multiplier_safe(getattr(duel_round, "team_multiplier", 1.0))
         return (taken / opp_multi) - (dealt / team_multi)
 
-    def _parse_game_timestamp(game) -> float:
-        """Return a sortable timestamp (seconds since epoch) for a duel game."""
-        ts = getattr(game, "start_time", "") or getattr(game, "time", "") or ""
-        if not ts:
-            return float("-inf")
-        try:
-            import re
-
-            s = ts.replace("Z", "+00:00")
-            m = re.match(r"^(.*T\d\d:\d\d:\d\d)\.(\d+)([+-]\d\d:\d\d)$", s)
-            if m:
-                base, frac, offset = m.group(1), m.group(2), m.group(3)
-                frac = (frac[:6]).ljust(6, "0")
-                s = f"{base}.{frac}{offset}"
-
-            dt = datetime.fromisoformat(s)
-            if dt.tzinfo is None:
-                dt = dt.replace(tzinfo=timezone.utc)
-            return dt.timestamp()
-        except Exception:
-            return float("-inf")
-
     analysis_type = args.type
     if analysis_type is not None and analysis_type not in {"region", "wrong-country", "win-percentage"}:
         print(f"Unknown analysis type: {analysis_type}")
         sys.exit(1)
 
-    player_data = PlayerData(args.username)
-
     max_days = getattr(args, "max_days", None)
 
     include = args.include
-    if isinstance(include, str) and include.startswith("team:"):
-        teammate = include.split(":", 1)[1].strip()
-        duel_games = list(player_data.ranked_team_duel_games.get(teammate, []))
-    elif include == "ranked":
-        duel_games = list(player_data.ranked_duel_games)
-    elif include == "unranked":
-        duel_games = list(player_data.unranked_duel_games)
-    elif include == "party":
-        duel_games = list(getattr(player_data, "party_duel_games", []) or [])
-    elif include == "both" or not include:
-        duel_games = list(player_data.ranked_duel_games) + list(player_data.unranked_duel_games)
-    else:
-        print(f"Unknown --include value: {include}")
+    try:
+        parse_include(include)
+    except ValueError as e:
+        print(e)
         sys.exit(1)
 
     mode = _parse_analyse_mode(args.mode)
-    if mode:
-        duel_games = [game for game in duel_games if game.mode == mode]
 
     if max_days is not None:
         if max_days <= 0:
             print("--max-days must be a positive integer")
             sys.exit(1)
-        cutoff = datetime.now(timezone.utc).timestamp() - (float(max_days) * 86400.0)
-        duel_games = [g for g in duel_games if _parse_game_timestamp(g) >= cutoff]
 
     if args.max_games is not None:
         if args.max_games <= 0:
             print("--max-games must be a positive integer")
             sys.exit(1)
-        # Ensure we always take the most recent games (especially for --include both).
-        duel_games.sort(key=_parse_game_timestamp, reverse=True)
-        duel_games = duel_games[: args.max_games]
+
+    # Long indexed histories are read as a columnar table of rounds and aggregated with NumPy.
+    player_data = PlayerData(args.username)
+    table = player_data.duel_round_table(include, mode, max_days, args.max_games)
+    if table is not None:
+        duel_games = []
+        game_count = table.game_count
+    else:
+        selected = player_data.select_duel_games(include, mode, max_days, args.max_games)
+        duel_games = [game for _category, game in selected]
+        game_count = len(duel_games)
 
     def multiplier_fields_look_missing(duel_round) -> bool:
         try:
@@ -621,17 +942,20 @@ def analyse_command(args):
         opp_active = bool(getattr(duel_round, "opponent_active_multiplier", False))
         return team_multi == 1.0 and opp_multi == 1.0 and (not team_active) and (not opp_active)
 
-    sample_rounds = []
-    for g in duel_games[: min(len(duel_games), 25)]:
-        sample_rounds.extend((getattr(g, "rounds", []) or [])[:10])
-    if sample_rounds:
-        missing = sum(1 for r in sample_rounds if multiplier_fields_look_missing(r))
+    if table is not None:
+        sample = (table.game < 25) & (table.round_number <= 10)
+        sampled = int(sample.sum())
+        missing = int((table.multipliers_missing & sample).sum())
     else:
-        missing = 0
-    if sample_rounds and missing:
+        sample_rounds = []
+        for g in duel_games[: min(len(duel_games), 25)]:
+            sample_rounds.extend((getattr(g, "rounds", []) or [])[:10])
+        sampled = len(sample_rounds)
+        missing = sum(1 for r in sample_rounds if multiplier_fields_look_missing(r))
+    if sampled and missing:
         print(
-            f"Warning: duel multipliers appear missing for {missing}/{len(sample_rounds)} sampled rounds; "
-            "run `python -m geoguessr fetch <user> --overwrite --max-games N` to backfill.",
+            f"Warning: duel multipliers appear missing for {missing}/{sampled} sampled rounds; "
+            "run `python -m geoguessr reparse <user>` (or `fetch <user> --overwrite`) to backfill.",
             file=sys.stderr,
         )
 
@@ -676,17 +1000,27 @@ def analyse_command(args):
             return False
         return all(g == correct_cc for g in guessed_ccs)
 
-    rounds_by_country: dict[str, list] = {}
-    for game in duel_games:
-        for duel_round in game.rounds:
-            if not has_two_guess_locations(duel_round):
-                continue
-            cc = (duel_round.country_code or "").upper() or "??"
-            if analysis_type == "region" and not _round_both_players_correct_country(duel_round):
-                continue
-            rounds_by_country.setdefault(cc, []).append(duel_round)
+    if table is not None:
+        round_mask = table.two_guesses
+        if analysis_type == "region":
+            round_mask = round_mask & table.all_guessed_correct
+        stats = table.country_stats(round_mask)
+        avg_net_by_country = table.mean_by_country(table.net_damage(), round_mask)
+    else:
+        rounds_by_country: dict[str, list] = {}
+        for game in duel_games:
+            for duel_round in game.rounds:
+                if not has_two_guess_locations(duel_round):
+                    continue
+                cc = (duel_round.country_code or "").upper() or "??"
+                if analysis_type == "region" and not _round_both_players_correct_country(duel_round):
+                    continue
+                rounds_by_country.setdefault(cc, []).append(duel_round)
 
-    stats = [CountryStats.from_rounds(cc, rounds) for cc, rounds in rounds_by_country.items()]
+        stats = [CountryStats.from_rounds(cc, rounds) for cc, rounds in rounds_by_country.items()]
+        avg_net_by_country = {
+            cc: sum(_net_damage_normalized(r) for r in rounds) / len(rounds) for cc, rounds in rounds_by_country.items()
+        }
 
     if args.min_rounds is not None:
         if args.min_rounds < 0:
@@ -695,10 +1029,7 @@ def analyse_command(args):
         stats = [s for s in stats if s.total_rounds >= args.min_rounds]
 
     def avg_net_damage(s: CountryStats) -> float:
-        rounds = rounds_by_country.get(s.country_code, [])
-        if not rounds:
-            return 0.0
-        return sum(_net_damage_normalized(r) for r in rounds) / len(rounds)
+        return avg_net_by_country.get(s.country_code, 0.0)
 
     if analysis_type is None:
         stats.sort(key=avg_net_damage, reverse=True)
@@ -706,7 +1037,7 @@ def analyse_command(args):
         print(f"Country net damage (avg taken/opponent_multi - dealt/team_multi) for {args.username}")
         print(f"  Include: {include}")
         print(f"  Mode: {mode.value if mode else 'All'}")
-        print(f"  Games: {len(duel_games)}")
+        print(f"  Games: {game_count}")
         print(f"  Countries: {len(stats)}")
 
         for idx, s in enumerate(stats, start=1):
@@ -725,7 +1056,7 @@ def analyse_command(args):
         print(f"Win-percentage analysis for {args.username}")
         print(f"  Include: {include}")
         print(f"  Mode: {mode.value if mode else 'All'}")
-        print(f"  Games: {len(duel_games)}")
+        print(f"  Games: {game_count}")
         print(f"  Countries: {len(stats)}")
 
         for idx, s in enumerate(stats, start=1):
@@ -741,28 +1072,33 @@ def analyse_command(args):
         wrong_by_country: dict[str, int] = {}
         total_by_country: dict[str, int] = {}
 
-        for game in duel_games:
-            player_id = getattr(game, "player_id", "") or ""
-            for duel_round in game.rounds:
-                if not has_two_guess_locations(duel_round):
-                    continue
-                actual_cc = (getattr(duel_round, "country_code", "") or "").upper() or "??"
-                if actual_cc == "??":
-                    continue
-
-                guess_locations = getattr(duel_round, "guess_locations", None) or {}
-                if not isinstance(guess_locations, dict) or not player_id:
-                    continue
-                player_guess = guess_locations.get(player_id) or {}
-                if not isinstance(player_guess, dict):
-                    continue
-                guessed_cc = (player_guess.get("country_code") or "").upper()
-                if not guessed_cc:
-                    continue
-
-                total_by_country[actual_cc] = total_by_country.get(actual_cc, 0) + 1
-                if guessed_cc != actual_cc:
-                    wrong_by_country[actual_cc] = wrong_by_country.get(actual_cc, 0) + 1
+        if table is not None:
+            for cc, (wrong, total) in table.wrong_country_counts(table.two_guesses).items():
+                total_by_country[cc] = total
+                wrong_by_country[cc] = wrong
+        else:
+            for game in duel_games:
+                player_id = getattr(game, "player_id", "") or ""
+                for duel_round in game.rounds:
+                    if not has_two_guess_locations(duel_round):
+                        continue
+                    actual_cc = (getattr(duel_round, "country_code", "") or "").upper() or "??"
+                    if actual_cc == "??":
+                        continue
+
+                    guess_locations = getattr(duel_round, "guess_locations", None) or {}
+                    if not isinstance(guess_locations, dict) or not player_id:
+                        continue
+                    player_guess = guess_locations.get(player_id) or {}
+                    if not isinstance(player_guess, dict):
+                        continue
+                    guessed_cc = (player_guess.get("country_code") or "").upper()
+                    if not guessed_cc:
+                        continue
+
+                    total_by_country[actual_cc] = total_by_country.get(actual_cc, 0) + 1
+                    if guessed_cc != actual_cc:
+                        wrong_by_country[actual_cc] = wrong_by_country.get(actual_cc, 0) + 1
 
         rows: list[tuple[str, int, int, float]] = []
         for cc, total in total_by_country.items():
@@ -779,7 +1115,7 @@ def analyse_command(args):
         print(f"Wrong-country analysis for {args.username}")
         print(f"  Include: {include}")
         print(f"  Mode: {mode.value if mode else 'All'}")
-        print(f"  Games: {len(duel_games)}")
+        print(f"  Games: {game_count}")
         print(f"  Countries: {len(rows)}")
 
         for idx, (cc, wrong, total, wrong_pct) in enumerate(rows, start=1):
@@ -793,7 +1129,7 @@ def analyse_command(args):
     print(f"Region analysis for {args.username}")
     print(f"  Include: {include}")
     print(f"  Mode: {mode.value if mode else 'All'}")
-    print(f"  Games: {len(duel_games)}")
+    print(f"  Games: {game_count}")
     print(f"  Regions: {len(stats)}")
 
     for idx, s in enumerate(stats, start=1):
@@ -804,6 +1140,23 @@ def analyse_command(args):
         )
 
 
+def boundaries_command(args):
+    """Download country outlines and write the boundary file used to place guesses in countries."""
+    from geoguessr.boundaries import COUNTRY_BOUNDARIES_FILE, NATURAL_EARTH_COUNTRIES_URL, build_boundaries_file
+
+    source = args.source or NATURAL_EARTH_COUNTRIES_URL
+    output = args.output or COUNTRY_BOUNDARIES_FILE
+    print(f"Reading country outlines from {source}...")
+    try:
+        count = build_boundaries_file(source, output)
+    except Exception as e:
+        print(f"Could not build {output}: {e}")
+        sys.exit(1)
+    print(f"Wrote {count} countries to {output}.")
+    if os.path.abspath(output) != os.path.abspath(COUNTRY_BOUNDARIES_FILE):
+        print(f"Set GG_COUNTRY_BOUNDARIES={output} to use it.")
+
+
 def web_command(args):
     """Run a local web UI for analyse/country."""
     try:
@@ -845,8 +1198,83 @@ def main():
     fetch_parser.add_argument("username", type=str, help="Username to fetch token for")
     fetch_parser.add_argument("--max-games", type=int, default=10000, help="Maximum number of games to query (default: 10000)")
     fetch_parser.add_argument("--overwrite", action="store_true", help="Overwrite existing data files")
+    fetch_parser.add_argument(
+        "--older",
+        action="store_true",
+        help="Extend stored history backwards: page past the oldest stored games and append older ones",
+    )
+    fetch_parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=4,
+        help="Number of game detail and username requests in flight at once, alongside feed pagination (default: 4)",
+    )
+    fetch_parser.add_argument(
+        "--rate",
+        type=float,
+        default=10.0,
+        help="Initial request rate in requests/second; adapts to 429s and server errors (default: 10)",
+    )
+    fetch_parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Always download game details instead of using the raw payload cache in output/cache",
+    )
+    fetch_parser.add_argument(
+        "--async",
+        dest="use_async",
+        action="store_true",
+        help="Fetch with the asyncio engine (requires aiohttp); --concurrency can then be much higher",
+    )
     fetch_parser.set_defaults(func=fetch_command)
     
+    # Fetch-all subcommand
+    fetch_all_parser = subparsers.add_parser("fetch-all", help="Fetch GeoGuessr games for every user in users.json")
+    fetch_all_parser.add_argument("--max-games", type=int, default=10000, help="Maximum number of games to query per user (default: 10000)")
+    fetch_all_parser.add_argument("--overwrite", action="store_true", help="Overwrite existing data files")
+    fetch_all_parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=4,
+        help="Number of game detail and username requests in flight at once per user (default: 4)",
+    )
+    fetch_all_parser.add_argument(
+        "--max-requests",
+        type=int,
+        default=8,
+        help="Maximum requests in flight across all users (default: 8)",
+    )
+    fetch_all_parser.add_argument(
+        "--rate",
+        type=float,
+        default=10.0,
+        help="Initial request rate in requests/second, shared by all users; adapts to 429s and server errors (default: 10)",
+    )
+    fetch_all_parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Always download game details instead of using the raw payload cache in output/cache",
+    )
+    fetch_all_parser.set_defaults(func=fetch_all_command)
+
+    # Reparse subcommand
+    reparse_parser = subparsers.add_parser("reparse", help="Rebuild standard game and duel files from stored and cached raw payloads (no network)")
+    reparse_parser.add_argument("username", type=str, help="Username whose output files to rebuild")
+    reparse_parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Number of worker processes (default: one per CPU core)",
+    )
+    reparse_parser.set_defaults(func=reparse_command)
+
+    # Index subcommand
+    index_parser = subparsers.add_parser(
+        "index", help="Create or update output/games.sqlite, an SQLite index of a user's duels used by analyse and country"
+    )
+    index_parser.add_argument("username", type=str, help="Username whose duel files to index")
+    index_parser.set_defaults(func=index_command)
+
     # Display subcommand
     display_parser = subparsers.add_parser("display", help="Display player data summary")
     display_parser.add_argument("player", help="Player name or ID to filter by")
@@ -896,6 +1324,24 @@ def main():
     analyse_parser.add_argument("--min-rounds", type=int, default=None, help="Only include countries with at least this many rounds")
     analyse_parser.set_defaults(func=analyse_command)
 
+    # Boundaries subcommand
+    boundaries_parser = subparsers.add_parser(
+        "boundaries", help="Download country outlines so guesses are placed in countries by point-in-polygon"
+    )
+    boundaries_parser.add_argument(
+        "--source",
+        type=str,
+        default=None,
+        help="URL or path of a GeoJSON of country polygons (default: Natural Earth 1:10m countries)",
+    )
+    boundaries_parser.add_argument(
+        "--output",
+        type=str,
+        default=None,
+        help="File to write (default: data/country_boundaries.geojson, or GG_COUNTRY_BOUNDARIES)",
+    )
+    boundaries_parser.set_defaults(func=boundaries_command)
+
     # Web UI subcommand
     web_parser = subparsers.add_parser("web", help="Run a local web UI")
     web_parser.add_argument("--host", type=str, default="127.0.0.1", help="Host to bind (default: 127.0.0.1)")
@@ -0,0 +1,279 @@
+# asyncio fetch engine for the GeoGuessr API
+
+import asyncio
+import json
+import time
+from functools import partial
+from typing import Optional
+
+from tqdm import tqdm
+
+from geoguessr.cache import DUELS_ENDPOINT, GAMES_ENDPOINT
+from geoguessr.game import GameType, GeoguessrDuelGame
+from geoguessr.geoguessr import DUEL_GAME_TYPES, FEED_GAME_TYPES, FeedScan, Geoguessr, feed_game_key
+from geoguessr.ratelimit import parse_retry_after
+
+try:
+    import aiohttp
+except Exception:  # pragma: no cover
+    aiohttp = None
+
+
+def async_fetch_available() -> bool:
+    """Whether the asyncio engine can be used (aiohttp is installed)."""
+    return aiohttp is not None
+
+
+class AsyncGeoguessr(Geoguessr):
+    """
+    asyncio counterpart of the Geoguessr client.
+
+    Takes the same arguments and exposes the same results (daily_challenge_games, standard_games,
+    ranked_duel_games, unranked_duel_games, ranked_team_duel_games, request counts and metrics), but
+    nothing is fetched until `await fetch()`. Requests are coroutines sharing one aiohttp session, so
+    `concurrency` can be in the hundreds or thousands without a thread per request, and the fetch can run
+    on an existing event loop such as the web app's. Payload cache reads/writes, duel parsing and the
+    batched guess geocoding run in worker threads so they don't stall the loop.
+    """
+
+    def __init__(
+        self,
+        username: str,
+        ncfa_cookie: str,
+        last_challenge_seed: str,
+        last_standard_game_token: str,
+        last_ranked_duel_id: str,
+        last_unranked_duel_id: str,
+        last_team_duel_id: str,
+        max_games: int = 50,
+        **kwargs,
+    ) -> None:
+        if aiohttp is None:
+            raise ImportError("The asyncio fetch engine needs aiohttp: pip install aiohttp")
+        self._configure(username, ncfa_cookie, **kwargs)
+        self._last_ids = {
+            GameType.DAILY_CHALLENGE: last_challenge_seed,
+            GameType.STANDARD: last_standard_game_token,
+            GameType.RANKED_DUELS: last_ranked_duel_id,
+            GameType.UNRANKED_DUELS: last_unranked_duel_id,
+            GameType.RANKED_TEAM_DUELS: last_team_duel_id,
+        }
+        self._max_games = max_games
+        self._session = None
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    async def fetch(self) -> None:
+        """Run the full fetch: feed pagination, game details and username resolution."""
+        # At most `concurrency` detail or username requests at once, like the worker pool of the
+        # threaded client; one more connection is kept for the feed.
+        self._slots = asyncio.Semaphore(self.concurrency)
+        connector = aiohttp.TCPConnector(limit=self.concurrency + 1)
+        async with aiohttp.ClientSession(headers=self._get_headers(), connector=connector) as session:
+            self._session = session
+            try:
+                self.user_id = self._restored_user_id() or self._user_id_from_payload(
+                    await self._make_request_async(f"{self.base_url}/api/v3/profiles")
+                )
+                if self.checkpoint is not None:
+                    self.checkpoint.user_id = self.user_id
+                self._print_fetch_start(*self._last_ids.values())
+                await self._get_games_async()
+                print("Converting user IDs to usernames...", file=self.output)
+                await self._resolve_usernames_async(self._duel_user_ids())
+                self._apply_usernames()
+            finally:
+                self._session = None
+        if self._owns_username_cache:
+            await asyncio.to_thread(self.username_cache.save)
+        self._print_fetch_summary()
+
+    async def _make_request_async(self, endpoint: str, *, timeout: tuple[float, float] = (20.0, 60.0), max_retries: int = 6):
+        """
+        GET a GeoGuessr API endpoint and return parsed JSON, or None on failure.
+
+        Same rate limiting, retries and accounting as `Geoguessr._make_request`, but waits with
+        asyncio.sleep so other requests keep running.
+        """
+        client_timeout = aiohttp.ClientTimeout(sock_connect=timeout[0], sock_read=timeout[1])
+        for attempt in range(1, max_retries + 1):
+            retry_after = None
+            await self._acquire_async()
+            try:
+                started = time.perf_counter()
+                body = b""
+                try:
+                    async with self._session.get(endpoint, timeout=client_timeout) as response:
+                        status = response.status
+                        retry_header = response.headers.get("Retry-After")
+                        body = await response.read()
+                finally:
+                    elapsed = time.perf_counter() - started
+                    self.rate_limiter.release()
+                    self.metrics.record_request(endpoint, elapsed, len(body))
+                    with self._lock:
+                        self.request_count += 1
+                        self.request_seconds += elapsed
+
+                # Retry on transient server issues / rate limiting.
+                if status == 429:
+                    retry_after = parse_retry_after(retry_header)
+                    self.rate_limiter.record_throttle(retry_after)
+                elif status >= 500:
+                    self.rate_limiter.record_error()
+                else:
+                    self.rate_limiter.record_success()
+                    if status >= 400:
+                        return None
+                    try:
+                        return json.loads(body)
+                    except Exception:
+                        return None
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                self.rate_limiter.record_error()
+
+            if attempt < max_retries:
+                with self._lock:
+                    self.retry_count += 1
+                self.metrics.record_retry(endpoint)
+                await asyncio.sleep(self.rate_limiter.backoff(attempt, retry_after))
+
+        with self._lock:
+            self.dropped_requests.append(endpoint)
+        self.metrics.record_failure(endpoint)
+        return None
+
+    async def _acquire_async(self) -> None:
+        """Wait for the shared rate limiter without blocking the event loop."""
+        while True:
+            wait = self.rate_limiter.try_acquire()
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+
+    async def _get_payload_async(self, endpoint: str, key: str, url: str):
+        """
+        Return the raw payload for a game, from the payload cache when possible; like the threaded engine, a
+        game another fetch sharing the cache is already downloading is waited for rather than requested again.
+        """
+        if self.payload_cache is None:
+            return await self._make_request_async(url)
+        return await self.payload_cache.get_or_fetch_async(endpoint, key, partial(self._make_request_async, url))
+
+    async def _query_details_async(self, game_type: GameType, game):
+        """Fetch and parse the details of one feed entry; games parsed in a resumed checkpoint need no request."""
+        key = feed_game_key(game_type, game)
+        if self.checkpoint is not None:
+            restored = self.checkpoint.get_details(game_type, key)
+            if restored is not None:
+                return restored
+        async with self._slots:
+            if game_type == GameType.STANDARD:
+                with self.metrics.phase("standard details"):
+                    result = None
+                    if key:
+                        raw_data = await self._get_payload_async(GAMES_ENDPOINT, key, f"{self.base_url}/api/v3/games/{key}")
+                        result = self._standard_game_from_payload(game, raw_data)
+            else:
+                with self.metrics.phase("duel details"):
+                    raw_data = await self._get_payload_async(DUELS_ENDPOINT, key, f"{self.game_server_url}/api/duels/{key}")
+                    result = None
+                    if raw_data is not None:
+                        result = await asyncio.to_thread(
+                            GeoguessrDuelGame.from_geoguessr_data, game_type, key, self.user_id, raw_data, False
+                        )
+        if self.checkpoint is not None:
+            self.checkpoint.record_details(game_type, key, result)
+            await asyncio.to_thread(self.checkpoint.save, False)
+        return result
+
+    async def _get_games_async(self) -> None:
+        """
+        Page through the feed, fetching the details of every new game as soon as it is found.
+
+        Each new game becomes a task straight away, so detail requests overlap with the following
+        feed pages exactly as in the threaded pipeline.
+        """
+        scan = FeedScan(self._last_ids, self._max_games, older_than=self.older_than, known_game_ids=self.known_game_ids)
+        # Pending detail requests for each game type, in feed order
+        detail_tasks = {game_type: [] for game_type in FEED_GAME_TYPES}
+
+        def submit(game_type: GameType, game) -> None:
+            if self._needs_details(game_type, game):
+                detail_tasks[game_type].append(asyncio.ensure_future(self._query_details_async(game_type, game)))
+
+        started = time.perf_counter()
+        checkpoint = self.checkpoint
+        try:
+            if checkpoint is not None and checkpoint.resumed:
+                for game_type, game in scan.restore(checkpoint):
+                    submit(game_type, game)
+
+            while not scan.done:
+                with self.metrics.phase("feed"):
+                    raw_data = await self._make_request_async(self._feed_url(scan.token))
+                page_games, token = self._parse_feed_page(raw_data)
+                for game_type, game in scan.add_page(page_games, token):
+                    submit(game_type, game)
+                if checkpoint is not None:
+                    scan.record(checkpoint)
+                    await asyncio.to_thread(checkpoint.save, False)
+
+            scan.feed_complete = True
+            if checkpoint is not None:
+                scan.record(checkpoint)
+                await asyncio.to_thread(checkpoint.save)
+            self.pages_fetched = scan.pages_fetched
+            print(scan.summary(time.perf_counter() - started), file=self.output)
+            self.daily_challenge_games = scan.games[GameType.DAILY_CHALLENGE]
+
+            standard = await self._gather_in_order(detail_tasks[GameType.STANDARD], "Querying Standard game data")
+            self.standard_games = [game for game in standard if game is not None]
+            duels = {}
+            for game_type in DUEL_GAME_TYPES:
+                results = await self._gather_in_order(detail_tasks[game_type], f"Querying {game_type} data")
+                duels[game_type] = [game for game in results if game is not None]
+            await asyncio.to_thread(self._resolve_guess_countries, duels)
+            self._set_duel_results(duels)
+        except BaseException:
+            # Covers cancellation too, e.g. the web request going away.
+            for task in (task for tasks in detail_tasks.values() for task in tasks):
+                task.cancel()
+            self._save_interrupted_checkpoint()
+            raise
+        if checkpoint is not None:
+            await asyncio.to_thread(checkpoint.save)
+        print(f"Fetched all game details {time.perf_counter() - started:.1f}s after the first feed page.", file=self.output)
+
+    async def _gather_in_order(self, tasks: list, desc: str) -> list:
+        """Wait for tasks with a progress bar and return their results in the order they were created."""
+        with tqdm(total=len(tasks), desc=desc, disable=self.output is not None) as progress:
+            for next_done in asyncio.as_completed(tasks):
+                await next_done
+                progress.update()
+        return [task.result() for task in tasks]
+
+    async def _resolve_usernames_async(self, user_ids) -> None:
+        """
+        Look up every user ID missing from the username cache (or expired) concurrently; IDs another fetch
+        sharing the cache is already looking up are waited for rather than requested again.
+        """
+        unresolved = self.username_cache.unresolved(user_ids)
+        if not unresolved:
+            return
+
+        async def lookup(user_id: str) -> Optional[str]:
+            pending = self.username_cache.begin_lookup(user_id)
+            if pending is not None:
+                return await asyncio.wrap_future(pending)
+            name = None
+            try:
+                async with self._slots:
+                    with self.metrics.phase("usernames"):
+                        name = self._username_from_payload(
+                            await self._make_request_async(f"{self.base_url}/api/v3/users/{user_id}")
+                        )
+                return name
+            finally:
+                self.username_cache.finish_lookup(user_id, name)
+
+        await self._gather_in_order([asyncio.ensure_future(lookup(user_id)) for user_id in unresolved], "Resolving usernames")
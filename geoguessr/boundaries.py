@@ -0,0 +1,433 @@
+# Offline point-in-polygon country lookup with a grid index
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from typing import TYPE_CHECKING, Optional
+
+# NumPy is imported by the functions that use it: the geocode cache asks for boundaries_signature()
+# whenever it is created, and that shouldn't cost a NumPy import.
+if TYPE_CHECKING:
+    import numpy as np
+
+# GeoJSON FeatureCollection of country polygons, e.g. Natural Earth "Admin 0 - Countries" (public domain),
+# written by `python -m geoguessr boundaries`.
+COUNTRY_BOUNDARIES_FILE = os.getenv("GG_COUNTRY_BOUNDARIES", "data/country_boundaries.geojson")
+
+# Natural Earth 1:10m countries as GeoJSON (about 25 MB before trimming).
+NATURAL_EARTH_COUNTRIES_URL = (
+    "https://raw.githubusercontent.com/nvkelso/natural-earth-vector/master/geojson/ne_10m_admin_0_countries.geojson"
+)
+
+# Decimal places kept in the trimmed boundary file (about 11 m, like the geocode cache keys).
+BOUNDARY_PRECISION = 4
+
+# Size of the index grid cells, in degrees.
+GRID_CELL_DEG = 1.0
+
+# Points outside every polygon but within this distance of a coastline or border are given that
+# country, so guesses on a beach or a river border aren't lost to the simplified outlines.
+COASTAL_TOLERANCE_KM = 5.0
+
+# Properties holding the ISO 3166-1 alpha-2 code, in order of preference (Natural Earth sets ISO_A2
+# to "-99" for a few countries whose ISO_A2_EH is correct).
+_CODE_PROPERTIES = ["ISO_A2_EH", "ISO_A2", "iso_a2", "ISO3166-1-Alpha-2", "iso2", "cc"]
+
+_KM_PER_DEG = 111.32
+# Bound on points x edges in one vectorised crossing test, to keep memory use flat.
+_MAX_PAIRS = 4_000_000
+
+# Cell states in the grid; values >= 0 are the code index of a cell lying entirely inside one country.
+_BOUNDARY = -1
+_EMPTY = -2
+
+
+def _feature_code(properties: dict) -> str:
+    for name in _CODE_PROPERTIES:
+        value = str(properties.get(name) or "").strip()
+        if len(value) == 2 and value.isalpha():
+            return value.lower()
+    return ""
+
+
+def _round_coordinates(coordinates, precision: int):
+    if coordinates and isinstance(coordinates[0], (int, float)):
+        return [round(value, precision) for value in coordinates[:2]]
+    return [_round_coordinates(part, precision) for part in coordinates]
+
+
+def build_boundaries_file(
+    source: str = NATURAL_EARTH_COUNTRIES_URL, path: str = COUNTRY_BOUNDARIES_FILE, precision: int = BOUNDARY_PRECISION
+) -> int:
+    """
+    Write the boundary file from a GeoJSON of country polygons (a URL or a local file), keeping only the
+    polygons, an ISO_A2 property and coordinates rounded to `precision` places. Returns the number of countries.
+    """
+    if source.startswith(("http://", "https://")):
+        import requests
+
+        response = requests.get(source, timeout=120)
+        response.raise_for_status()
+        data = response.json()
+    else:
+        with open(source, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    features = []
+    for feature in data.get("features") or []:
+        code = _feature_code(feature.get("properties") or {})
+        geometry = feature.get("geometry") or {}
+        if not code or geometry.get("type") not in ("Polygon", "MultiPolygon"):
+            continue
+        features.append(
+            {
+                "type": "Feature",
+                "properties": {"ISO_A2": code.upper()},
+                "geometry": {
+                    "type": geometry["type"],
+                    "coordinates": _round_coordinates(geometry.get("coordinates") or [], precision),
+                },
+            }
+        )
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"type": "FeatureCollection", "features": features}, f, separators=(",", ":"))
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    return len({feature["properties"]["ISO_A2"] for feature in features})
+
+
+def _polygon_edges(rings: list) -> Optional[np.ndarray]:
+    """Return every edge of a polygon's rings (exterior and holes) as rows of (x1, y1, x2, y2)."""
+    import numpy as np
+
+    edges = []
+    for ring in rings:
+        points = np.asarray(ring, dtype=float)
+        if points.ndim != 2 or len(points) < 3:
+            continue
+        points = points[:, :2]
+        if not np.array_equal(points[0], points[-1]):
+            points = np.vstack([points, points[:1]])
+        edges.append(np.hstack([points[:-1], points[1:]]))
+    return np.vstack(edges) if edges else None
+
+
+def _crossings(edges: np.ndarray, xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+    """Even-odd test: whether each point is inside the polygon the edges belong to (holes included)."""
+    import numpy as np
+
+    inside = np.zeros(len(xs), dtype=bool)
+    if not len(edges) or not len(xs):
+        return inside
+    x1, y1, x2, y2 = edges[:, 0], edges[:, 1], edges[:, 2], edges[:, 3]
+    step = max(1, _MAX_PAIRS // len(edges))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for start in range(0, len(xs), step):
+            px = xs[start:start + step, None]
+            py = ys[start:start + step, None]
+            spans = (y1 > py) != (y2 > py)
+            x_cross = x1 + (py - y1) * (x2 - x1) / (y2 - y1)
+            inside[start:start + step] = np.count_nonzero(spans & (px < x_cross), axis=1) % 2 == 1
+    return inside
+
+
+def _distance_km(edges: np.ndarray, xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+    """Approximate distance from each point to the nearest edge, in km (equirectangular)."""
+    import numpy as np
+
+    out = np.full(len(xs), np.inf)
+    if not len(edges) or not len(xs):
+        return out
+    step = max(1, _MAX_PAIRS // len(edges))
+    for start in range(0, len(xs), step):
+        px = xs[start:start + step, None]
+        py = ys[start:start + step, None]
+        scale = np.cos(np.radians(py))
+        ax, ay = edges[:, 0] * scale, edges[:, 1]
+        bx, by = edges[:, 2] * scale, edges[:, 3]
+        qx = px * scale
+        dx, dy = bx - ax, by - ay
+        length2 = dx * dx + dy * dy
+        with np.errstate(divide="ignore", invalid="ignore"):
+            t = np.clip(np.where(length2 > 0, ((qx - ax) * dx + (py - ay) * dy) / length2, 0.0), 0.0, 1.0)
+        cx, cy = ax + t * dx - qx, ay + t * dy - py
+        out[start:start + step] = np.sqrt(cx * cx + cy * cy).min(axis=1) * _KM_PER_DEG
+    return out
+
+
+class CountryBoundaries:
+    """
+    Country lookup by point-in-polygon against country outlines, indexed by a regular lat/lng grid.
+
+    When built, every grid cell is classified as empty (no country), entirely inside one country, or
+    crossed by a border or coastline. Points in the first two kinds of cell are answered from the grid
+    alone; only points in boundary cells are tested against the few polygons whose bounding box
+    overlaps the cell, using just the edges in that cell's latitude band. Empty cells within the coastal
+    tolerance of a boundary cell are treated as boundary cells too, and points found outside every polygon
+    are snapped to outlines in the neighbouring cells as well as their own. Lookups are batched and
+    vectorised with NumPy.
+    """
+
+    def __init__(self, codes: list[str], polygons: list[tuple[int, np.ndarray]], cell_deg: float = GRID_CELL_DEG) -> None:
+        # codes[i] is the lower-case country code of code index i; polygons are (code index, edges).
+        import numpy as np
+
+        self.codes = codes
+        self.polygons = polygons
+        self.cell_deg = float(cell_deg)
+        self.cols = int(np.ceil(360.0 / self.cell_deg))
+        self.rows = int(np.ceil(180.0 / self.cell_deg))
+        self._band_edges: dict[tuple[int, int], np.ndarray] = {}
+        self._near_edges: dict[tuple[int, int], np.ndarray] = {}
+        self._near_parts: dict[tuple[int, int], np.ndarray] = {}
+        # How far (in degrees, and in grid rows) the coastal tolerance reaches north and south.
+        self._margin_deg = COASTAL_TOLERANCE_KM / _KM_PER_DEG
+        self._margin_rows = int(np.ceil(self._margin_deg / self.cell_deg))
+        self._build_grid()
+
+    @classmethod
+    def from_geojson(cls, path: str = COUNTRY_BOUNDARIES_FILE, cell_deg: float = GRID_CELL_DEG) -> "CountryBoundaries":
+        """Load a GeoJSON FeatureCollection of Polygon/MultiPolygon features with an ISO alpha-2 property."""
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        codes: list[str] = []
+        index: dict[str, int] = {}
+        polygons = []
+        for feature in data.get("features") or []:
+            code = _feature_code(feature.get("properties") or {})
+            geometry = feature.get("geometry") or {}
+            if not code:
+                continue
+            if geometry.get("type") == "Polygon":
+                parts = [geometry.get("coordinates") or []]
+            elif geometry.get("type") == "MultiPolygon":
+                parts = geometry.get("coordinates") or []
+            else:
+                continue
+            for rings in parts:
+                edges = _polygon_edges(rings)
+                if edges is None:
+                    continue
+                if code not in index:
+                    index[code] = len(codes)
+                    codes.append(code)
+                polygons.append((index[code], edges))
+        return cls(codes, polygons, cell_deg)
+
+    def _cell(self, xs: np.ndarray, ys: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        import numpy as np
+
+        cols = np.clip(((xs + 180.0) // self.cell_deg).astype(int), 0, self.cols - 1)
+        rows = np.clip(((ys + 90.0) // self.cell_deg).astype(int), 0, self.rows - 1)
+        return rows, cols
+
+    def _build_grid(self) -> None:
+        import numpy as np
+
+        grid = np.full((self.rows, self.cols), _EMPTY, dtype=np.int32)
+        boundary = np.zeros((self.rows, self.cols), dtype=bool)
+        candidates: dict[tuple[int, int], list[int]] = {}
+        for i, (_code, edges) in enumerate(self.polygons):
+            xs = np.concatenate([edges[:, 0], edges[:, 2]])
+            ys = np.concatenate([edges[:, 1], edges[:, 3]])
+            row_lo, col_lo = self._cell(np.array([xs.min()]), np.array([ys.min()]))
+            row_hi, col_hi = self._cell(np.array([xs.max()]), np.array([ys.max()]))
+            bbox = (int(row_lo[0]), int(row_hi[0]), int(col_lo[0]), int(col_hi[0]))
+            for row in range(bbox[0], bbox[1] + 1):
+                for col in range(bbox[2], bbox[3] + 1):
+                    candidates.setdefault((row, col), []).append(i)
+
+            # Mark every cell an edge passes through (conservatively, its bounding box) as a boundary cell.
+            row_a, col_a = self._cell(np.minimum(edges[:, 0], edges[:, 2]), np.minimum(edges[:, 1], edges[:, 3]))
+            row_b, col_b = self._cell(np.maximum(edges[:, 0], edges[:, 2]), np.maximum(edges[:, 1], edges[:, 3]))
+            boundary[row_a, col_a] = True
+            for j in np.nonzero((row_a != row_b) | (col_a != col_b))[0]:
+                boundary[row_a[j]:row_b[j] + 1, col_a[j]:col_b[j] + 1] = True
+
+        # Cells no edge passes through lie wholly inside one polygon, or outside all of them: their
+        # centre decides which.
+        self._candidates = {}
+        for (row, col), parts in candidates.items():
+            if boundary[row, col]:
+                grid[row, col] = _BOUNDARY
+                self._candidates[(row, col)] = np.array(parts, dtype=np.int32)
+                continue
+            cx = np.array([-180.0 + (col + 0.5) * self.cell_deg])
+            cy = np.array([-90.0 + (row + 0.5) * self.cell_deg])
+            for i in parts:
+                if _crossings(self._band(i, row), cx, cy)[0]:
+                    grid[row, col] = self.polygons[i][0]
+                    break
+
+        # Points in an empty cell may still be within the coastal tolerance of an outline in a neighbouring cell.
+        for row in range(self.rows):
+            near = boundary[max(0, row - self._margin_rows):row + self._margin_rows + 1].any(axis=0)
+            spread = near.copy()
+            for shift in range(1, self._margin_cols(row) + 1):
+                spread[shift:] |= near[:-shift]
+                spread[:-shift] |= near[shift:]
+            for col in np.nonzero(spread & (grid[row] == _EMPTY))[0]:
+                grid[row, col] = _BOUNDARY
+                self._candidates[(row, int(col))] = np.zeros(0, dtype=np.int32)
+        self.grid = grid
+
+    def _margin_cols(self, row: int) -> int:
+        """Number of grid columns the coastal tolerance can reach east and west of a point in the row."""
+        import numpy as np
+
+        lo = -90.0 + row * self.cell_deg
+        lat = min(90.0, max(abs(lo - self._margin_deg), abs(lo + self.cell_deg + self._margin_deg)))
+        km_per_deg = max(_KM_PER_DEG * np.cos(np.radians(lat)), 1e-9)
+        return min(self.cols, int(np.ceil(COASTAL_TOLERANCE_KM / km_per_deg / self.cell_deg)))
+
+    def _band(self, polygon: int, row: int) -> np.ndarray:
+        """Edges of a polygon that a horizontal ray from within the grid row could cross."""
+        import numpy as np
+
+        key = (polygon, row)
+        edges = self._band_edges.get(key)
+        if edges is None:
+            all_edges = self.polygons[polygon][1]
+            lo = -90.0 + row * self.cell_deg
+            hi = lo + self.cell_deg
+            y_min = np.minimum(all_edges[:, 1], all_edges[:, 3])
+            y_max = np.maximum(all_edges[:, 1], all_edges[:, 3])
+            edges = all_edges[(y_max >= lo) & (y_min <= hi)]
+            self._band_edges[key] = edges
+        return edges
+
+    def _near_candidates(self, row: int, col: int) -> np.ndarray:
+        """Polygons with an outline in any cell the coastal tolerance reaches from the given cell."""
+        import numpy as np
+
+        key = (row, col)
+        parts = self._near_parts.get(key)
+        if parts is None:
+            margin_cols = self._margin_cols(row)
+            found: set[int] = set()
+            for r in range(max(0, row - self._margin_rows), min(self.rows, row + self._margin_rows + 1)):
+                for c in range(max(0, col - margin_cols), min(self.cols, col + margin_cols + 1)):
+                    found.update(self._candidates.get((r, c), ()))
+            parts = self._near_parts[key] = np.array(sorted(found), dtype=np.int32)
+        return parts
+
+    def _near_band(self, polygon: int, row: int) -> np.ndarray:
+        """Edges of a polygon that could lie within the coastal tolerance of a point in the grid row."""
+        import numpy as np
+
+        key = (polygon, row)
+        edges = self._near_edges.get(key)
+        if edges is None:
+            all_edges = self.polygons[polygon][1]
+            lo = -90.0 + row * self.cell_deg - self._margin_deg
+            hi = lo + self.cell_deg + 2 * self._margin_deg
+            y_min = np.minimum(all_edges[:, 1], all_edges[:, 3])
+            y_max = np.maximum(all_edges[:, 1], all_edges[:, 3])
+            edges = all_edges[(y_max >= lo) & (y_min <= hi)]
+            self._near_edges[key] = edges
+        return edges
+
+    def lookup(self, points: list[tuple[float, float]]) -> list[str]:
+        """Return the lower-case ISO2 country code for each (lat, lng) point, or "" outside every country."""
+        import numpy as np
+
+        if not points:
+            return []
+        pts = np.asarray(points, dtype=float).reshape(-1, 2)
+        ys, xs = pts[:, 0], pts[:, 1]
+        rows, cols = self._cell(xs, ys)
+        result = self.grid[rows, cols].copy()
+
+        # Resolve points in boundary cells, one cell at a time.
+        pending = np.nonzero(result == _BOUNDARY)[0]
+        result[pending] = _EMPTY
+        if len(pending):
+            cell_ids = rows[pending] * self.cols + cols[pending]
+            order = np.argsort(cell_ids, kind="stable")
+            pending, cell_ids = pending[order], cell_ids[order]
+            starts = np.r_[0, np.nonzero(np.diff(cell_ids))[0] + 1]
+            ends = np.r_[starts[1:], len(pending)]
+            for start, end in zip(starts, ends):
+                idx = pending[start:end]
+                row, col = int(rows[idx[0]]), int(cols[idx[0]])
+                self._resolve_cell(row, col, idx, xs, ys, result)
+
+        return [self.codes[code] if code >= 0 else "" for code in result.tolist()]
+
+    def _resolve_cell(self, row: int, col: int, idx: np.ndarray, xs: np.ndarray, ys: np.ndarray, result: np.ndarray) -> None:
+        import numpy as np
+
+        parts = self._candidates.get((row, col), ())
+        open_idx = idx
+        for i in parts:
+            inside = _crossings(self._band(i, row), xs[open_idx], ys[open_idx])
+            result[open_idx[inside]] = self.polygons[i][0]
+            open_idx = open_idx[~inside]
+            if not len(open_idx):
+                return
+        # Still outside everything: snap to the nearest outline within the coastal tolerance, which may
+        # be in a neighbouring cell.
+        best = np.full(len(open_idx), np.inf)
+        best_code = np.full(len(open_idx), _EMPTY, dtype=np.int32)
+        for i in self._near_candidates(row, col):
+            distance = _distance_km(self._near_band(i, row), xs[open_idx], ys[open_idx])
+            closer = distance < best
+            best[closer] = distance[closer]
+            best_code[closer] = self.polygons[i][0]
+        near = best <= COASTAL_TOLERANCE_KM
+        result[open_idx[near]] = best_code[near]
+
+
+_boundaries: Optional[CountryBoundaries] = None
+_boundaries_loaded = False
+_boundaries_lock = threading.Lock()
+
+
+def country_boundaries() -> Optional[CountryBoundaries]:
+    """Return the process-wide boundary index, built on first use, or None if no boundary file exists."""
+    global _boundaries, _boundaries_loaded
+    with _boundaries_lock:
+        if not _boundaries_loaded:
+            _boundaries_loaded = True
+            if os.path.exists(COUNTRY_BOUNDARIES_FILE):
+                _boundaries = CountryBoundaries.from_geojson(COUNTRY_BOUNDARIES_FILE)
+        return _boundaries
+
+
+# (path, size, mtime) -> content hash of the boundary file, so it is only hashed again once it changes.
+_signatures: dict[tuple[str, int, int], str] = {}
+
+
+def boundaries_signature(path: str = COUNTRY_BOUNDARIES_FILE) -> str:
+    """Identify the boundary data in use by a hash of its contents, so cached lookups made with other data can be discarded."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return ""
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    with _boundaries_lock:
+        signature = _signatures.get(key)
+    if signature is None:
+        digest = hashlib.sha256()
+        try:
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(chunk)
+        except OSError:
+            return ""
+        signature = digest.hexdigest()[:16]
+        with _boundaries_lock:
+            _signatures[key] = signature
+    return signature
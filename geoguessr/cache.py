@@ -0,0 +1,185 @@
+# On-disk cache of raw GeoGuessr API payloads
+
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from concurrent.futures import Future
+from typing import Awaitable, Callable, Optional
+
+PAYLOAD_CACHE_DIR = "output/cache"
+
+# Endpoint names used as cache namespaces.
+DUELS_ENDPOINT = "duels"
+GAMES_ENDPOINT = "games"
+
+
+def is_finished_payload(endpoint: str, payload: object) -> bool:
+    """
+    Return True if a raw payload describes a game that can no longer change.
+
+    Only finished games are cached; anything still in progress is always fetched again.
+    """
+    if not isinstance(payload, dict):
+        return False
+    if endpoint == DUELS_ENDPOINT:
+        return payload.get("status") == "Finished"
+    if endpoint == GAMES_ENDPOINT:
+        return payload.get("state") == "finished"
+    return False
+
+
+class PayloadCache:
+    """
+    Content-addressed store of raw API payloads, gzip-compressed on disk.
+
+    Each payload lives at `<root>/<endpoint>/<hh>/<sha256>.json.gz`, where the hash is taken over the
+    endpoint name and game id/token. Finished games never change, so a cached payload can always be
+    re-parsed instead of being downloaded again.
+
+    The key does not depend on which player fetched the game, so one cache shared by several users'
+    fetches holds a single copy of every duel they have in common; `get_or_fetch` also makes sure a
+    game requested by several fetches at the same time is only downloaded once.
+    """
+
+    def __init__(self, root: str = PAYLOAD_CACHE_DIR) -> None:
+        self.root = root
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        # Downloads avoided because another caller was already fetching the same payload.
+        self.shared = 0
+        self._in_flight: dict[str, Future] = {}
+
+    def path(self, endpoint: str, key: str) -> str:
+        digest = hashlib.sha256(f"{endpoint}/{key}".encode("utf-8")).hexdigest()
+        return os.path.join(self.root, endpoint, digest[:2], f"{digest}.json.gz")
+
+    def contains(self, endpoint: str, key: str) -> bool:
+        return bool(key) and os.path.exists(self.path(endpoint, key))
+
+    def _read(self, endpoint: str, key: str) -> Optional[dict]:
+        if not key:
+            return None
+        try:
+            with gzip.open(self.path(endpoint, key), "rt", encoding="utf-8") as f:
+                payload = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return payload if isinstance(payload, dict) else None
+
+    def get(self, endpoint: str, key: str) -> Optional[dict]:
+        """Return the cached payload, or None if it is missing or unreadable."""
+        payload = self._read(endpoint, key)
+        with self._lock:
+            if payload is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return payload
+
+    def get_or_fetch(self, endpoint: str, key: str, fetch: Callable[[], Optional[dict]]) -> Optional[dict]:
+        """
+        Return the cached payload, or call `fetch()` to download it and cache the result.
+
+        Concurrent calls for the same game share a single `fetch()`: the first caller downloads the
+        payload and the others wait for its result (which is shared even if the game is unfinished and
+        so not written to disk).
+        """
+        if not key:
+            return fetch()
+        payload = self.get(endpoint, key)
+        if payload is not None:
+            return payload
+
+        pending, owner = self._claim(endpoint, key)
+        if not owner:
+            return pending.result()
+
+        try:
+            # Another caller may have finished downloading it between our lookup and taking ownership.
+            payload = self._read(endpoint, key)
+            if payload is None:
+                payload = fetch()
+                if isinstance(payload, dict):
+                    self.put(endpoint, key, payload)
+            pending.set_result(payload)
+            return payload
+        except BaseException as e:
+            pending.set_exception(e)
+            raise
+        finally:
+            self._release(endpoint, key)
+
+    async def get_or_fetch_async(
+        self, endpoint: str, key: str, fetch: Callable[[], Awaitable[Optional[dict]]]
+    ) -> Optional[dict]:
+        """
+        Like `get_or_fetch`, for the asyncio engine: `fetch` is a coroutine function and disk access runs
+        in a worker thread. Downloads are shared with `get_or_fetch` callers as well as other coroutines.
+        """
+        import asyncio
+
+        if not key:
+            return await fetch()
+        payload = await asyncio.to_thread(self.get, endpoint, key)
+        if payload is not None:
+            return payload
+
+        pending, owner = self._claim(endpoint, key)
+        if not owner:
+            return await asyncio.wrap_future(pending)
+
+        try:
+            payload = await asyncio.to_thread(self._read, endpoint, key)
+            if payload is None:
+                payload = await fetch()
+                if isinstance(payload, dict):
+                    await asyncio.to_thread(self.put, endpoint, key, payload)
+            pending.set_result(payload)
+            return payload
+        except BaseException as e:
+            pending.set_exception(e)
+            raise
+        finally:
+            self._release(endpoint, key)
+
+    def _claim(self, endpoint: str, key: str) -> tuple[Future, bool]:
+        """Return the pending download of a payload and whether the caller owns it (and must fetch it)."""
+        name = f"{endpoint}/{key}"
+        with self._lock:
+            pending = self._in_flight.get(name)
+            if pending is not None:
+                self.shared += 1
+                return pending, False
+            pending = self._in_flight[name] = Future()
+            return pending, True
+
+    def _release(self, endpoint: str, key: str) -> None:
+        with self._lock:
+            self._in_flight.pop(f"{endpoint}/{key}", None)
+
+    def put(self, endpoint: str, key: str, payload: dict) -> None:
+        """Store a payload if it belongs to a finished game."""
+        if not key or not is_finished_payload(endpoint, payload):
+            return
+        path = self.path(endpoint, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temporary file first so concurrent readers never see a partial payload.
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as raw_file:
+                with gzip.GzipFile(fileobj=raw_file, mode="wb", compresslevel=6) as f:
+                    f.write(json.dumps(payload, separators=(",", ":")).encode("utf-8"))
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+        with self._lock:
+            self.writes += 1
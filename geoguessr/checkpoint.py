@@ -0,0 +1,242 @@
+# Resumable progress for long-running fetches
+
+import json
+import os
+import tempfile
+import threading
+import time
+from enum import Enum
+from typing import Optional
+
+from geoguessr.game import GameType, GeoguessrChallengeGame, GeoguessrDuelGame, GeoguessrStandardGame
+
+CHECKPOINT_VERSION = 1
+
+# Minimum time between periodic checkpoint writes; interrupts and errors always write immediately.
+CHECKPOINT_INTERVAL_SECS = 5.0
+
+# Fetches in a row a game's detail request may fail (after all its retries) before the game is skipped
+# and the rest saved without it.
+MAX_DETAIL_ATTEMPTS = 3
+
+
+def checkpoint_path(username: str) -> str:
+    return f"output/{username}_fetch_checkpoint.json"
+
+
+def _to_json(obj):
+    if isinstance(obj, Enum):
+        return obj.value
+    return obj.__dict__
+
+
+def _encode(obj) -> str:
+    """Encode a game as JSON once, when recorded, so later in-place changes (e.g. usernames) don't leak in."""
+    return json.dumps(obj, default=_to_json)
+
+
+def _restore_game(game_type: GameType, data: dict):
+    if game_type == GameType.STANDARD:
+        return GeoguessrStandardGame.from_json(data)
+    game = GeoguessrDuelGame.from_json(data)
+    # from_json fills `time` from start_time for older files; keep exactly what was fetched.
+    game.time = data.get("time", "")
+    return game
+
+
+class FetchCheckpoint:
+    """
+    Progress of a fetch, saved to output/<username>_fetch_checkpoint.json as it runs.
+
+    Records the user id, the feed pagination token, the game ids/entries found so far and every game whose details
+    have been fetched and parsed. A later fetch with the same starting point (same last stored games and
+    options) resumes from here without requesting anything again; any other fetch ignores it. The file
+    is removed once the fetched games have been saved.
+
+    Feed entries and games are kept JSON-encoded, each encoded once when recorded, so a save only joins
+    the stored text and the pipeline is never held up re-encoding everything fetched so far.
+    """
+
+    def __init__(self, path: str, params: dict) -> None:
+        self.path = path
+        self.params = params
+        self.user_id = ""
+        self.pagination_token: Optional[str] = ""
+        self.pages_fetched = 0
+        self.total_game_ids = 0
+        self.feed_complete = False
+        self.complete_types: dict[str, bool] = {}
+        self.passed_oldest: dict[str, bool] = {}
+        self.seen_stored: dict[str, bool] = {}
+        self.games: dict[str, list[str]] = {}
+        self.details: dict[str, dict[str, str]] = {}
+        # Detail request URL -> number of fetches in which it failed after all retries.
+        self.detail_failures: dict[str, int] = {}
+        self.resumed = False
+        self._lock = threading.Lock()
+        # Held while writing the file, so writes happen in the order their contents were taken.
+        self._write_lock = threading.Lock()
+        self._last_saved = time.monotonic()
+
+    @classmethod
+    def load(cls, path: str, params: dict) -> "FetchCheckpoint":
+        """Load the checkpoint at `path` if it was written for the same fetch parameters, else start fresh."""
+        checkpoint = cls(path, params)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                raw = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return checkpoint
+        if not isinstance(raw, dict) or raw.get("version") != CHECKPOINT_VERSION or raw.get("params") != params:
+            return checkpoint
+        checkpoint.user_id = raw.get("user_id", "") or ""
+        checkpoint.pagination_token = raw.get("pagination_token")
+        checkpoint.pages_fetched = int(raw.get("pages_fetched", 0) or 0)
+        checkpoint.total_game_ids = int(raw.get("total_game_ids", 0) or 0)
+        checkpoint.feed_complete = bool(raw.get("feed_complete", False))
+        checkpoint.complete_types = dict(raw.get("complete_types") or {})
+        checkpoint.passed_oldest = dict(raw.get("passed_oldest") or {})
+        checkpoint.seen_stored = dict(raw.get("seen_stored") or {})
+        checkpoint.games = {
+            game_type: [json.dumps(entry) for entry in entries] for game_type, entries in (raw.get("games") or {}).items()
+        }
+        checkpoint.details = {
+            game_type: {key: json.dumps(data) for key, data in games.items()}
+            for game_type, games in (raw.get("details") or {}).items()
+        }
+        checkpoint.detail_failures = {
+            str(endpoint): int(count or 0) for endpoint, count in (raw.get("detail_failures") or {}).items()
+        }
+        checkpoint.resumed = True
+        return checkpoint
+
+    def restore_feed_games(self, game_type: GameType) -> list:
+        """Return the feed entries already found for a game type, as the pipeline stores them."""
+        entries = [json.loads(entry) for entry in self.games.get(game_type.value, [])]
+        if game_type == GameType.DAILY_CHALLENGE:
+            return [
+                GeoguessrChallengeGame(
+                    game_type=GameType.DAILY_CHALLENGE,
+                    time=item.get("time", ""),
+                    challenge_token=item.get("challenge_token", ""),
+                    points=item.get("points", 0),
+                )
+                for item in entries
+            ]
+        return list(entries)
+
+    def record_feed(
+        self,
+        pagination_token: Optional[str],
+        pages_fetched: int,
+        total_game_ids: int,
+        complete_types: dict,
+        games: dict,
+        feed_complete: bool,
+        passed_oldest: Optional[dict] = None,
+        seen_stored: Optional[dict] = None,
+    ) -> None:
+        """Record the feed progress; `games` only ever grows, so just the entries added since the last call are encoded."""
+        new_entries = {
+            game_type.value: [_encode(entry) for entry in entries[len(self.games.get(game_type.value, [])) :]]
+            for game_type, entries in games.items()
+        }
+        with self._lock:
+            self.pagination_token = pagination_token
+            self.pages_fetched = pages_fetched
+            self.total_game_ids = total_game_ids
+            self.feed_complete = feed_complete
+            self.complete_types = {game_type.value: done for game_type, done in complete_types.items()}
+            for game_type, encoded in new_entries.items():
+                self.games.setdefault(game_type, []).extend(encoded)
+            self.passed_oldest = {game_type.value: done for game_type, done in (passed_oldest or {}).items()}
+            self.seen_stored = {game_type.value: seen for game_type, seen in (seen_stored or {}).items()}
+
+    def get_details(self, game_type: GameType, key: str):
+        """Return the already-parsed game for a feed entry, or None if it still needs fetching."""
+        with self._lock:
+            data = self.details.get(game_type.value, {}).get(key)
+        return _restore_game(game_type, json.loads(data)) if data is not None else None
+
+    def record_details(self, game_type: GameType, key: str, game) -> None:
+        if not key or game is None:
+            return
+        data = _encode(game)
+        with self._lock:
+            self.details.setdefault(game_type.value, {})[key] = data
+
+    def record_failed_details(self, endpoints: list[str]) -> dict[str, int]:
+        """Count one more failed fetch for each detail request URL; returns the attempts so far of each."""
+        with self._lock:
+            for endpoint in set(endpoints):
+                self.detail_failures[endpoint] = self.detail_failures.get(endpoint, 0) + 1
+            return {endpoint: self.detail_failures[endpoint] for endpoint in endpoints}
+
+    def save(self, force: bool = True) -> None:
+        """
+        Write the checkpoint atomically; with force=False only if the last write was a while ago and no other
+        write is under way. The state is copied under the lock and written outside it, so recording progress
+        never waits for the disk.
+        """
+        if not self._write_lock.acquire(blocking=force):
+            return
+        try:
+            with self._lock:
+                now = time.monotonic()
+                if not force and now - self._last_saved < CHECKPOINT_INTERVAL_SECS:
+                    return
+                self._last_saved = now
+                header = {
+                    "version": CHECKPOINT_VERSION,
+                    "params": self.params,
+                    "user_id": self.user_id,
+                    "pagination_token": self.pagination_token,
+                    "pages_fetched": self.pages_fetched,
+                    "total_game_ids": self.total_game_ids,
+                    "feed_complete": self.feed_complete,
+                    "complete_types": dict(self.complete_types),
+                    "passed_oldest": dict(self.passed_oldest),
+                    "seen_stored": dict(self.seen_stored),
+                    "detail_failures": dict(self.detail_failures),
+                }
+                games = {game_type: list(entries) for game_type, entries in self.games.items()}
+                details = {game_type: dict(parsed) for game_type, parsed in self.details.items()}
+            self._write(header, games, details)
+        finally:
+            self._write_lock.release()
+
+    def _write(self, header: dict, games: dict[str, list[str]], details: dict[str, dict[str, str]]) -> None:
+        directory = os.path.dirname(self.path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                # The header fields, then the already-encoded games spliced in as-is.
+                f.write(json.dumps(header)[:-1])
+                f.write(', "games": {')
+                f.write(
+                    ", ".join(f"{json.dumps(game_type)}: [{', '.join(entries)}]" for game_type, entries in games.items())
+                )
+                f.write('}, "details": {')
+                f.write(
+                    ", ".join(
+                        f"{json.dumps(game_type)}: {{"
+                        + ", ".join(f"{json.dumps(key)}: {data}" for key, data in parsed.items())
+                        + "}"
+                        for game_type, parsed in details.items()
+                    )
+                )
+                f.write("}}")
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    def clear(self) -> None:
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
@@ -1,12 +1,10 @@
-from dataclasses import dataclass, field
-from datetime import datetime
+import re
+from dataclasses import dataclass, field, fields
+from datetime import datetime, timezone
 from enum import Enum
 from typing import Optional
 
-try:
-    import reverse_geocoder as _rg
-except Exception:  # pragma: no cover
-    _rg = None
+from geoguessr.geocode import resolve_locations
 
 class GameType(str, Enum):
     RANKED_DUELS = "Duels"
@@ -21,6 +19,26 @@ class GameMode(str, Enum):
     NO_MOVE = "NoMove"
     NMPZ = "NMPZ"
 
+
+def parse_timestamp(ts: str) -> float:
+    """Return seconds since the epoch for an ISO 8601 time (UTC unless it says otherwise), or -inf."""
+    if not ts:
+        return float("-inf")
+    try:
+        s = ts.replace("Z", "+00:00")
+        # Python 3.9 can choke on fractional seconds with <6 digits (e.g. `.73`).
+        m = re.match(r"^(.*T\d\d:\d\d:\d\d)\.(\d+)([+-]\d\d:\d\d)$", s)
+        if m:
+            base, frac, offset = m.group(1), m.group(2), m.group(3)
+            frac = (frac[:6]).ljust(6, "0")
+            s = f"{base}.{frac}{offset}"
+        dt = datetime.fromisoformat(s)
+        if dt.tzinfo is None:
+            dt = dt.replace(tzinfo=timezone.utc)
+        return dt.timestamp()
+    except Exception:
+        return float("-inf")
+
 @dataclass()
 class GeoguessrChallengeGame:
     game_type: GameType
@@ -29,6 +47,25 @@ class GeoguessrChallengeGame:
     points: int
 
 
+@dataclass()
+class GeoguessrStandardRound:
+    """One round of a standard game and the player's guess on it."""
+
+    round_number: int = 0
+    # Panorama location; country_code is lower-case ISO2 ("" when the payload has none).
+    country_code: str = ""
+    lat: Optional[float] = None
+    lng: Optional[float] = None
+    pano_id: str = ""
+    score: Optional[int] = None
+    distance_meters: Optional[float] = None
+    guess_lat: Optional[float] = None
+    guess_lng: Optional[float] = None
+    # Best-effort country of the guess ("" when it has none); None until resolved, see
+    # geocode.resolve_guess_countries.
+    guess_country_code: Optional[str] = None
+
+
 @dataclass()
 class GeoguessrStandardGame:
     """A non-duel ("Standard") GeoGuessr game.
@@ -47,9 +84,96 @@ class GeoguessrStandardGame:
     state: str = ""
     round_count: int = 0
 
+    # Per-round results, derived from `raw` when the game is fetched or reparsed.
+    rounds: list[GeoguessrStandardRound] = field(default_factory=list)
+
     # Keep the full API payload so we can enrich/analyse later without refetching.
     raw: dict = field(default_factory=dict)
 
+    @classmethod
+    def from_json(cls, data: dict) -> 'GeoguessrStandardGame':
+        """
+        Create a GeoguessrStandardGame instance from a JSON object.
+
+        Files saved before rounds were stored get them derived from `raw`, with guess countries left
+        unresolved.
+        """
+        raw = data.get("raw", {})
+        if not isinstance(raw, dict):
+            raw = {}
+        stored_rounds = data.get("rounds")
+        if isinstance(stored_rounds, list):
+            names = [f.name for f in fields(GeoguessrStandardRound)]
+            rounds = [
+                GeoguessrStandardRound(**{name: r[name] for name in names if name in r})
+                for r in stored_rounds
+                if isinstance(r, dict)
+            ]
+        else:
+            rounds = cls.rounds_from_raw(raw)
+        return cls(
+            game_type=GameType.STANDARD,
+            time=data.get("time", ""),
+            game_token=data.get("game_token", ""),
+            map=data.get("map", ""),
+            map_name=data.get("map_name", ""),
+            mode=data.get("mode", ""),
+            state=data.get("state", ""),
+            round_count=data.get("round_count", 0),
+            rounds=rounds,
+            raw=raw,
+        )
+
+    @staticmethod
+    def rounds_from_raw(raw: dict) -> list[GeoguessrStandardRound]:
+        """
+        Pair each round of a game payload with the player's guess on it.
+
+        Guess countries are left unresolved, for the caller to resolve in bulk with
+        `geocode.resolve_guess_countries`.
+        """
+        def to_float(value) -> Optional[float]:
+            try:
+                return float(value) if value is not None else None
+            except (TypeError, ValueError):
+                return None
+
+        def first_present(d: dict, *keys):
+            for key in keys:
+                if d.get(key) is not None:
+                    return d.get(key)
+            return None
+
+        rounds = raw.get("rounds")
+        guesses = raw.get("guesses")
+        if not isinstance(guesses, list):
+            player = raw.get("player")
+            guesses = player.get("guesses") if isinstance(player, dict) else None
+        if not isinstance(rounds, list) or not isinstance(guesses, list):
+            return []
+
+        out = []
+        for i, (r, gu) in enumerate(zip(rounds, guesses)):
+            if not isinstance(r, dict) or not isinstance(gu, dict):
+                continue
+            score = to_float(first_present(gu, "roundScoreInPoints", "score"))
+            guess_lat = to_float(gu.get("lat"))
+            guess_lng = to_float(gu.get("lng"))
+            out.append(GeoguessrStandardRound(
+                round_number=i + 1,
+                country_code=str(r.get("streakLocationCode") or "").lower(),
+                lat=to_float(r.get("lat")),
+                lng=to_float(r.get("lng")),
+                pano_id=str(r.get("panoId") or ""),
+                score=int(score) if score is not None else None,
+                distance_meters=to_float(first_present(gu, "distanceInMeters", "distance")),
+                guess_lat=guess_lat,
+                guess_lng=guess_lng,
+                # A guess without a location has no country to look up.
+                guess_country_code=None if guess_lat is not None and guess_lng is not None else "",
+            ))
+        return out
+
 @dataclass()
 class GeoguessrDuelRound:
     country_code: str
@@ -166,8 +290,24 @@ class GeoguessrDuelGame:
         instance.player_id = data.get('player_id', '')
         return instance
 
+    def timestamp(self) -> float:
+        """Seconds since the epoch at which the game started (else its latest round start), or -inf if unknown."""
+        parsed = parse_timestamp(self.start_time or self.time or "")
+        if parsed != float("-inf"):
+            return parsed
+        round_ts = [parse_timestamp(duel_round.start_time or "") for duel_round in self.rounds]
+        return max(round_ts) if round_ts else float("-inf")
+
     @classmethod
-    def from_geoguessr_data(cls, game_type: GameType, game_id: str, player_id: str, data: dict) -> 'GeoguessrDuelGame':
+    def from_geoguessr_data(
+        cls, game_type: GameType, game_id: str, player_id: str, data: dict, resolve_countries: bool = True
+    ) -> 'GeoguessrDuelGame':
+        """
+        Parse a duel payload from the given player's perspective.
+
+        With `resolve_countries=False` the guess locations are left without a "country_code", for the
+        caller to resolve in bulk with `geocode.resolve_guess_countries`.
+        """
         instance = cls(
             game_type=game_type,
             game_id=game_id,
@@ -190,7 +330,7 @@ class GeoguessrDuelGame:
             instance.map = map_dict.get('name', "")
         else:
             instance.map = ""
-        instance.rounds, instance.start_time, instance.duration_secs = instance._get_rounds(data)
+        instance.rounds, instance.start_time, instance.duration_secs = instance._get_rounds(data, resolve_countries)
 
         home_team_id = ""
 
@@ -253,7 +393,7 @@ class GeoguessrDuelGame:
         else:
             return GameMode.NO_MOVE
         
-    def _get_rounds(self, data: dict) -> tuple[list[GeoguessrDuelRound], str, int]:
+    def _get_rounds(self, data: dict, resolve_countries: bool = True) -> tuple[list[GeoguessrDuelRound], str, int]:
         """
         Build a list of GeoguessrDuelRound from raw game JSON.
 
@@ -296,29 +436,6 @@ class GeoguessrDuelGame:
             except Exception:
                 return default
 
-        guess_cc_cache: dict[tuple[float, float], str] = {}
-
-        def guess_country_code(lat: float, lng: float) -> str:
-            """Best-effort ISO2 country code for a guessed lat/lng.
-
-            Uses offline nearest-city reverse geocoding when `reverse_geocoder` is installed.
-            Returns empty string when unavailable.
-            """
-            if _rg is None:
-                return ""
-            key = (round(lat, 4), round(lng, 4))
-            if key in guess_cc_cache:
-                return guess_cc_cache[key]
-            try:
-                res = _rg.search((lat, lng), mode=1)
-                cc = ""
-                if res and isinstance(res, list):
-                    cc = (res[0].get("cc") or "").lower()
-                guess_cc_cache[key] = cc
-                return cc
-            except Exception:
-                return ""
-
         # locate the player's object and their team
         player_obj = None
         player_team = None
@@ -354,11 +471,10 @@ class GeoguessrDuelGame:
                     if lat is None or lng is None:
                         continue
                     round_map = all_guess_locations.setdefault(int(rn), {})
-                    round_map[pid] = {
-                        "lat": lat,
-                        "lng": lng,
-                        "country_code": guess_country_code(lat, lng),
-                    }
+                    round_map[pid] = {"lat": lat, "lng": lng}
+        if resolve_countries:
+            # Best-effort guess countries, all guesses of the game in one lookup.
+            resolve_locations([loc for round_map in all_guess_locations.values() for loc in round_map.values()])
 
         team_round_results = {}
         opponent_round_results = {}
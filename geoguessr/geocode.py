@@ -0,0 +1,255 @@
+# Batched offline reverse geocoding of guess locations, with a persistent cache
+
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Iterable, Optional
+
+# Without country boundary data (see geoguessr/boundaries.py), guesses are given the country of the
+# nearest city by reverse_geocoder, which is often wrong near borders and at sea.
+# reverse_geocoder lazily builds a process-wide singleton on first search, which is not
+# safe to do from several threads at once (games may be parsed from a fetch worker pool).
+_rg_lock = threading.Lock()
+_rg = None
+_rg_imported = False
+
+GEOCODE_CACHE_FILE = "output/geocode_cache.json"
+
+# Points are looked up and cached by lat/lng rounded to this many decimal places (about 11 m). Nearest
+# cities are kilometres apart, so the rounding practically never changes the answer, while a guess
+# made twice (or seen by both players of a duel) is only ever geocoded once.
+GEOCODE_PRECISION = 4
+
+# Least recently used entries beyond this are dropped; about 30 bytes each on disk.
+GEOCODE_CACHE_MAX_ENTRIES = 500_000
+
+
+def _reverse_geocoder():
+    """
+    Import reverse_geocoder on first use, or return None when it isn't installed.
+
+    It pulls in numpy and scipy, which commands that never geocode (display, analyse, ...) shouldn't
+    pay for at start-up. Call with `_rg_lock` held.
+    """
+    global _rg, _rg_imported
+    if not _rg_imported:
+        _rg_imported = True
+        try:
+            import reverse_geocoder
+            _rg = reverse_geocoder
+        except Exception:  # pragma: no cover
+            _rg = None
+    return _rg
+
+
+def geocode_engine() -> str:
+    """Name the lookup in use; cached codes from a different lookup are discarded."""
+    from geoguessr.boundaries import boundaries_signature
+
+    signature = boundaries_signature()
+    return f"boundaries:{signature}" if signature else "nearest-city"
+
+
+def point_key(lat: float, lng: float) -> tuple[float, float]:
+    """Round a point to the cache precision (normalising -0.0 so it matches 0.0)."""
+    return (round(lat, GEOCODE_PRECISION) + 0.0, round(lng, GEOCODE_PRECISION) + 0.0)
+
+
+class GeocodeCache:
+    """
+    Thread-safe, size-bounded map of rounded points to country codes, persisted in output/geocode_cache.json.
+
+    The file holds `{"precision": 4, "engine": "...", "entries": {"<lat>,<lng>": "<cc>"}}` with the most
+    recently used entries last; a file written with a different precision or lookup engine is ignored. `save()` only writes when
+    entries were added since the last load or save.
+    """
+
+    def __init__(self, path: str = GEOCODE_CACHE_FILE, max_entries: int = GEOCODE_CACHE_MAX_ENTRIES) -> None:
+        self.path = path
+        self.max_entries = max(1, int(max_entries))
+        self._entries: OrderedDict[tuple[float, float], str] = OrderedDict()
+        self._dirty = False
+        self._lock = threading.Lock()
+        self.engine = geocode_engine()
+        self.hits = 0
+        self.misses = 0
+        self.load()
+
+    def _read_file(self) -> OrderedDict:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                raw = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return OrderedDict()
+        if not isinstance(raw, dict):
+            return OrderedDict()
+        # Files from before the engine was recorded were always nearest-city lookups.
+        if raw.get("precision") != GEOCODE_PRECISION or raw.get("engine", "nearest-city") != self.engine:
+            return OrderedDict()
+        entries = OrderedDict()
+        for key, cc in (raw.get("entries") or {}).items():
+            try:
+                lat, lng = key.split(",")
+                entries[point_key(float(lat), float(lng))] = str(cc)
+            except (AttributeError, ValueError):
+                continue
+        return entries
+
+    def load(self) -> None:
+        """(Re)load the cache from disk."""
+        entries = self._read_file()
+        with self._lock:
+            self._entries = entries
+            self._trim()
+            self._dirty = False
+
+    def _trim(self) -> None:
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get_many(self, keys: Iterable[tuple[float, float]]) -> dict[tuple[float, float], str]:
+        """Return the cached codes of the given rounded points; missing points are left out."""
+        found = {}
+        with self._lock:
+            for key in keys:
+                cc = self._entries.get(key)
+                if cc is None:
+                    self.misses += 1
+                    continue
+                self._entries.move_to_end(key)
+                found[key] = cc
+                self.hits += 1
+        return found
+
+    def update(self, codes: dict[tuple[float, float], str]) -> None:
+        if not codes:
+            return
+        with self._lock:
+            for key, cc in codes.items():
+                self._entries[key] = cc
+                self._entries.move_to_end(key)
+            self._trim()
+            self._dirty = True
+
+    def save(self) -> None:
+        """
+        Write the cache to disk if anything was added.
+
+        Entries another process added since we loaded are kept (as least recently used), and the file
+        is replaced atomically.
+        """
+        with self._lock:
+            if not self._dirty:
+                return
+        on_disk = self._read_file()
+        with self._lock:
+            merged = OrderedDict((key, cc) for key, cc in on_disk.items() if key not in self._entries)
+            merged.update(self._entries)
+            self._entries = merged
+            self._trim()
+            entries = {f"{lat},{lng}": cc for (lat, lng), cc in self._entries.items()}
+            self._dirty = False
+        directory = os.path.dirname(self.path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"precision": GEOCODE_PRECISION, "engine": self.engine, "entries": entries}, f, separators=(",", ":"))
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+
+_shared_cache: Optional[GeocodeCache] = None
+_shared_cache_lock = threading.Lock()
+
+
+def geocode_cache() -> GeocodeCache:
+    """Return the process-wide geocode cache, loading it on first use."""
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = GeocodeCache()
+        return _shared_cache
+
+
+def country_codes(points: list[tuple[float, float]], cache: Optional[GeocodeCache] = None) -> list[str]:
+    """
+    Return a best-effort lower-case ISO2 country code for each (lat, lng) point.
+
+    Points (rounded to GEOCODE_PRECISION) that are not in the geocode cache yet are all resolved in
+    one batch: by point-in-polygon against the country boundaries when that data is present, otherwise
+    by offline nearest-city reverse geocoding when `reverse_geocoder` is installed (one KD-tree query,
+    which costs little more than a one-point search). Callers should collect as many points as they
+    can before calling. Returns "" for points that could not be resolved or lie outside every country.
+    """
+    if not points:
+        return []
+    from geoguessr.boundaries import country_boundaries
+
+    cache = cache if cache is not None else geocode_cache()
+    keys = [point_key(lat, lng) for lat, lng in points]
+    codes = cache.get_many(dict.fromkeys(keys))
+    missing = [key for key in dict.fromkeys(keys) if key not in codes]
+    boundaries = country_boundaries() if missing else None
+    if boundaries is not None:
+        resolved = dict(zip(missing, boundaries.lookup(missing)))
+        cache.update(resolved)
+        codes.update(resolved)
+    elif missing:
+        try:
+            with _rg_lock:
+                rg = _reverse_geocoder()
+                results = rg.search(missing, mode=1) if rg is not None else None
+        except Exception:
+            results = None
+        if results:
+            resolved = {}
+            for key, res in zip(missing, results):
+                resolved[key] = (res.get("cc") or "").lower() if isinstance(res, dict) else ""
+            cache.update(resolved)
+            codes.update(resolved)
+    return [codes.get(key, "") for key in keys]
+
+
+def resolve_locations(locations: list[dict]) -> None:
+    """Set "country_code" on each {"lat", "lng"} location dict, in one batch."""
+    codes = country_codes([(location["lat"], location["lng"]) for location in locations])
+    for location, cc in zip(locations, codes):
+        location["country_code"] = cc
+
+
+def resolve_guess_countries(games: Iterable) -> int:
+    """
+    Fill in the country of every guess that doesn't have one yet, for duels and standard games alike.
+
+    Fetches and reparses parse games without geocoding and call this once for all of them, so the
+    guesses of a whole run are resolved in one query. Returns the number of guesses resolved.
+    """
+    pending = []
+    standard_rounds = []
+    for game in games:
+        for game_round in game.rounds:
+            guess_locations = getattr(game_round, "guess_locations", None)
+            if guess_locations is not None:
+                pending.extend(
+                    location
+                    for location in guess_locations.values()
+                    if isinstance(location, dict) and "country_code" not in location
+                )
+            elif game_round.guess_country_code is None:
+                standard_rounds.append(game_round)
+    points = [(location["lat"], location["lng"]) for location in pending]
+    points.extend((game_round.guess_lat, game_round.guess_lng) for game_round in standard_rounds)
+    codes = country_codes(points)
+    for location, cc in zip(pending, codes):
+        location["country_code"] = cc
+    for game_round, cc in zip(standard_rounds, codes[len(pending):]):
+        game_round.guess_country_code = cc
+    return len(points)
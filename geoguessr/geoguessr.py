@@ -2,14 +2,189 @@
 
 import requests
 import json
+import os
+import threading
 import time
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from functools import partial
+from urllib.parse import urlsplit
+from requests.adapters import HTTPAdapter
+from urllib3.util.request import ACCEPT_ENCODING
 from tqdm import tqdm
 from dataclasses import fields
-from typing import Optional
+from typing import Optional, TextIO
+from geoguessr.checkpoint import FetchCheckpoint
+from geoguessr.geocode import resolve_guess_countries
+from geoguessr.metrics import FetchMetrics
+from geoguessr.cache import DUELS_ENDPOINT, GAMES_ENDPOINT, PayloadCache
+from geoguessr.ratelimit import RateLimiter, parse_retry_after
 from geoguessr.user import PlayerData
+from geoguessr.usernames import UsernameCache
 from geoguessr.game import GeoguessrChallengeGame, GeoguessrDuelGame, GeoguessrStandardGame, GameType
 
-USERNAME_MAP_FILE = "output/username_map.json"
+# Hosts of the public API and of the duel game server; both can be overridden, e.g. to fetch from a local mock
+# (benchmarks/mock_server.py) that serves both, with GG_BASE_URL alone or with GG_GAME_SERVER_URL as well.
+GEOGUESSR_BASE_URL = os.getenv("GG_BASE_URL", "https://www.geoguessr.com")
+GAME_SERVER_BASE_URL = os.getenv("GG_GAME_SERVER_URL", os.getenv("GG_BASE_URL", "https://game-server.geoguessr.com"))
+
+# Game types found in the feed, in the order they are processed.
+FEED_GAME_TYPES = [
+    GameType.DAILY_CHALLENGE,
+    GameType.STANDARD,
+    GameType.RANKED_DUELS,
+    GameType.UNRANKED_DUELS,
+    GameType.RANKED_TEAM_DUELS,
+]
+DUEL_GAME_TYPES = [GameType.RANKED_DUELS, GameType.UNRANKED_DUELS, GameType.RANKED_TEAM_DUELS]
+
+
+class FeedRequestError(RuntimeError):
+    """A feed page could not be fetched, even after retries."""
+
+
+def feed_game_key(game_type: GameType, game) -> str:
+    """Return the id/token that identifies a feed entry of the given type."""
+    if game_type == GameType.DAILY_CHALLENGE:
+        return getattr(game, "challenge_token", "") or ""
+    if game_type == GameType.STANDARD:
+        return (game.get("game_token", "") if isinstance(game, dict) else "") or ""
+    return game or ""
+
+
+class FeedScan:
+    """
+    Decides, page by page, which feed entries of a fetch are new games.
+
+    Each feed page is passed to `add_page`, which returns the new games on it in feed order; `done`
+    tells when pagination can stop (the last stored game of every type was seen, `max_games` was
+    reached, the feed ended, or a page held only stored games). In backfill mode (`older_than`) entries
+    are skipped down to the oldest stored game of each type instead. Used by both fetch engines.
+    """
+
+    def __init__(
+        self,
+        last_ids: dict[GameType, str],
+        max_games: int,
+        older_than: Optional[dict[GameType, str]] = None,
+        known_game_ids: Optional[set[str]] = None,
+    ) -> None:
+        self.last_ids = last_ids
+        self.max_games = max_games
+        self.older_than = older_than
+        self.known_game_ids = known_game_ids if known_game_ids is not None else set()
+        self.games: dict[GameType, list] = {game_type: [] for game_type in FEED_GAME_TYPES}
+        # Track which game types have found their last game
+        self.complete_types = {game_type: False for game_type in FEED_GAME_TYPES}
+        # When backfilling, whether the feed has gone past the oldest stored game of each type
+        # (immediately true for types with nothing stored).
+        self.passed_oldest = {game_type: not (older_than or {}).get(game_type, "") for game_type in FEED_GAME_TYPES}
+        # When backfilling, whether a stored game of each type has been seen, in case the oldest stored
+        # game is no longer in the feed.
+        self.seen_stored = {game_type: False for game_type in FEED_GAME_TYPES}
+        self.token: Optional[str] = ""
+        self.total_game_ids = 0
+        self.pages_fetched = 0
+        self.feed_complete = False
+        self._stopped = False
+
+    @property
+    def done(self) -> bool:
+        return self.feed_complete or self._stopped or self.total_game_ids >= self.max_games or self.token is None
+
+    def restore(self, checkpoint: FetchCheckpoint) -> list[tuple[GameType, object]]:
+        """Pick up the feed where a checkpointed fetch stopped; returns the games it had already found."""
+        self.token = checkpoint.pagination_token
+        self.total_game_ids = checkpoint.total_game_ids
+        self.pages_fetched = checkpoint.pages_fetched
+        self.feed_complete = checkpoint.feed_complete
+        for game_type in FEED_GAME_TYPES:
+            self.complete_types[game_type] = bool(checkpoint.complete_types.get(game_type.value, False))
+            self.passed_oldest[game_type] = bool(checkpoint.passed_oldest.get(game_type.value, self.passed_oldest[game_type]))
+            self.seen_stored[game_type] = bool(checkpoint.seen_stored.get(game_type.value, False))
+            self.games[game_type] = checkpoint.restore_feed_games(game_type)
+        return [(game_type, game) for game_type in FEED_GAME_TYPES for game in self.games[game_type]]
+
+    def record(self, checkpoint: FetchCheckpoint) -> None:
+        checkpoint.record_feed(
+            self.token,
+            self.pages_fetched,
+            self.total_game_ids,
+            self.complete_types,
+            self.games,
+            feed_complete=self.feed_complete,
+            passed_oldest=self.passed_oldest,
+            seen_stored=self.seen_stored,
+        )
+
+    def add_page(self, page_games: dict, token: Optional[str]) -> list[tuple[GameType, object]]:
+        """Process one feed page (as parsed by Geoguessr._parse_feed_page) and return its new games."""
+        self.pages_fetched += 1
+        self.token = token
+        new_games = []
+        page_known = 0
+        for game_type in FEED_GAME_TYPES:
+            # Skip if we've already found the last game for this type
+            if self.complete_types[game_type]:
+                continue
+
+            for game in page_games[game_type]:
+                key = feed_game_key(game_type, game)
+                if self.older_than is not None:
+                    # Backfilling: skip every game down to and including the oldest stored one. If that game
+                    # is no longer in the feed, everything from the first game that isn't stored after a
+                    # stored one is fetched. That may also pick up games missing from within the stored
+                    # range (e.g. left out by --max-games); they are sorted into place when saved.
+                    if not self.passed_oldest[game_type]:
+                        if key == self.older_than.get(game_type, ""):
+                            self.passed_oldest[game_type] = True
+                            continue
+                        if key and key in self.known_game_ids:
+                            self.seen_stored[game_type] = True
+                            continue
+                        if not self.seen_stored[game_type]:
+                            # Newer than every stored game; a normal fetch picks these up.
+                            continue
+                        self.passed_oldest[game_type] = True
+                elif key == self.last_ids[game_type]:
+                    # This is the last game we already have
+                    self.complete_types[game_type] = True
+                    break
+
+                # Skip games already stored, even if the last id above was never seen (e.g. it was
+                # deleted, or the duel was saved under a different category).
+                if key and key in self.known_game_ids:
+                    page_known += 1
+                    continue
+
+                # Add the game and increment counter
+                self.games[game_type].append(game)
+                new_games.append((game_type, game))
+                self.total_game_ids += 1
+
+                # Check if we've hit the max games limit
+                if self.total_game_ids >= self.max_games:
+                    self.complete_types[game_type] = True
+                    break
+
+        # Stop if all game types are complete
+        if all(self.complete_types.values()):
+            self._stopped = True
+        # The feed is newest first, so once a page holds only stored games everything after it is
+        # stored too. Backfilling deliberately pages through stored games, so it keeps going.
+        if self.older_than is None and page_known and not new_games:
+            self._stopped = True
+        return new_games
+
+    def summary(self, elapsed: float) -> str:
+        return (
+            f"Fetched {self.pages_fetched} feed pages in {elapsed:.1f}s. "
+            f"Found {len(self.games[GameType.DAILY_CHALLENGE])} new daily challenge games, "
+            f"{len(self.games[GameType.STANDARD])} new standard games, "
+            f"{len(self.games[GameType.RANKED_DUELS])} new ranked duel games, "
+            f"{len(self.games[GameType.UNRANKED_DUELS])} new unranked duel games, "
+            f"and {len(self.games[GameType.RANKED_TEAM_DUELS])} new ranked team duel games. "
+        )
+
 
 class Geoguessr:
     def __init__(
@@ -22,65 +197,251 @@ class Geoguessr:
         last_unranked_duel_id: str,
         last_team_duel_id: str,
         max_games: int = 50,
+        concurrency: int = 1,
+        rate_limiter: Optional[RateLimiter] = None,
+        payload_cache: Optional[PayloadCache] = None,
+        username_cache: Optional[UsernameCache] = None,
+        checkpoint: Optional[FetchCheckpoint] = None,
+        older_than: Optional[dict[GameType, str]] = None,
+        known_game_ids: Optional[set[str]] = None,
+        base_url: str = GEOGUESSR_BASE_URL,
+        game_server_url: str = GAME_SERVER_BASE_URL,
+        output: Optional[TextIO] = None,
+    ) -> None:
+        self._configure(
+            username,
+            ncfa_cookie,
+            concurrency=concurrency,
+            rate_limiter=rate_limiter,
+            payload_cache=payload_cache,
+            username_cache=username_cache,
+            checkpoint=checkpoint,
+            older_than=older_than,
+            known_game_ids=known_game_ids,
+            base_url=base_url,
+            game_server_url=game_server_url,
+            output=output,
+        )
+        try:
+            self._fetch(
+                last_challenge_seed,
+                last_standard_game_token,
+                last_ranked_duel_id,
+                last_unranked_duel_id,
+                last_team_duel_id,
+                max_games,
+            )
+        finally:
+            self.close()
+
+    def _configure(
+        self,
+        username: str,
+        ncfa_cookie: str,
+        concurrency: int = 1,
+        rate_limiter: Optional[RateLimiter] = None,
+        payload_cache: Optional[PayloadCache] = None,
+        username_cache: Optional[UsernameCache] = None,
+        checkpoint: Optional[FetchCheckpoint] = None,
+        older_than: Optional[dict[GameType, str]] = None,
+        known_game_ids: Optional[set[str]] = None,
+        base_url: str = GEOGUESSR_BASE_URL,
+        game_server_url: str = GAME_SERVER_BASE_URL,
+        output: Optional[TextIO] = None,
     ) -> None:
+        """Set up everything a fetch needs, without making any requests."""
         self.username = username
         self.ncfa_cookie = ncfa_cookie
-        self.user_id = self._get_userID()
-        self.userids_to_usernames = {}
+        self.base_url = base_url.rstrip("/")
+        self.game_server_url = game_server_url.rstrip("/")
+        # Maximum number of game detail requests in flight at once (1 = sequential).
+        self.concurrency = max(1, int(concurrency or 1))
+        # One pooled keep-alive session per API host, created on first use and closed once the fetch is done.
+        self._sessions: dict[str, requests.Session] = {}
+        self._lock = threading.Lock()
+        # Shared across all workers (and across fetches when passed in) so the request rate is bounded globally.
+        self.rate_limiter = rate_limiter if rate_limiter is not None else RateLimiter(burst=self.concurrency)
+        # Raw payloads of finished games; None disables the cache.
+        self.payload_cache = payload_cache
+        # A cache passed in is shared with other fetches and saved by its owner once they are all done.
+        self._owns_username_cache = username_cache is None
+        self.username_cache = username_cache if username_cache is not None else UsernameCache()
+        # Progress of this fetch saved as it runs, so an interrupted fetch can resume; None disables it.
+        self.checkpoint = checkpoint
+        # Backfill mode: oldest stored id/token per game type. The feed is paged past these without
+        # fetching any details, and only games older than them are returned. None = normal fetch.
+        self.older_than = older_than
+        # Ids/tokens of every game already stored for the user; feed entries in this set are skipped.
+        self.known_game_ids = known_game_ids if known_game_ids is not None else set()
+        self.request_count = 0
+        self.request_seconds = 0.0
+        self.retry_count = 0
+        self.dropped_requests: list[str] = []
+        # Per-endpoint request and per-phase timings; callers may add phases of their own (e.g. saving).
+        self.metrics = FetchMetrics()
+        self.pages_fetched = 0
+        # Where progress messages go (stdout if None); when set, e.g. to collect one web request's messages,
+        # progress bars are left out.
+        self.output = output
+        self._reset_results()
+
+    def _reset_results(self) -> None:
         self.daily_challenge_games = []
         self.standard_games = []
         self.ranked_duel_games = []
         self.unranked_duel_games = []
         self.ranked_team_duel_games = {}
+        self._team_duel_games = []
 
-        print(
-            f"Fetching games for user '{self.username}' (ID: {self.user_id}) since last challenge seed '{last_challenge_seed}', "
-            f"last standard game token '{last_standard_game_token}', "
-            f"last ranked duel ID '{last_ranked_duel_id}', last unranked duel ID '{last_unranked_duel_id}', "
-            f"and last team duel ID '{last_team_duel_id}'..."
-        )
+    def _fetch(self, last_challenge_seed, last_standard_game_token, last_ranked_duel_id, last_unranked_duel_id, last_team_duel_id, max_games):
+        """Run the full fetch: feed pagination, game details and username resolution."""
+        self.user_id = self._restored_user_id() or self._get_userID()
+        if self.checkpoint is not None:
+            self.checkpoint.user_id = self.user_id
+        self._print_fetch_start(last_challenge_seed, last_standard_game_token, last_ranked_duel_id, last_unranked_duel_id, last_team_duel_id)
         self._get_games(last_challenge_seed=last_challenge_seed,
                         last_standard_game_token=last_standard_game_token,
                         last_ranked_duel_id=last_ranked_duel_id,
                         last_unranked_duel_id=last_unranked_duel_id,
                         last_team_duel_id=last_team_duel_id,
                         max_games=max_games)
-        print("Converting user IDs to usernames...")
-        self._load_username_map()
+        print("Converting user IDs to usernames...", file=self.output)
         self._convert_ids_to_usernames()
-        self._save_username_map()
-        return
+        if self._owns_username_cache:
+            self.username_cache.save()
+        self._print_fetch_summary()
 
-    def _make_request(self, endpoint: str, *, timeout: tuple[float, float] = (20.0, 60.0), max_retries: int = 3):
+    def _restored_user_id(self) -> Optional[str]:
+        """Return the user id saved in a resumed checkpoint, so the profile need not be requested again."""
+        if self.checkpoint is not None and self.checkpoint.resumed and self.checkpoint.user_id:
+            print(
+                f"Resuming fetch from checkpoint: {self.checkpoint.pages_fetched} feed pages and "
+                f"{sum(len(d) for d in self.checkpoint.details.values())} games already fetched",
+                file=self.output,
+            )
+            return self.checkpoint.user_id
+        return None
+
+    def _print_fetch_start(self, last_challenge_seed, last_standard_game_token, last_ranked_duel_id, last_unranked_duel_id, last_team_duel_id) -> None:
+        if self.older_than is not None:
+            print(
+                f"Fetching games for user '{self.username}' (ID: {self.user_id}) older than challenge seed "
+                f"'{self.older_than.get(GameType.DAILY_CHALLENGE, '')}', "
+                f"standard game token '{self.older_than.get(GameType.STANDARD, '')}', "
+                f"ranked duel ID '{self.older_than.get(GameType.RANKED_DUELS, '')}', "
+                f"unranked duel ID '{self.older_than.get(GameType.UNRANKED_DUELS, '')}', "
+                f"and team duel ID '{self.older_than.get(GameType.RANKED_TEAM_DUELS, '')}'...",
+                file=self.output,
+            )
+        else:
+            print(
+                f"Fetching games for user '{self.username}' (ID: {self.user_id}) since last challenge seed '{last_challenge_seed}', "
+                f"last standard game token '{last_standard_game_token}', "
+                f"last ranked duel ID '{last_ranked_duel_id}', last unranked duel ID '{last_unranked_duel_id}', "
+                f"and last team duel ID '{last_team_duel_id}'...",
+                file=self.output,
+            )
+
+    def _print_fetch_summary(self) -> None:
+        print(
+            f"Made {self.request_count} requests (mean latency {self.mean_request_ms():.0f} ms, "
+            f"{self.retry_count} retries, final rate {self.rate_limiter.rate:.1f} req/s)",
+            file=self.output,
+        )
+        if self.dropped_requests:
+            print(f"Warning: dropped {len(self.dropped_requests)} requests after all retries:", file=self.output)
+            for endpoint in self.dropped_requests:
+                print(f"  {endpoint}", file=self.output)
+        if self.payload_cache is not None:
+            print(f"Payload cache: {self.payload_cache.hits} hits, {self.payload_cache.writes} new payloads stored", file=self.output)
+
+    def close(self) -> None:
+        """Close the pooled HTTP sessions."""
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions = {}
+        for session in sessions:
+            session.close()
+
+    def mean_request_ms(self) -> float:
+        """Mean wall time per HTTP request, in milliseconds."""
+        if not self.request_count:
+            return 0.0
+        return self.request_seconds * 1000.0 / self.request_count
+
+    def _get_session(self, endpoint: str) -> requests.Session:
+        """
+        Return the pooled session for the endpoint's host, creating it on first use.
+
+        Reusing a session keeps connections alive between requests, so each page, duel, game and
+        username lookup no longer pays for a fresh TCP+TLS handshake.
+        """
+        host = urlsplit(endpoint).netloc
+        with self._lock:
+            session = self._sessions.get(host)
+            if session is None:
+                session = requests.Session()
+                session.headers.update(self._get_headers())
+                # Keep enough pooled connections for every worker to have one of its own.
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(10, self.concurrency))
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                self._sessions[host] = session
+            return session
+
+    def _make_request(self, endpoint: str, *, timeout: tuple[float, float] = (20.0, 60.0), max_retries: int = 6):
         """GET a GeoGuessr API endpoint and return parsed JSON.
 
         This is best-effort: network timeouts / transient server errors should not crash a full fetch.
+        Every attempt waits for the shared rate limiter; 429s and 5xx responses are retried with
+        jittered backoff (or after Retry-After). Requests that still fail are counted as dropped.
         Returns a JSON object (usually dict) on success, otherwise None.
         """
 
+        session = self._get_session(endpoint)
         for attempt in range(1, max_retries + 1):
+            retry_after = None
+            self.rate_limiter.acquire()
             try:
-                response = requests.request("GET", endpoint, headers=self._get_headers(), timeout=timeout)
+                started = time.perf_counter()
+                response = None
+                try:
+                    response = session.get(endpoint, timeout=timeout)
+                finally:
+                    elapsed = time.perf_counter() - started
+                    self.rate_limiter.release()
+                    self.metrics.record_request(endpoint, elapsed, len(response.content) if response is not None else 0)
+                    with self._lock:
+                        self.request_count += 1
+                        self.request_seconds += elapsed
 
                 # Retry on transient server issues / rate limiting.
-                if response.status_code == 429 or response.status_code >= 500:
-                    if attempt < max_retries:
-                        time.sleep(0.5 * attempt)
-                        continue
-                    return None
+                if response.status_code == 429:
+                    retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                    self.rate_limiter.record_throttle(retry_after)
+                elif response.status_code >= 500:
+                    self.rate_limiter.record_error()
+                else:
+                    self.rate_limiter.record_success()
+                    if not response.ok:
+                        return None
+                    try:
+                        return response.json()
+                    except Exception:
+                        return None
+            except requests.exceptions.RequestException:
+                self.rate_limiter.record_error()
 
-                if not response.ok:
-                    return None
+            if attempt < max_retries:
+                with self._lock:
+                    self.retry_count += 1
+                self.metrics.record_retry(endpoint)
+                time.sleep(self.rate_limiter.backoff(attempt, retry_after))
 
-                try:
-                    return response.json()
-                except Exception:
-                    return None
-            except requests.exceptions.RequestException:
-                if attempt < max_retries:
-                    time.sleep(0.5 * attempt)
-                    continue
-                return None
+        with self._lock:
+            self.dropped_requests.append(endpoint)
+        self.metrics.record_failure(endpoint)
+        return None
 
     def _get_headers(self) -> dict:
         cookie = self.ncfa_cookie
@@ -89,6 +450,7 @@ class Geoguessr:
         return {
             "authority": "www.geoguessr.com",
             "accept": "*/*",
+            "accept-encoding": ACCEPT_ENCODING,
             "accept-language": "en-US,en;q=0.9",
             "content-type": "application/json",
             "cookie": "_ncfa="+cookie,
@@ -96,8 +458,10 @@ class Geoguessr:
         }
     
     def _get_userID(self) -> str:
-        url = "https://www.geoguessr.com/api/v3/profiles"
-        raw_data = self._make_request(url)
+        return self._user_id_from_payload(self._make_request(f"{self.base_url}/api/v3/profiles"))
+
+    @staticmethod
+    def _user_id_from_payload(raw_data) -> str:
         if not isinstance(raw_data, dict):
             return ""
         user = raw_data.get('user', {})
@@ -105,21 +469,38 @@ class Geoguessr:
             return ""
         return user.get('id', "")        
     
+    def _get_payload(self, endpoint: str, key: str, url: str):
+        """
+        Return the raw payload for a game, from the payload cache when possible.
+
+        Payloads fetched from the network are added to the cache once the game is finished. When the
+        cache is shared with other users' fetches, a game they are downloading at the same time (e.g. a
+        duel between two tracked players) is waited for rather than requested again.
+        """
+        if self.payload_cache is None:
+            return self._make_request(url)
+        return self.payload_cache.get_or_fetch(endpoint, key, partial(self._make_request, url))
+
     def _query_game_data(self, game_type: str, game_id: str) -> Optional[GeoguessrDuelGame]:
-        url = f"https://game-server.geoguessr.com/api/duels/{game_id}"
-        raw_data = self._make_request(url)
+        url = f"{self.game_server_url}/api/duels/{game_id}"
+        raw_data = self._get_payload(DUELS_ENDPOINT, game_id, url)
         if raw_data is None:
             return None
-        return GeoguessrDuelGame.from_geoguessr_data(game_type, game_id, self.user_id, raw_data)
+        # Guess countries are resolved for the whole fetch at once, see _resolve_guess_countries.
+        return GeoguessrDuelGame.from_geoguessr_data(game_type, game_id, self.user_id, raw_data, resolve_countries=False)
 
     def _query_standard_game_data(self, entry: dict) -> Optional[GeoguessrStandardGame]:
         game_token = entry.get("game_token", "")
         if not game_token:
             return None
-        url = f"https://www.geoguessr.com/api/v3/games/{game_token}"
-        raw_data = self._make_request(url)
+        url = f"{self.base_url}/api/v3/games/{game_token}"
+        return self._standard_game_from_payload(entry, self._get_payload(GAMES_ENDPOINT, game_token, url))
+
+    @staticmethod
+    def _standard_game_from_payload(entry: dict, raw_data) -> Optional[GeoguessrStandardGame]:
         if raw_data is None or not isinstance(raw_data, dict):
             return None
+        game_token = entry.get("game_token", "")
         return GeoguessrStandardGame(
             game_type=GameType.STANDARD,
             time=entry.get("time", ""),
@@ -129,6 +510,8 @@ class Geoguessr:
             mode=raw_data.get("mode", ""),
             state=raw_data.get("state", ""),
             round_count=raw_data.get("roundCount", 0) or 0,
+            # Guess countries are resolved for the whole fetch at once, see _resolve_guess_countries.
+            rounds=GeoguessrStandardGame.rounds_from_raw(raw_data),
             raw=raw_data,
         )
     
@@ -181,17 +564,18 @@ class Geoguessr:
         """
         Return a dictionary containing a list of games for each game type and the next pagination token
         """
-        url = f"https://www.geoguessr.com/api/v4/feed/private?paginationToken={pagination_token}"
-        raw_data = self._make_request(url)
+        return self._parse_feed_page(self._make_request(self._feed_url(pagination_token)))
+
+    def _feed_url(self, pagination_token) -> str:
+        return f"{self.base_url}/api/v4/feed/private?paginationToken={pagination_token}"
+
+    def _parse_feed_page(self, raw_data) -> tuple[dict, Optional[str]]:
+        """Split a raw feed page into lists of games per game type, plus the next pagination token."""
+        games = {game_type: [] for game_type in FEED_GAME_TYPES}
         if not isinstance(raw_data, dict):
-            return games, None
-        games = {
-            GameType.DAILY_CHALLENGE: [],
-            GameType.STANDARD: [],
-            GameType.RANKED_DUELS: [],
-            GameType.UNRANKED_DUELS: [],
-            GameType.RANKED_TEAM_DUELS: [],
-        }
+            # Treating the page as the end of the feed would silently drop every older game: the next
+            # incremental fetch stops at the games saved now and never reaches them.
+            raise FeedRequestError("A feed page could not be fetched; nothing was saved. Run fetch again to resume.")
         entries = raw_data.get('entries') or []
         token = raw_data.get('paginationToken')
         for item in entries:
@@ -215,50 +599,78 @@ class Geoguessr:
                         self._extract_game_data(games, time, payload)
         return games, token
     
-    def _get_username(self, user_id: str) -> str:
+    def _lookup_username(self, user_id: str) -> Optional[str]:
         """
-        Given a user ID, return the corresponding username
+        Request the current username for a user ID, or None if the lookup failed
         """
-        if user_id in self.userids_to_usernames:
-            return self.userids_to_usernames[user_id]
-        
-        url = f"https://www.geoguessr.com/api/v3/users/{user_id}"
-        raw_data = self._make_request(url)
-        username = user_id
-        if isinstance(raw_data, dict):
-            username = raw_data.get('nick', user_id)
-        self.userids_to_usernames[user_id] = username
-        return username
-    
-    def _load_username_map(self):
+        return self._username_from_payload(self._make_request(f"{self.base_url}/api/v3/users/{user_id}"))
+
+    @staticmethod
+    def _username_from_payload(raw_data) -> Optional[str]:
+        if isinstance(raw_data, dict) and raw_data.get('nick'):
+            return str(raw_data['nick'])
+        return None
+
+    def _resolve_usernames(self, user_ids) -> None:
         """
-        Load the username map from the JSON file if it exists
+        Look up every unique user ID that is missing from the username cache (or whose entry has
+        expired), spreading the requests across the worker pool. IDs another fetch sharing the cache
+        is already looking up are waited for rather than requested again
         """
-        try:
-            with open(USERNAME_MAP_FILE, "r", encoding="utf-8") as f:
-                self.userids_to_usernames = json.load(f)
-        except FileNotFoundError:
-            self.userids_to_usernames = {}
+        unresolved = self.username_cache.unresolved(user_ids)
+        if not unresolved:
+            return
+
+        def resolve(user_id: str) -> Optional[str]:
+            return self.username_cache.get_or_lookup(
+                user_id, partial(self._timed, "usernames", self._lookup_username, user_id)
+            )
 
-    def _save_username_map(self):
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            for _name in tqdm(
+                executor.map(resolve, unresolved),
+                total=len(unresolved),
+                desc="Resolving usernames",
+                disable=self.output is not None,
+            ):
+                pass
+
+    def _get_username(self, user_id: str) -> str:
         """
-        Save the username map to the JSON file
+        Given a user ID, return the corresponding username (or the ID itself if it could not be resolved)
         """
-        with open(USERNAME_MAP_FILE, "w", encoding="utf-8") as f:
-            json.dump(self.userids_to_usernames, f, indent=2)
-    
+        return self.username_cache.get(user_id) or user_id
+
     def _convert_ids_to_usernames(self):
         """
-        For each game in ranked duel and team duels, convert user IDs to usernames
+        Resolve every opponent and teammate ID in one batch, then convert the user IDs in ranked,
+        unranked and team duels to usernames and group team duels by teammate
         """
-        # Combine all games for a single progress bar
-        all_games = list(self.ranked_duel_games)
-        all_games.extend(self.unranked_duel_games)
-        for games in self.ranked_team_duel_games.values():
-            all_games.extend(games)
-        from tqdm import tqdm
-        for game in tqdm(all_games, desc="Converting user IDs to usernames"):
+        self._resolve_usernames(self._duel_user_ids())
+        self._apply_usernames()
+
+    def _duel_user_ids(self) -> list[str]:
+        """Return every opponent and teammate ID of the fetched duels."""
+        duel_games = list(self.ranked_duel_games) + list(self.unranked_duel_games) + list(self._team_duel_games)
+        user_ids = [uid for game in duel_games for uid in game.opponents]
+        user_ids.extend(game.teammate for game in self._team_duel_games)
+        return user_ids
+
+    def _apply_usernames(self) -> None:
+        """Replace user IDs in the fetched duels with cached usernames and group team duels by teammate."""
+        duel_games = list(self.ranked_duel_games) + list(self.unranked_duel_games) + list(self._team_duel_games)
+        for game in duel_games:
             game.opponents = [self._get_username(uid) for uid in game.opponents]
+
+        # Group team duels by teammate (safe username) and store teammate as username.
+        self.ranked_team_duel_games = {}
+        for game in self._team_duel_games:
+            teammate_username = self._get_username(game.teammate)
+            game.teammate = teammate_username
+            safename = self._username_to_filename(teammate_username)
+            if safename not in self.ranked_team_duel_games:
+                self.ranked_team_duel_games[safename] = []
+            self.ranked_team_duel_games[safename].append(game)
     
     def _username_to_filename(self, username: str) -> str:
         """
@@ -269,124 +681,148 @@ class Geoguessr:
         safe_username = "".join(c for c in safe_username if c.isalnum() or c == "_")
         return safe_username
 
+    def _submit_details(self, executor: ThreadPoolExecutor, game_type: GameType, game) -> Optional[Future]:
+        """
+        Queue the detail request for a newly found game; daily challenges need none.
+
+        Games already parsed in a resumed checkpoint are returned as completed futures without a request.
+        """
+        if not self._needs_details(game_type, game):
+            return None
+        key = feed_game_key(game_type, game)
+        if game_type == GameType.STANDARD:
+            query = partial(self._timed, "standard details", self._query_standard_game_data, game)
+        else:
+            query = partial(self._timed, "duel details", self._query_game_data, game_type, game)
+
+        if self.checkpoint is None:
+            return executor.submit(query)
+        restored = self.checkpoint.get_details(game_type, key)
+        if restored is not None:
+            future = Future()
+            future.set_result(restored)
+            return future
+        future = executor.submit(query)
+        future.add_done_callback(partial(self._checkpoint_details, game_type, key))
+        return future
+
+    @staticmethod
+    def _needs_details(game_type: GameType, game) -> bool:
+        """Daily challenges are complete as found in the feed; standard games and duels need a detail request."""
+        if game_type == GameType.STANDARD:
+            return isinstance(game, dict)
+        return game_type in DUEL_GAME_TYPES
+
+    def _timed(self, phase: str, func, *args):
+        """Call func(*args), recording its duration as one unit of work of a fetch phase."""
+        with self.metrics.phase(phase):
+            return func(*args)
+
+    def _checkpoint_details(self, game_type: GameType, key: str, future: Future) -> None:
+        if future.cancelled() or future.exception() is not None:
+            return
+        self.checkpoint.record_details(game_type, key, future.result())
+        self.checkpoint.save(force=False)
+
+    def _collect_details(self, futures: list[Future], desc: str) -> list:
+        """Wait for detail requests and return their non-None results in the original feed order."""
+        for _ in tqdm(as_completed(futures), total=len(futures), desc=desc, disable=self.output is not None):
+            pass
+        # Futures were queued in feed order, so reading them back in that order keeps the
+        # reverse-chronological ordering regardless of completion order.
+        return [result for result in (future.result() for future in futures) if result is not None]
+
     def _get_games(self, last_challenge_seed, last_standard_game_token, last_ranked_duel_id, last_unranked_duel_id, last_team_duel_id, max_games=1000):
         """
         Return a dictionary containing a list of games for each game type since the last seen IDs
+
+        Feed pagination and game detail requests run as a pipeline: every new game found on a feed
+        page is handed straight to a pool of `concurrency` detail workers while the next page is
+        requested, so the fetch takes about as long as the slower of the two phases.
         """
-        games = {
-            GameType.DAILY_CHALLENGE: [],
-            GameType.STANDARD: [],
-            GameType.RANKED_DUELS: [],
-            GameType.UNRANKED_DUELS: [],
-            GameType.RANKED_TEAM_DUELS: [],
-        }
-        # Track which game types have found their last game
-        complete_types = {
-            GameType.DAILY_CHALLENGE: False,
-            GameType.STANDARD: False,
-            GameType.RANKED_DUELS: False,
-            GameType.UNRANKED_DUELS: False,
-            GameType.RANKED_TEAM_DUELS: False,
-        }
-        token = ""
-        total_game_ids = 0
-        pages_fetched = 0
-        # Use tqdm to show progress of fetching game IDs
-        while total_game_ids < max_games and token is not None:
-            pages_fetched += 1
-            temp_games, token = self._get_game_ids_page(token)
-            
-            for game_type in games.keys():
-                # Skip if we've already found the last game for this type
-                if complete_types[game_type]:
-                    continue
-                    
-                for game in temp_games[game_type]:
-                    # Check if this is the last game we already have
-                    if game_type == GameType.DAILY_CHALLENGE:
-                        if game.challenge_token == last_challenge_seed:
-                            complete_types[game_type] = True
-                            break
-                    elif game_type == GameType.STANDARD:
-                        if (game.get("game_token", "") if isinstance(game, dict) else "") == last_standard_game_token:
-                            complete_types[game_type] = True
-                            break
-                    elif game_type == GameType.RANKED_DUELS:
-                        if game == last_ranked_duel_id:
-                            complete_types[game_type] = True
-                            break
-                    elif game_type == GameType.UNRANKED_DUELS:
-                        if game == last_unranked_duel_id:
-                            complete_types[game_type] = True
-                            break
-                    elif game_type == GameType.RANKED_TEAM_DUELS:
-                        if game == last_team_duel_id:
-                            complete_types[game_type] = True
-                            break
-                    
-                    # Add the game and increment counter
-                    games[game_type].append(game)
-                    total_game_ids += 1
-                    
-                    # Check if we've hit the max games limit
-                    if total_game_ids >= max_games:
-                        complete_types[game_type] = True
-                        break
-            
-            # Stop if all game types are complete
-            if all(complete_types.values()):
-                break
-
-        self.pages_fetched = pages_fetched
-        
-        print(
-            f"Fetched {pages_fetched} feed pages. "
-            f"Found {len(games[GameType.DAILY_CHALLENGE])} new daily challenge games, "
-            f"{len(games[GameType.STANDARD])} new standard games, "
-            f"{len(games[GameType.RANKED_DUELS])} new ranked duel games, "
-            f"{len(games[GameType.UNRANKED_DUELS])} new unranked duel games, "
-            f"and {len(games[GameType.RANKED_TEAM_DUELS])} new ranked team duel games. "
+        scan = FeedScan(
+            {
+                GameType.DAILY_CHALLENGE: last_challenge_seed,
+                GameType.STANDARD: last_standard_game_token,
+                GameType.RANKED_DUELS: last_ranked_duel_id,
+                GameType.UNRANKED_DUELS: last_unranked_duel_id,
+                GameType.RANKED_TEAM_DUELS: last_team_duel_id,
+            },
+            max_games,
+            older_than=self.older_than,
+            known_game_ids=self.known_game_ids,
         )
-        self.daily_challenge_games = games[GameType.DAILY_CHALLENGE]
+        executor = ThreadPoolExecutor(max_workers=self.concurrency)
+        try:
+            self._run_games_pipeline(executor, scan)
+        except BaseException:
+            # Don't leave queued detail requests running after an error or Ctrl-C, and keep
+            # everything fetched so far for the next run.
+            executor.shutdown(wait=False, cancel_futures=True)
+            self._save_interrupted_checkpoint()
+            raise
+        executor.shutdown(wait=True)
+        if self.checkpoint is not None:
+            self.checkpoint.save()
 
-        # Query standard game details.
-        self.standard_games = []
-        standard_entries = games[GameType.STANDARD]
-        queried_standard = []
-        for entry in tqdm(standard_entries, desc="Querying Standard game data"):
-            if not isinstance(entry, dict):
-                continue
-            game_data = self._query_standard_game_data(entry)
-            if game_data is not None:
-                queried_standard.append(game_data)
-        self.standard_games = queried_standard
+    def _save_interrupted_checkpoint(self) -> None:
+        if self.checkpoint is not None:
+            self.checkpoint.save()
+            print(f"Fetch interrupted; progress saved to {self.checkpoint.path}. Run fetch again to resume.", file=self.output)
 
-        # Query duel game details (ranked, unranked, and team duels).
-        self.ranked_duel_games = []
-        self.unranked_duel_games = []
-        self.ranked_team_duel_games = {}
+    def _run_games_pipeline(self, executor: ThreadPoolExecutor, scan: FeedScan) -> None:
+        # Pending detail requests for each game type, in feed order
+        detail_futures = {game_type: [] for game_type in FEED_GAME_TYPES}
+
+        def submit(game_type: GameType, game) -> None:
+            future = self._submit_details(executor, game_type, game)
+            if future is not None:
+                detail_futures[game_type].append(future)
+
+        started = time.perf_counter()
+        checkpoint = self.checkpoint
+        if checkpoint is not None and checkpoint.resumed:
+            # Already-parsed games of the interrupted run need no request.
+            for game_type, game in scan.restore(checkpoint):
+                submit(game_type, game)
+
+        while not scan.done:
+            with self.metrics.phase("feed"):
+                page_games, token = self._get_game_ids_page(scan.token)
+            for game_type, game in scan.add_page(page_games, token):
+                # Start fetching its details while the next page is requested
+                submit(game_type, game)
+            if checkpoint is not None:
+                scan.record(checkpoint)
+                checkpoint.save(force=False)
+
+        scan.feed_complete = True
+        if checkpoint is not None:
+            scan.record(checkpoint)
+            checkpoint.save()
+        self.pages_fetched = scan.pages_fetched
+        print(scan.summary(time.perf_counter() - started), file=self.output)
+        self.daily_challenge_games = scan.games[GameType.DAILY_CHALLENGE]
+
+        # Wait for the remaining standard game details.
+        self.standard_games = self._collect_details(detail_futures[GameType.STANDARD], "Querying Standard game data")
+
+        # Wait for the remaining duel game details (ranked, unranked, and team duels).
+        duels = {
+            game_type: self._collect_details(detail_futures[game_type], f"Querying {game_type} data")
+            for game_type in DUEL_GAME_TYPES
+        }
+        self._resolve_guess_countries(duels)
+        self._set_duel_results(duels)
+        print(f"Fetched all game details {time.perf_counter() - started:.1f}s after the first feed page.", file=self.output)
+
+    def _resolve_guess_countries(self, duels: dict[GameType, list]) -> None:
+        """Geocode the guesses of every fetched standard game and duel in one batch."""
+        with self.metrics.phase("geocoding"):
+            resolve_guess_countries([*self.standard_games, *(game for games in duels.values() for game in games)])
 
-        for game_type in [GameType.RANKED_DUELS, GameType.UNRANKED_DUELS, GameType.RANKED_TEAM_DUELS]:
-            game_ids = games[game_type]
-            queried_games = []
-            for game_id in tqdm(game_ids, desc=f"Querying {game_type} data"):
-                game_data = self._query_game_data(game_type, game_id)
-                if game_data is not None:
-                    queried_games.append(game_data)
-
-            if game_type == GameType.RANKED_DUELS:
-                self.ranked_duel_games = queried_games
-            elif game_type == GameType.UNRANKED_DUELS:
-                self.unranked_duel_games = queried_games
-            elif game_type == GameType.RANKED_TEAM_DUELS:
-                # Group team duels by teammate (safe username) and store teammate as username.
-                for game in queried_games:
-                    teammate_id = game.teammate
-                    teammate_username = self._get_username(teammate_id)
-                    game.teammate = teammate_username
-                    safename = self._username_to_filename(teammate_username)
-                    if safename not in self.ranked_team_duel_games:
-                        self.ranked_team_duel_games[safename] = []
-                    self.ranked_team_duel_games[safename].append(game)
-
-    
\ No newline at end of file
+    def _set_duel_results(self, duels: dict[GameType, list]) -> None:
+        self.ranked_duel_games = duels.get(GameType.RANKED_DUELS, [])
+        self.unranked_duel_games = duels.get(GameType.UNRANKED_DUELS, [])
+        # Grouped by teammate once usernames have been resolved.
+        self._team_duel_games = duels.get(GameType.RANKED_TEAM_DUELS, [])
@@ -0,0 +1,210 @@
+# Request and phase timing for fetches
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+from urllib.parse import urlsplit
+
+# Upper bounds (ms) of the latency histogram buckets; anything slower lands in a final overflow bucket.
+LATENCY_BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000]
+
+
+def endpoint_name(url: str) -> str:
+    """Return a short name for the API endpoint of a request URL, e.g. 'feed' or 'duels'."""
+    path = urlsplit(url).path
+    if path.startswith("/api/v4/feed/"):
+        return "feed"
+    if path.startswith("/api/duels/"):
+        return "duels"
+    if path.startswith("/api/v3/games/"):
+        return "games"
+    if path.startswith("/api/v3/users/"):
+        return "users"
+    if path.startswith("/api/v3/profiles"):
+        return "profiles"
+    return path or "other"
+
+
+class LatencyHistogram:
+    """Bucketed latency distribution with exact count, total, min and max. Not thread-safe on its own."""
+
+    def __init__(self) -> None:
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.min_ms: Optional[float] = None
+        self.max_ms: Optional[float] = None
+
+    def record(self, seconds: float) -> None:
+        ms = seconds * 1000.0
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        self.min_ms = ms if self.min_ms is None else min(self.min_ms, ms)
+        self.max_ms = ms if self.max_ms is None else max(self.max_ms, ms)
+
+    def mean_ms(self) -> float:
+        return self.total_ms / self.count if self.count else 0.0
+
+    def percentile_ms(self, p: float) -> float:
+        """Estimate the p-th percentile, interpolating linearly within its bucket (clamped to min/max)."""
+        if not self.count:
+            return 0.0
+        rank = max(1.0, p / 100.0 * self.count)
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            if n and seen + n >= rank:
+                lower = LATENCY_BUCKETS_MS[i - 1] if i > 0 else 0.0
+                upper = LATENCY_BUCKETS_MS[i] if i < len(LATENCY_BUCKETS_MS) else self.max_ms
+                estimate = lower + (upper - lower) * (rank - seen) / n
+                return min(self.max_ms, max(self.min_ms, estimate))
+            seen += n
+        return self.max_ms
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "mean_ms": round(self.mean_ms(), 1),
+            "p50_ms": round(self.percentile_ms(50), 1),
+            "p90_ms": round(self.percentile_ms(90), 1),
+            "p99_ms": round(self.percentile_ms(99), 1),
+            "min_ms": round(self.min_ms or 0.0, 1),
+            "max_ms": round(self.max_ms or 0.0, 1),
+            # Bucket upper bounds in ms ("inf" for the overflow bucket) -> number of samples.
+            "buckets": {
+                (str(LATENCY_BUCKETS_MS[i]) if i < len(LATENCY_BUCKETS_MS) else "inf"): n
+                for i, n in enumerate(self.buckets)
+                if n
+            },
+        }
+
+
+class EndpointStats:
+    def __init__(self) -> None:
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+        self.bytes = 0
+        self.latency = LatencyHistogram()
+
+    def to_dict(self) -> dict:
+        return {
+            "requests": self.requests,
+            "retries": self.retries,
+            "failures": self.failures,
+            "bytes": self.bytes,
+            "latency": self.latency.to_dict(),
+        }
+
+
+class PhaseStats:
+    def __init__(self) -> None:
+        self.latency = LatencyHistogram()
+        self.first_start: Optional[float] = None
+        self.last_end: Optional[float] = None
+
+    def wall_secs(self) -> float:
+        if self.first_start is None or self.last_end is None:
+            return 0.0
+        return self.last_end - self.first_start
+
+    def to_dict(self) -> dict:
+        return {"wall_secs": round(self.wall_secs(), 3), "latency": self.latency.to_dict()}
+
+
+class FetchMetrics:
+    """
+    Thread-safe request and phase timings for one fetch.
+
+    Every HTTP attempt is recorded against its endpoint (requests, retries, requests that failed after
+    all retries, response bytes and a latency histogram). Phases (feed pagination, standard details,
+    duel details, guess geocoding, username resolution, saving) record the duration of each unit of work in a histogram,
+    plus the wall time from the first unit starting to the last one finishing, since units of different
+    phases overlap.
+    """
+
+    # Order in which phases are reported.
+    PHASES = ["feed", "standard details", "duel details", "geocoding", "usernames", "saving"]
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.endpoints: dict[str, EndpointStats] = {}
+        self.phases: dict[str, PhaseStats] = {}
+
+    def _endpoint(self, name: str) -> EndpointStats:
+        stats = self.endpoints.get(name)
+        if stats is None:
+            stats = self.endpoints[name] = EndpointStats()
+        return stats
+
+    def record_request(self, url: str, seconds: float, num_bytes: int = 0) -> None:
+        with self._lock:
+            stats = self._endpoint(endpoint_name(url))
+            stats.requests += 1
+            stats.bytes += num_bytes
+            stats.latency.record(seconds)
+
+    def record_retry(self, url: str) -> None:
+        with self._lock:
+            self._endpoint(endpoint_name(url)).retries += 1
+
+    def record_failure(self, url: str) -> None:
+        with self._lock:
+            self._endpoint(endpoint_name(url)).failures += 1
+
+    def record_phase(self, name: str, started: float, ended: float) -> None:
+        """Record one unit of work of a phase, with start/end times from time.perf_counter()."""
+        with self._lock:
+            stats = self.phases.get(name)
+            if stats is None:
+                stats = self.phases[name] = PhaseStats()
+            stats.latency.record(ended - started)
+            stats.first_start = started if stats.first_start is None else min(stats.first_start, started)
+            stats.last_end = ended if stats.last_end is None else max(stats.last_end, ended)
+
+    @contextmanager
+    def phase(self, name: str):
+        """Time the enclosed block as one unit of work of a phase."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_phase(name, started, time.perf_counter())
+
+    def _phase_order(self) -> list[str]:
+        known = [name for name in self.PHASES if name in self.phases]
+        return known + sorted(name for name in self.phases if name not in self.PHASES)
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                "endpoints": {name: stats.to_dict() for name, stats in sorted(self.endpoints.items())},
+                "phases": {name: self.phases[name].to_dict() for name in self._phase_order()},
+            }
+
+    def format_summary(self) -> str:
+        """Return a printable report of per-endpoint requests and per-phase timings."""
+        data = self.to_dict()
+        lines = ["Requests by endpoint:"]
+        lines.append(
+            f"  {'endpoint':<10} {'requests':>8} {'retries':>7} {'failed':>6} {'KiB':>9} "
+            f"{'mean ms':>8} {'p50 ms':>7} {'p90 ms':>7} {'p99 ms':>7} {'max ms':>8}"
+        )
+        for name, stats in data["endpoints"].items():
+            latency = stats["latency"]
+            lines.append(
+                f"  {name:<10} {stats['requests']:>8} {stats['retries']:>7} {stats['failures']:>6} "
+                f"{stats['bytes'] / 1024:>9.1f} {latency['mean_ms']:>8.1f} {latency['p50_ms']:>7.0f} "
+                f"{latency['p90_ms']:>7.0f} {latency['p99_ms']:>7.0f} {latency['max_ms']:>8.0f}"
+            )
+        lines.append("Time by phase:")
+        lines.append(f"  {'phase':<17} {'wall s':>7} {'items':>6} {'mean ms':>8} {'p90 ms':>7} {'max ms':>8}")
+        for name, stats in data["phases"].items():
+            latency = stats["latency"]
+            lines.append(
+                f"  {name:<17} {stats['wall_secs']:>7.2f} {latency['count']:>6} {latency['mean_ms']:>8.1f} "
+                f"{latency['p90_ms']:>7.0f} {latency['max_ms']:>8.0f}"
+            )
+        return "\n".join(lines)
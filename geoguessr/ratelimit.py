@@ -0,0 +1,166 @@
+# Adaptive request rate limiting for the GeoGuessr API client
+
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Parse a Retry-After header into a delay in seconds.
+
+    The header may hold either a number of seconds or an HTTP date. Returns None when missing or unparseable.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except Exception:
+        return None
+    if retry_at is None:
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+class RateLimiter:
+    """
+    Thread-safe token bucket shared by every request of a fetch.
+
+    The refill rate adapts to what the server tells us (additive increase, multiplicative decrease):
+    every successful request nudges the rate up towards `max_rate`, a 429 halves it and a server
+    error or network failure trims it. A Retry-After delay pauses all callers until it has passed.
+
+    With `max_in_flight` set, at most that many requests may be outstanding at once across every
+    caller; each `acquire()` must then be paired with a `release()` once the response has arrived.
+    """
+
+    def __init__(
+        self,
+        rate: float = 10.0,
+        max_rate: Optional[float] = None,
+        min_rate: float = 0.5,
+        burst: int = 10,
+        base_backoff: float = 0.5,
+        max_backoff: float = 30.0,
+        max_in_flight: Optional[int] = None,
+    ) -> None:
+        self.min_rate = max(0.01, float(min_rate))
+        self.max_rate = max(self.min_rate, float(max_rate if max_rate is not None else rate * 4))
+        self.rate = min(self.max_rate, max(self.min_rate, float(rate)))
+        self.burst = max(1, int(burst))
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.max_in_flight = max(1, int(max_in_flight)) if max_in_flight else None
+        self._in_flight = threading.BoundedSemaphore(self.max_in_flight) if self.max_in_flight else None
+
+        self._lock = threading.Lock()
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+
+        self.throttled = 0
+        self.errors = 0
+        self.successes = 0
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(float(self.burst), self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self) -> None:
+        """Block until a request may be sent."""
+        if self._in_flight is not None:
+            self._in_flight.acquire()
+        try:
+            self._take_token()
+        except BaseException:
+            self.release()
+            raise
+
+    def release(self) -> None:
+        """Free the in-flight slot taken by `acquire()`."""
+        if self._in_flight is not None:
+            self._in_flight.release()
+
+    def try_acquire(self) -> float:
+        """
+        Take an in-flight slot and a token if both are free right now, without blocking.
+
+        Returns 0.0 when they were taken (pair it with `release()` as for `acquire()`), otherwise roughly
+        how many seconds to wait before trying again. Lets an event loop wait with asyncio.sleep instead
+        of blocking its thread.
+        """
+        if self._in_flight is not None and not self._in_flight.acquire(blocking=False):
+            # No way to know when another caller will release a slot; poll shortly.
+            return 0.01
+        wait = self._token_wait()
+        if wait:
+            self.release()
+        return wait
+
+    def _take_token(self) -> None:
+        while True:
+            wait = self._token_wait()
+            if not wait:
+                return
+            time.sleep(wait)
+
+    def _token_wait(self) -> float:
+        """Take a token and return 0.0, or return how long until one is available."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if now < self._paused_until:
+                return self._paused_until - now
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return 0.0
+            return (1.0 - self._tokens) / self.rate
+
+    def _decrease(self, factor: float) -> None:
+        # Many requests in flight will see the same burst of errors; only back off once per second
+        # so that a single overload does not collapse the rate to the minimum.
+        now = time.monotonic()
+        if now - self._last_decrease < 1.0:
+            return
+        self._last_decrease = now
+        self.rate = max(self.min_rate, self.rate * factor)
+        self._tokens = min(self._tokens, 0.0)
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.successes += 1
+            # Roughly +1 request/second for every `rate` successes, i.e. per second of clean traffic.
+            self.rate = min(self.max_rate, self.rate + 1.0 / self.rate)
+
+    def record_throttle(self, retry_after: Optional[float] = None) -> None:
+        """Record a 429 response, pausing everyone for `retry_after` seconds when the server sent one."""
+        with self._lock:
+            self.throttled += 1
+            self._decrease(0.5)
+            if retry_after:
+                self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+
+    def record_error(self) -> None:
+        """Record a server error or network failure."""
+        with self._lock:
+            self.errors += 1
+            self._decrease(0.8)
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """
+        Return how long to sleep before retry number `attempt` (starting at 1).
+
+        Honours Retry-After when given, otherwise uses exponential backoff with full jitter so that
+        concurrent workers do not retry in lockstep.
+        """
+        if retry_after is not None:
+            return retry_after + random.uniform(0, self.base_backoff)
+        return random.uniform(0, min(self.max_backoff, self.base_backoff * (2 ** attempt)))
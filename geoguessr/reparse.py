@@ -0,0 +1,86 @@
+# Offline re-derivation of stored games from stored or cached raw payloads
+
+import os
+from typing import Optional
+
+from geoguessr.cache import DUELS_ENDPOINT, PAYLOAD_CACHE_DIR, PayloadCache
+from geoguessr.game import GeoguessrDuelGame, GeoguessrStandardGame
+from geoguessr.geocode import resolve_guess_countries
+
+
+def _reparse_duel(job: tuple[str, str, str, str]) -> Optional[GeoguessrDuelGame]:
+    """
+    Worker: load one cached duel payload and parse it from the player's perspective.
+
+    The payload is read inside the worker so only the small job tuple and the parsed game cross the
+    process boundary. Guess countries are left for the parent to resolve in one batch, so workers never
+    load the geocoder.
+    """
+    cache_root, game_type, game_id, player_id = job
+    raw_data = PayloadCache(cache_root).get(DUELS_ENDPOINT, game_id)
+    if raw_data is None:
+        return None
+    return GeoguessrDuelGame.from_geoguessr_data(game_type, game_id, player_id, raw_data, resolve_countries=False)
+
+
+def reparse_duel_games(
+    games: list[GeoguessrDuelGame],
+    cache_root: str = PAYLOAD_CACHE_DIR,
+    workers: Optional[int] = None,
+) -> tuple[list[GeoguessrDuelGame], int]:
+    """
+    Re-derive stored duel games from their cached raw payloads using a process pool.
+
+    Returns the games in their original order together with the number actually reparsed. Games without
+    a cached payload (or without a stored player id) are returned unchanged. The stored game type and
+    feed time are carried over, as they come from the feed rather than the payload, and so are the
+    opponent and teammate usernames, as the payloads only hold user ids.
+    """
+    cache = PayloadCache(cache_root)
+    jobs = []
+    indexes = []
+    for i, game in enumerate(games):
+        player_id = getattr(game, "player_id", "") or ""
+        if player_id and cache.contains(DUELS_ENDPOINT, game.game_id):
+            jobs.append((cache_root, game.game_type, game.game_id, player_id))
+            indexes.append(i)
+
+    out = list(games)
+    if not jobs:
+        return out, 0
+
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1 or len(jobs) == 1:
+        results = [_reparse_duel(job) for job in jobs]
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            # Batch jobs so per-task IPC overhead stays small next to the parsing work.
+            chunksize = max(1, len(jobs) // (workers * 4))
+            results = list(executor.map(_reparse_duel, jobs, chunksize=chunksize))
+    resolve_guess_countries(game for game in results if game is not None)
+
+    reparsed = 0
+    for i, fresh in zip(indexes, results):
+        if fresh is None:
+            continue
+        stored = games[i]
+        fresh.game_type = stored.game_type
+        fresh.time = stored.time
+        fresh.opponents = stored.opponents
+        fresh.teammate = stored.teammate
+        out[i] = fresh
+        reparsed += 1
+    return out, reparsed
+
+
+def reparse_standard_games(games: list[GeoguessrStandardGame]) -> None:
+    """
+    Re-derive the rounds of stored standard games, in place, from the payload each one keeps in `raw`.
+
+    Guess countries are resolved in one batch for all of them.
+    """
+    for game in games:
+        game.rounds = GeoguessrStandardGame.rounds_from_raw(game.raw)
+    resolve_guess_countries(games)
@@ -0,0 +1,260 @@
+# Columnar table of duel rounds, for vectorized per-country filters and aggregates with NumPy
+#
+# analyse groups and filters rounds by country. Over a long history, decoding every game into
+# GeoguessrDuelGame objects and walking their rounds dominates the run time. The SQLite index (see
+# geoguessr/sqlite_store.py) keeps the fields analyse needs per round, so a RoundTable of a selection
+# is read from it as plain columns, one array per field, without decoding any game; filters are then
+# boolean masks and per-country aggregates bincounts. Importing NumPy costs more than that saves on
+# small selections, so tables are only built from VECTORIZE_MIN_ROUNDS rounds up.
+#
+#   python -m benchmarks.round_table_benchmark --rounds 200000
+
+from geoguessr.countries import CountryStats, country_code_to_name
+from geoguessr.game import GameMode, GameType, GeoguessrDuelGame, GeoguessrDuelRound
+
+# Below this many rounds decoding the games and looping over them is faster than importing NumPy.
+VECTORIZE_MIN_ROUNDS = 20_000
+
+UNKNOWN_COUNTRY = "??"
+
+MODES = list(GameMode)
+GAME_TYPES = list(GameType)
+
+# Columns and their NumPy dtypes, in the order RoundTable() expects the fields of its rows.
+COLUMNS = [
+    ("game", "int32"),
+    ("round_number", "int16"),
+    ("country", "int32"),
+    ("damage_dealt", "float64"),
+    ("damage_taken", "float64"),
+    ("team_multiplier", "float64"),
+    ("opponent_multiplier", "float64"),
+    ("time_secs", "float64"),
+    ("distance_meters", "float64"),
+    ("guessed_first", "bool"),
+    ("game_time", "float64"),
+    ("mode", "int8"),
+    ("game_type", "int8"),
+    ("two_guesses", "bool"),
+    ("all_guessed_correct", "bool"),
+    ("player_guess", "int32"),
+    ("multipliers_missing", "bool"),
+]
+
+
+def numpy_available() -> bool:
+    """Whether NumPy is installed, without importing it."""
+    import importlib.util
+
+    return importlib.util.find_spec("numpy") is not None
+
+
+def multiplier_safe(value: object) -> float:
+    """A multiplier as a positive float; 1.0 where it is missing or invalid."""
+    try:
+        f = float(value)  # type: ignore[arg-type]
+    except Exception:
+        return 1.0
+    return f if f > 0 else 1.0
+
+
+def round_flags(duel_round: GeoguessrDuelRound, player_id: str) -> tuple[bool, bool, str, bool]:
+    """
+    Return, for one duel round:
+    - whether at least two guesses have a usable lat/lng,
+    - whether at least two players guessed a country and all of them the panorama country,
+    - the (upper-case) country the player guessed, "" if unknown,
+    - whether the multiplier fields look like defaults from files written before they were stored.
+    """
+    guess_locations = duel_round.guess_locations if isinstance(duel_round.guess_locations, dict) else {}
+    valid = 0
+    guessed_ccs = []
+    player_guess = ""
+    for key, info in guess_locations.items():
+        if not isinstance(info, dict):
+            continue
+        try:
+            float(info.get("lat"))
+            float(info.get("lng"))
+            valid += 1
+        except Exception:
+            pass
+        g_cc = (info.get("country_code") or "").upper()
+        if g_cc:
+            guessed_ccs.append(g_cc)
+            if player_id and key == player_id:
+                player_guess = g_cc
+    correct_cc = (duel_round.country_code or "").upper()
+    all_correct = (
+        bool(correct_cc)
+        and correct_cc != UNKNOWN_COUNTRY
+        and len(guessed_ccs) >= 2
+        and all(g == correct_cc for g in guessed_ccs)
+    )
+    try:
+        team_multi = float(duel_round.team_multiplier or 1.0)
+        opp_multi = float(duel_round.opponent_multiplier or 1.0)
+    except Exception:
+        team_multi = 1.0
+        opp_multi = 1.0
+    multipliers_missing = (
+        team_multi == 1.0
+        and opp_multi == 1.0
+        and not duel_round.team_active_multiplier
+        and not duel_round.opponent_active_multiplier
+    )
+    return valid >= 2, all_correct, player_guess, multipliers_missing
+
+
+class RoundTable:
+    """
+    The rounds of a selection of duels, one NumPy array per field (see COLUMNS), in game order then
+    round order. `game_count` is the number of games selected, including games without rounds.
+
+    Countries are stored as indexes into `countries` (upper-case codes, "??" for rounds without one).
+    `game` is the position of the round's game in the selection, `round_number` is 1-based, the
+    multipliers are 1.0 where missing or invalid, `game_time` is in seconds since the epoch (-inf if
+    unknown), `mode` and `game_type` index MODES and GAME_TYPES, and `player_guess` is -1 when the
+    player's guessed country is unknown. The remaining flags are those of round_flags().
+    """
+
+    def __init__(self, rows: list[tuple], game_count: int) -> None:
+        """Build the table from rows in COLUMNS order, with country codes as strings ("" for none)."""
+        import numpy as np
+
+        self.game_count = game_count
+        self.countries: list[str] = []
+        self._country_index: dict[str, int] = {}
+        country = COLUMNS.index(("country", "int32"))
+        player_guess = COLUMNS.index(("player_guess", "int32"))
+        columns = [list(values) for values in zip(*rows)] if rows else [[] for _ in COLUMNS]
+        columns[country] = [self._country(cc or UNKNOWN_COUNTRY) for cc in columns[country]]
+        columns[player_guess] = [self._country(cc) if cc else -1 for cc in columns[player_guess]]
+        for (name, dtype), values in zip(COLUMNS, columns):
+            setattr(self, name, np.array(values, dtype=dtype))
+
+    @classmethod
+    def from_games(cls, games: list[GeoguessrDuelGame]) -> "RoundTable":
+        """Build the table from decoded games."""
+        modes = {mode: i for i, mode in enumerate(MODES)}
+        game_types = {game_type: i for i, game_type in enumerate(GAME_TYPES)}
+        rows = []
+        for game_index, game in enumerate(games):
+            player_id = getattr(game, "player_id", "") or ""
+            game_time = game.timestamp()
+            mode = modes.get(game.mode, -1)
+            game_type = game_types.get(game.game_type, -1)
+            for round_number, duel_round in enumerate(game.rounds, start=1):
+                two_guesses, all_correct, player_guess, multipliers_missing = round_flags(duel_round, player_id)
+                rows.append((
+                    game_index,
+                    round_number,
+                    (duel_round.country_code or "").upper(),
+                    float(duel_round.damage_dealt or 0),
+                    float(duel_round.damage_taken or 0),
+                    multiplier_safe(duel_round.team_multiplier),
+                    multiplier_safe(duel_round.opponent_multiplier),
+                    float(duel_round.time_secs or 0),
+                    float(duel_round.distance_meters or 0),
+                    bool(duel_round.guessed_first),
+                    game_time,
+                    mode,
+                    game_type,
+                    two_guesses,
+                    all_correct,
+                    player_guess,
+                    multipliers_missing,
+                ))
+        return cls(rows, len(games))
+
+    def _country(self, cc: str) -> int:
+        index = self._country_index.get(cc)
+        if index is None:
+            index = self._country_index[cc] = len(self.countries)
+            self.countries.append(cc)
+        return index
+
+    def __len__(self) -> int:
+        return len(self.country)
+
+    def country_mask(self, cc: str):
+        """Rows whose panorama country is `cc` (upper-case; "??" for rounds without one)."""
+        index = self._country_index.get(cc)
+        return self.country == (index if index is not None else -1)
+
+    def net_damage(self):
+        """Net damage per round, normalized by the multipliers: taken / opponent_multi - dealt / team_multi."""
+        return self.damage_taken / self.opponent_multiplier - self.damage_dealt / self.team_multiplier
+
+    def _first_seen(self, countries) -> list[int]:
+        """The distinct values of `countries` in order of first appearance (the order a dict grouping gives)."""
+        import numpy as np
+
+        unique, first = np.unique(countries, return_index=True)
+        return unique[np.argsort(first, kind="stable")].tolist()
+
+    def _sum_by_country(self, values, mask):
+        import numpy as np
+
+        return np.bincount(self.country[mask], weights=values[mask], minlength=len(self.countries))
+
+    def country_stats(self, mask=None) -> list[CountryStats]:
+        """CountryStats.from_rounds for each country of the selected rows, in order of first appearance."""
+        import numpy as np
+
+        if mask is None:
+            mask = np.ones(len(self), dtype=bool)
+        countries = self.country[mask]
+        total = np.bincount(countries, minlength=len(self.countries))
+        won = np.bincount(countries, weights=self.damage_dealt[mask] > 0, minlength=len(self.countries))
+        first = np.bincount(countries, weights=self.guessed_first[mask], minlength=len(self.countries))
+        dealt = self._sum_by_country(self.damage_dealt, mask)
+        taken = self._sum_by_country(self.damage_taken, mask)
+        distance = self._sum_by_country(self.distance_meters, mask)
+        time_all = self._sum_by_country(self.time_secs, mask)
+        time_first = self._sum_by_country(self.time_secs, mask & self.guessed_first)
+
+        stats = []
+        for i in self._first_seen(countries):
+            n, n_first = int(total[i]), int(first[i])
+            rounds_won = int(won[i])
+            stats.append(CountryStats(
+                country_code=self.countries[i],
+                name=country_code_to_name(self.countries[i]),
+                total_rounds=n,
+                rounds_won=rounds_won,
+                win_percentage=(rounds_won * 100) // n,
+                rounds_guessed_first=n_first,
+                total_damage_dealt=int(dealt[i]),
+                total_damage_taken=int(taken[i]),
+                mean_distance=int(distance[i]) // n,
+                mean_time=int(time_all[i]) // n,
+                mean_time_guessed_first=int(time_first[i]) // n_first if n_first else 0,
+                mean_time_guessed_second=int(time_all[i] - time_first[i]) // (n - n_first) if n - n_first else 0,
+            ))
+        return stats
+
+    def mean_by_country(self, values, mask=None) -> dict[str, float]:
+        """Mean of `values` (one per row) over the selected rows of each country, in order of first appearance."""
+        import numpy as np
+
+        if mask is None:
+            mask = np.ones(len(self), dtype=bool)
+        totals = self._sum_by_country(values, mask)
+        counts = np.bincount(self.country[mask], minlength=len(self.countries))
+        return {self.countries[i]: float(totals[i]) / int(counts[i]) for i in self._first_seen(self.country[mask])}
+
+    def wrong_country_counts(self, mask=None) -> dict[str, tuple[int, int]]:
+        """
+        {country: (rounds where the player guessed another country, rounds with a known player guess)}
+        over the selected rows, for panorama countries other than "??", in order of first appearance.
+        """
+        import numpy as np
+
+        if mask is None:
+            mask = np.ones(len(self), dtype=bool)
+        mask = mask & (self.player_guess >= 0) & ~self.country_mask(UNKNOWN_COUNTRY)
+        countries = self.country[mask]
+        total = np.bincount(countries, minlength=len(self.countries))
+        wrong = np.bincount(countries, weights=self.player_guess[mask] != countries, minlength=len(self.countries))
+        return {self.countries[i]: (int(wrong[i]), int(total[i])) for i in self._first_seen(countries)}
@@ -0,0 +1,405 @@
+# Optional SQLite index of stored duels, so filtered queries don't parse a user's whole history
+#
+# The .jsonl files stay the source of truth. `python -m geoguessr index <username>` creates
+# output/games.sqlite; from then on PlayerData.select_duel_games() answers `--include`, `--mode`,
+# `--max-days`, `--max-games` and country filters with indexed queries, and only the selected games
+# are decoded. Before each query the index is brought up to date with the files: lines appended by a
+# fetch are imported on their own, a file that was rewritten (reparse, `fetch --older`, ...) is
+# imported again in full. Deleting the database switches back to reading the files.
+# Only duels are indexed; standard games and daily challenges are always read from their files.
+
+import json
+import os
+import sqlite3
+import time
+from typing import Optional
+
+from geoguessr.game import GameMode, GeoguessrDuelGame, parse_timestamp
+from geoguessr.round_table import GAME_TYPES, MODES, UNKNOWN_COUNTRY, RoundTable, multiplier_safe, round_flags
+from geoguessr.storage import OUTPUT_DIR, duel_games_path, legacy_path, read_games, team_duel_paths
+
+SQLITE_FILE = os.path.join(OUTPUT_DIR, "games.sqlite")
+
+# Bumped whenever the tables change; an index built with another version is rebuilt from the files.
+SCHEMA_VERSION = 2
+
+# Bytes kept from the start and the end of the imported part of each file. An append is only trusted
+# when they are still there, which tells a file that grew apart from one that was rewritten in place.
+_FINGERPRINT_BYTES = 256
+
+_SCHEMA = """
+CREATE TABLE sources (
+    username TEXT NOT NULL,
+    category TEXT NOT NULL,
+    path TEXT NOT NULL,
+    inode INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    imported_bytes INTEGER NOT NULL,
+    head BLOB NOT NULL,
+    tail BLOB NOT NULL,
+    next_seq INTEGER NOT NULL,
+    PRIMARY KEY (username, category)
+);
+CREATE TABLE games (
+    id INTEGER PRIMARY KEY,
+    username TEXT NOT NULL,
+    category TEXT NOT NULL,
+    teammate TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    game_id TEXT NOT NULL,
+    game_type TEXT NOT NULL,
+    mode TEXT NOT NULL,
+    ts REAL,
+    record TEXT NOT NULL
+);
+CREATE INDEX games_by_time ON games (username, category, ts);
+CREATE INDEX games_by_mode ON games (username, category, mode, ts);
+CREATE INDEX games_by_teammate ON games (username, teammate, ts);
+CREATE INDEX games_by_type ON games (username, game_type, ts);
+CREATE TABLE rounds (
+    game INTEGER NOT NULL,
+    round_number INTEGER NOT NULL,
+    country_code TEXT NOT NULL,
+    start_ts REAL,
+    score INTEGER,
+    distance_meters REAL NOT NULL,
+    time_secs REAL NOT NULL,
+    damage_dealt REAL NOT NULL,
+    damage_taken REAL NOT NULL,
+    team_multiplier REAL NOT NULL,
+    opponent_multiplier REAL NOT NULL,
+    guessed_first INTEGER NOT NULL,
+    two_guesses INTEGER NOT NULL,
+    all_guessed_correct INTEGER NOT NULL,
+    player_guess TEXT NOT NULL,
+    multipliers_missing INTEGER NOT NULL,
+    PRIMARY KEY (game, round_number)
+) WITHOUT ROWID;
+CREATE INDEX rounds_by_country ON rounds (country_code, game);
+CREATE TABLE guesses (
+    game INTEGER NOT NULL,
+    round_number INTEGER NOT NULL,
+    player_id TEXT NOT NULL,
+    lat REAL,
+    lng REAL,
+    country_code TEXT,
+    PRIMARY KEY (game, round_number, player_id)
+) WITHOUT ROWID;
+CREATE INDEX guesses_by_country ON guesses (country_code);
+"""
+
+
+def _or_null(ts: float) -> Optional[float]:
+    return ts if ts != float("-inf") else None
+
+
+class SqliteGameStore:
+    """
+    Indexed copy of a user's duel files: one row per game (the stored record, plus its time, type, mode
+    and teammate), per round (panorama country and the fields of a RoundTable) and per guess (guessed
+    country).
+
+    Use as a context manager, or call close().
+    """
+
+    def __init__(self, path: str = SQLITE_FILE, output_dir: str = OUTPUT_DIR) -> None:
+        self.path = path
+        self.output_dir = output_dir
+        # Autocommit mode: transactions are opened explicitly, so that two processes syncing the same
+        # file take turns instead of importing it twice.
+        self._db = sqlite3.connect(path, timeout=30.0, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._create_schema()
+
+    def __enter__(self) -> "SqliteGameStore":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._db.close()
+
+    def _create_schema(self) -> None:
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            version = self._db.execute("PRAGMA user_version").fetchone()[0]
+            if version != SCHEMA_VERSION:
+                for table in ("sources", "games", "rounds", "guesses"):
+                    self._db.execute(f"DROP TABLE IF EXISTS {table}")
+                for statement in _SCHEMA.split(";"):
+                    if statement.strip():
+                        self._db.execute(statement)
+                self._db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            self._db.execute("COMMIT")
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+
+    def sync(self, username: str, categories: Optional[list[str]] = None) -> int:
+        """
+        Bring the index of a user's duel categories up to date with their files (all of them by default).
+
+        Returns the number of games imported.
+        """
+        if categories is None:
+            categories = ["ranked", "unranked", "party"]
+            categories.extend(f"team:{teammate}" for teammate in team_duel_paths(username, self.output_dir))
+            known = self._db.execute("SELECT category FROM sources WHERE username = ?", (username,)).fetchall()
+            categories.extend(category for (category,) in known if category not in categories)
+        imported = 0
+        for category in categories:
+            imported += self._sync_category(username, category)
+        return imported
+
+    def _sync_category(self, username: str, category: str) -> int:
+        path = duel_games_path(username, category, self.output_dir)
+        source_path = path if os.path.exists(path) else legacy_path(path)
+        try:
+            st = os.stat(source_path)
+        except FileNotFoundError:
+            st = None
+        row = self._source(username, category)
+        if st is None and row is None:
+            return 0
+        if st is not None and row is not None and row[:4] == (source_path, st.st_ino, st.st_size, st.st_mtime_ns):
+            return 0
+
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            # Another process may have synced the file while we waited for the lock.
+            row = self._source(username, category)
+            if st is not None and row is not None and row[:4] == (source_path, st.st_ino, st.st_size, st.st_mtime_ns):
+                self._db.execute("COMMIT")
+                return 0
+            if st is None:
+                self._drop(username, category)
+                imported = 0
+            elif source_path == path:
+                imported = self._import_lines(username, category, path, st, row)
+            else:
+                imported = self._import_legacy(username, category, path, source_path, st)
+            self._db.execute("COMMIT")
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        return imported
+
+    def _source(self, username: str, category: str) -> Optional[tuple]:
+        return self._db.execute(
+            "SELECT path, inode, size, mtime_ns, imported_bytes, head, tail, next_seq FROM sources "
+            "WHERE username = ? AND category = ?",
+            (username, category),
+        ).fetchone()
+
+    def _drop(self, username: str, category: str) -> None:
+        game_ids = "SELECT id FROM games WHERE username = ? AND category = ?"
+        self._db.execute(f"DELETE FROM guesses WHERE game IN ({game_ids})", (username, category))
+        self._db.execute(f"DELETE FROM rounds WHERE game IN ({game_ids})", (username, category))
+        self._db.execute("DELETE FROM games WHERE username = ? AND category = ?", (username, category))
+        self._db.execute("DELETE FROM sources WHERE username = ? AND category = ?", (username, category))
+
+    def _import_lines(self, username: str, category: str, path: str, st: os.stat_result, row: Optional[tuple]) -> int:
+        """Import the complete lines of a .jsonl file: only those after the imported part if it just grew."""
+        with open(path, "rb") as f:
+            start, seq = 0, 0
+            if row is not None and row[0] == path and row[1] == st.st_ino and st.st_size >= row[4]:
+                imported_bytes, head, tail = row[4], row[5], row[6]
+                if f.read(len(head)) == head:
+                    f.seek(imported_bytes - len(tail))
+                    if f.read(len(tail)) == tail:
+                        start, seq = imported_bytes, row[7]
+            if start == 0:
+                self._drop(username, category)
+            f.seek(start)
+            data = f.read()
+            complete = data[: data.rfind(b"\n") + 1]
+            end = start + len(complete)
+            f.seek(0)
+            head = f.read(min(_FINGERPRINT_BYTES, end))
+            f.seek(max(0, end - _FINGERPRINT_BYTES))
+            tail = f.read(end - max(0, end - _FINGERPRINT_BYTES))
+
+        records = []
+        for line in complete.split(b"\n"):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(record, dict):
+                records.append((line.decode("utf-8"), record))
+        next_seq = self._insert(username, category, records, seq)
+        self._save_source(username, category, path, st, end, head, tail, next_seq)
+        return len(records)
+
+    def _import_legacy(self, username: str, category: str, path: str, source_path: str, st: os.stat_result) -> int:
+        """Import a legacy .json file (a list, newest game first), which read_games() reads in place of `path`."""
+        self._drop(username, category)
+        records = [(json.dumps(record), record) for record in reversed(read_games(path))]
+        next_seq = self._insert(username, category, records, 0)
+        self._save_source(username, category, source_path, st, st.st_size, b"", b"", next_seq)
+        return len(records)
+
+    def _save_source(self, username, category, path, st, imported_bytes, head, tail, next_seq) -> None:
+        self._db.execute(
+            "INSERT OR REPLACE INTO sources VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (username, category, path, st.st_ino, st.st_size, st.st_mtime_ns, imported_bytes, head, tail, next_seq),
+        )
+
+    def _insert(self, username: str, category: str, records: list[tuple[str, dict]], seq: int) -> int:
+        """Insert (line, record) pairs, oldest first, numbering them from `seq`; returns the next number."""
+        teammate = category.split(":", 1)[1] if category.startswith("team:") else ""
+        rounds = []
+        guesses = []
+        for line, record in records:
+            game = GeoguessrDuelGame.from_json(record)
+            cursor = self._db.execute(
+                "INSERT INTO games (username, category, teammate, seq, game_id, game_type, mode, ts, record) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (username, category, teammate, seq, game.game_id or "", game.game_type.value, game.mode.value,
+                 _or_null(game.timestamp()), line),
+            )
+            seq += 1
+            game_player_id = getattr(game, "player_id", "") or ""
+            for round_number, duel_round in enumerate(game.rounds, start=1):
+                two_guesses, all_correct, player_guess, multipliers_missing = round_flags(duel_round, game_player_id)
+                rounds.append((
+                    cursor.lastrowid,
+                    round_number,
+                    (duel_round.country_code or "").upper() or UNKNOWN_COUNTRY,
+                    _or_null(parse_timestamp(duel_round.start_time or "")),
+                    duel_round.score,
+                    float(duel_round.distance_meters or 0),
+                    float(duel_round.time_secs or 0),
+                    float(duel_round.damage_dealt or 0),
+                    float(duel_round.damage_taken or 0),
+                    multiplier_safe(duel_round.team_multiplier),
+                    multiplier_safe(duel_round.opponent_multiplier),
+                    bool(duel_round.guessed_first),
+                    two_guesses,
+                    all_correct,
+                    player_guess,
+                    multipliers_missing,
+                ))
+                for player_id, location in duel_round.guess_locations.items():
+                    if not isinstance(location, dict):
+                        continue
+                    cc = location.get("country_code")
+                    guesses.append((
+                        cursor.lastrowid,
+                        round_number,
+                        str(player_id),
+                        location.get("lat"),
+                        location.get("lng"),
+                        cc.upper() if isinstance(cc, str) else None,
+                    ))
+        self._db.executemany(f"INSERT OR REPLACE INTO rounds VALUES ({', '.join('?' * 16)})", rounds)
+        self._db.executemany("INSERT OR REPLACE INTO guesses VALUES (?, ?, ?, ?, ?, ?)", guesses)
+        return seq
+
+    def _selection(
+        self,
+        columns: str,
+        username: str,
+        categories: list[str],
+        mode: Optional[GameMode],
+        max_days: Optional[float],
+        max_games: Optional[int],
+        country: Optional[str],
+    ) -> tuple[str, dict]:
+        """The query selecting `columns` of the games PlayerData.select_duel_games() returns, in its order."""
+        params: dict = {"username": username}
+        names = []
+        for rank, category in enumerate(categories):
+            params[f"category{rank}"] = category
+            names.append(f":category{rank}")
+        category_rank = "CASE category " + " ".join(f"WHEN {name} THEN {rank}" for rank, name in enumerate(names)) + " END"
+        where = ["username = :username", f"category IN ({', '.join(names)})"]
+        if mode is not None:
+            where.append("mode = :mode")
+            params["mode"] = mode.value
+        if max_days is not None:
+            where.append("ts >= :cutoff")
+            params["cutoff"] = time.time() - float(max_days) * 86400.0
+        if max_games is not None:
+            # The most recent games first (games without a time last), then the order of the files.
+            order = f"ts DESC, {category_rank}, seq DESC"
+            where = [f"id IN (SELECT id FROM games WHERE {' AND '.join(where)} ORDER BY {order} LIMIT :max_games)"]
+            params["max_games"] = max_games
+        else:
+            order = f"{category_rank}, seq DESC"
+        if country:
+            where.append("id IN (SELECT game FROM rounds WHERE country_code = :country)")
+            params["country"] = country.upper()
+        return f"SELECT {columns} FROM games WHERE {' AND '.join(where)} ORDER BY {order}", params
+
+    def select_duel_games(
+        self,
+        username: str,
+        categories: list[str],
+        mode: Optional[GameMode] = None,
+        max_days: Optional[float] = None,
+        max_games: Optional[int] = None,
+        country: Optional[str] = None,
+    ) -> list[tuple[str, GeoguessrDuelGame]]:
+        """The SQL version of PlayerData.select_duel_games (see there); syncs the categories first."""
+        self.sync(username, categories)
+        query, params = self._selection("category, record", username, categories, mode, max_days, max_games, country)
+        return [
+            (category, GeoguessrDuelGame.from_json(json.loads(record)))
+            for category, record in self._db.execute(query, params)
+        ]
+
+    def round_table(
+        self,
+        username: str,
+        categories: list[str],
+        mode: Optional[GameMode] = None,
+        max_days: Optional[float] = None,
+        max_games: Optional[int] = None,
+        min_rounds: int = 0,
+    ) -> Optional[RoundTable]:
+        """
+        The rounds of the games select_duel_games() would return, read from the round columns as a
+        RoundTable without decoding the games. Returns None when there are fewer than `min_rounds`.
+        """
+        self.sync(username, categories)
+        query, params = self._selection("id", username, categories, mode, max_days, max_games, None)
+        modes = " ".join(f"WHEN '{m.value}' THEN {i}" for i, m in enumerate(MODES))
+        game_types = " ".join(f"WHEN '{t.value}' THEN {i}" for i, t in enumerate(GAME_TYPES))
+        # One read transaction, so the games picked and their rounds come from the same state.
+        self._db.execute("BEGIN")
+        try:
+            self._db.execute("CREATE TEMP TABLE IF NOT EXISTS picked (position INTEGER PRIMARY KEY, game INTEGER NOT NULL)")
+            self._db.execute("DELETE FROM temp.picked")
+            self._db.execute(f"INSERT INTO temp.picked (game) {query}", params)
+            game_count = self._db.execute("SELECT count(*) FROM temp.picked").fetchone()[0]
+            round_count = self._db.execute(
+                "SELECT count(*) FROM temp.picked p JOIN rounds r ON r.game = p.game"
+            ).fetchone()[0]
+            rows = None
+            if round_count >= min_rounds:
+                rows = self._db.execute(
+                    "SELECT p.position - 1, r.round_number, r.country_code, r.damage_dealt, r.damage_taken, "
+                    "r.team_multiplier, r.opponent_multiplier, r.time_secs, r.distance_meters, r.guessed_first, "
+                    f"IFNULL(g.ts, -9e999), CASE g.mode {modes} ELSE -1 END, CASE g.game_type {game_types} ELSE -1 END, "
+                    "r.two_guesses, r.all_guessed_correct, r.player_guess, r.multipliers_missing "
+                    "FROM temp.picked p JOIN games g ON g.id = p.game JOIN rounds r ON r.game = p.game "
+                    "ORDER BY p.position, r.round_number"
+                ).fetchall()
+            self._db.execute("COMMIT")
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        return RoundTable(rows, game_count) if rows is not None else None
+
+
+def open_game_store(path: str = SQLITE_FILE) -> Optional[SqliteGameStore]:
+    """Return the SQLite game store if one was created with `python -m geoguessr index`, else None."""
+    if not os.path.exists(path):
+        return None
+    return SqliteGameStore(path, output_dir=os.path.dirname(path) or ".")
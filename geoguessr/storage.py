@@ -0,0 +1,153 @@
+# Append-only storage of a user's games, one JSON record per line
+
+import json
+import os
+import re
+import tempfile
+from enum import Enum
+from typing import Optional
+
+OUTPUT_DIR = "output"
+
+GAMES_SUFFIX = ".jsonl"
+# Files written before games were stored line by line: one indented JSON list, newest game first.
+LEGACY_GAMES_SUFFIX = ".json"
+
+TEAM_DUELS_NAME = "ranked_team_duels"
+
+# File names of the duel categories selected by `--include` (ranked | unranked | party | team:<teammate>).
+DUEL_GAMES_NAMES = {"ranked": "ranked_duels", "unranked": "unranked_duels", "party": "party_games"}
+
+
+def _to_json(obj):
+    if isinstance(obj, Enum):
+        return obj.value
+    return obj.__dict__
+
+
+def games_path(username: str, name: str, output_dir: str = OUTPUT_DIR) -> str:
+    """Path of a user's game file, e.g. output/<username>_ranked_duels.jsonl."""
+    return os.path.join(output_dir, f"{username}_{name}{GAMES_SUFFIX}")
+
+
+def duel_games_path(username: str, category: str, output_dir: str = OUTPUT_DIR) -> str:
+    """Path of the file holding a duel category: "ranked", "unranked", "party" or "team:<teammate>"."""
+    if category.startswith("team:"):
+        return games_path(username, f"{category.split(':', 1)[1]}_{TEAM_DUELS_NAME}", output_dir)
+    return games_path(username, DUEL_GAMES_NAMES[category], output_dir)
+
+
+def legacy_path(path: str) -> str:
+    """Path of the .json file that held a game file's records before the .jsonl format."""
+    return path[: -len(GAMES_SUFFIX)] + LEGACY_GAMES_SUFFIX
+
+
+def team_duel_paths(username: str, output_dir: str = OUTPUT_DIR) -> dict[str, str]:
+    """Return {teammate: path} for every stored team duel file of a user, in either format."""
+    pattern = re.compile(
+        rf"^{re.escape(username)}_(?P<teammate>.+)_{TEAM_DUELS_NAME}(?P<suffix>{re.escape(GAMES_SUFFIX)}|{re.escape(LEGACY_GAMES_SUFFIX)})$"
+    )
+    try:
+        filenames = sorted(os.listdir(output_dir))
+    except FileNotFoundError:
+        return {}
+    paths = {}
+    for filename in filenames:
+        match = pattern.match(filename)
+        if match and match.group("teammate").strip():
+            paths[match.group("teammate")] = games_path(username, f"{match.group('teammate')}_{TEAM_DUELS_NAME}", output_dir)
+    return paths
+
+
+def read_games(path: str) -> list[dict]:
+    """
+    Return the records stored at `path`, newest first; [] if there are none.
+
+    Reads the legacy .json file in its place until the user's games have been saved once in the new format.
+    A record cut short by a crash in the middle of an append is ignored.
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            lines = f.read().split("\n")
+    except FileNotFoundError:
+        try:
+            with open(legacy_path(path), "r", encoding="utf-8") as f:
+                raw = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return []
+        return [item for item in raw if isinstance(item, dict)] if isinstance(raw, list) else []
+    records = []
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        if isinstance(record, dict):
+            records.append(record)
+    records.reverse()
+    return records
+
+
+def _complete_records(path: str) -> Optional[int]:
+    """Return how many complete lines the file holds, dropping a partial last line; None if it doesn't exist."""
+    try:
+        f = open(path, "rb+")
+    except FileNotFoundError:
+        return None
+    with f:
+        data = f.read()
+        if data and not data.endswith(b"\n"):
+            f.truncate(data.rfind(b"\n") + 1)
+        return data.count(b"\n")
+
+
+def write_games(path: str, games: list) -> None:
+    """Replace the file with `games` (newest first), atomically, and remove any legacy .json file."""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            for game in reversed(games):
+                f.write(json.dumps(game, default=_to_json, separators=(",", ":")))
+                f.write("\n")
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    try:
+        os.remove(legacy_path(path))
+    except FileNotFoundError:
+        pass
+
+
+def save_games(path: str, games: list, stored: Optional[list] = None, changed: bool = False) -> int:
+    """
+    Save a user's games (newest first), appending to the file when possible.
+
+    `stored` is the list of records loaded from the file. When `games` ends with exactly those records (the
+    same objects, in the same order), none of them was `changed` in place and the file still holds that
+    many records, only the games in front of them are appended. Anything else, such as games moved to
+    another file, duplicates dropped, games added behind the stored ones (`fetch --older`) or a file still
+    in the legacy format, rewrites the whole file.
+
+    Returns the number of records appended, or -1 if the file was rewritten.
+    """
+    if stored is not None and not changed and len(games) >= len(stored):
+        new_count = len(games) - len(stored)
+        tail = games[new_count:]
+        if all(game is record for game, record in zip(tail, stored)) and _complete_records(path) == len(stored):
+            if new_count:
+                with open(path, "a", encoding="utf-8") as f:
+                    f.write("".join(
+                        json.dumps(game, default=_to_json, separators=(",", ":")) + "\n"
+                        for game in reversed(games[:new_count])
+                    ))
+            return new_count
+    write_games(path, games)
+    return -1
@@ -1,10 +1,12 @@
 import os
 import sys
-import json
 import argparse
+import threading
+import time
 
+from collections import OrderedDict
 from dataclasses import dataclass
-from typing import Optional
+from typing import Callable, Optional
 
 from geoguessr.game import (
     GeoguessrChallengeGame,
@@ -15,6 +17,114 @@ from geoguessr.game import (
     GameType,
 )
 from geoguessr.countries import CountryStats, country_code_to_name, name_to_country_code
+from geoguessr.geocode import geocode_cache, resolve_guess_countries
+from geoguessr.storage import duel_games_path, games_path, legacy_path, read_games, team_duel_paths
+
+
+def parse_include(include: Optional[str]) -> list[str]:
+    """
+    Return the duel categories an `--include` value selects: "ranked", "unranked", "party" or
+    "team:<teammate>"; "both" (the default) is ranked and unranked. Raises ValueError for anything else.
+    """
+    if isinstance(include, str) and include.startswith("team:"):
+        return [f"team:{include.split(':', 1)[1].strip()}"]
+    if include == "both" or not include:
+        return ["ranked", "unranked"]
+    if include in ("ranked", "unranked", "party"):
+        return [include]
+    raise ValueError(f"Unknown --include value: {include}")
+
+
+def _file_signature(path: str) -> Optional[tuple]:
+    """(path read, inode, size, mtime) of the file read_games() reads for `path`; None if there is none."""
+    for candidate in (path, legacy_path(path)):
+        try:
+            st = os.stat(candidate)
+        except FileNotFoundError:
+            continue
+        return candidate, st.st_ino, st.st_size, st.st_mtime_ns
+    return None
+
+
+# Most game files the shared GameCache keeps parsed; the least recently used one is dropped beyond that.
+GAME_CACHE_MAX_ENTRIES = 64
+
+
+class GameCache:
+    """
+    Parsed game files shared by every PlayerData of a long-running process (the web UI), where each
+    request would otherwise parse the same files again. An entry is reused while its file keeps the
+    same inode, size and mtime, so a fetch appending to or rewriting a file invalidates just that file.
+
+    The cached games are shared between requests and threads, so they are never changed once cached:
+    anything done to the games of a file (resolving the guess countries of legacy files) is done by the
+    load's `prepare` before the list is published, and callers copy the list before sorting or adding to it.
+    """
+
+    def __init__(self, max_entries: int = GAME_CACHE_MAX_ENTRIES) -> None:
+        self.max_entries = max(1, int(max_entries))
+        self._entries: OrderedDict[tuple[str, Callable], tuple[Optional[tuple], list]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._path_locks: dict[str, threading.Lock] = {}
+
+    def load(self, path: str, parse: Callable[[dict], object], prepare: Optional[Callable[[list], object]] = None) -> list:
+        """The records of `path` (see read_games()) parsed with `parse`, from the cache when still current."""
+        key = (path, parse)
+        with self._lock:
+            path_lock = self._path_locks.setdefault(path, threading.Lock())
+        # One thread parses a file while the others asking for it wait for the result.
+        with path_lock:
+            # Stat before reading: a write in between leaves an entry that is reloaded next time.
+            signature = _file_signature(path)
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and entry[0] == signature:
+                    self._entries.move_to_end(key)
+                    return entry[1]
+            games = [parse(item) for item in read_games(path)] if signature is not None else []
+            if prepare is not None and games:
+                prepare(games)
+            with self._lock:
+                self._entries[key] = (signature, games)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            return games
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+# Set by enable_game_cache(); None in the CLI, where each command reads its files once anyway.
+_game_cache: Optional[GameCache] = None
+
+
+def enable_game_cache() -> GameCache:
+    """Share parsed game files between the PlayerData instances of this process; returns the cache."""
+    global _game_cache
+    if _game_cache is None:
+        _game_cache = GameCache()
+    return _game_cache
+
+
+def load_games(path: str, parse: Callable[[dict], object], prepare: Optional[Callable[[list], object]] = None) -> list:
+    """
+    The records of a game file parsed with `parse`; through the shared GameCache when it is enabled.
+
+    `prepare` is only run for the cache, on a freshly parsed file: commands that read a file once leave
+    such work to the code that needs it.
+    """
+    if _game_cache is not None:
+        return _game_cache.load(path, parse, prepare)
+    return [parse(item) for item in read_games(path)]
+
+
+def _resolve_stored_guesses(games: list) -> None:
+    """Geocode the guesses of classic games read from files saved before rounds were stored."""
+    if resolve_guess_countries(games):
+        geocode_cache().save()
+
 
 @dataclass
 class RankedDuelsSummary:
@@ -87,20 +197,50 @@ class RankedDuelsSummary:
 
 class PlayerData:
     def __init__(self, username: str):
+        """
+        Stored games of a user. Each category's file is read and parsed the first time the category is
+        accessed and kept on the instance, so code that needs one category only pays for that one.
+        """
         self.username = username
-        self.daily_challenge_games: list[GeoguessrChallengeGame] = []
-        self.standard_games: list[GeoguessrStandardGame] = []
-        self.ranked_duel_games: list[GeoguessrDuelGame] = []
-        self.unranked_duel_games: list[GeoguessrDuelGame] = []
-        self.party_duel_games: list[GeoguessrDuelGame] = []
-        self.ranked_team_duel_games: dict[str, list[GeoguessrDuelGame]] = {}
-
-        self._get_daily_challenge_games()
-        self._get_standard_games()
-        self._get_ranked_duel_games()
-        self._get_unranked_duel_games()
-        self._get_party_duel_games()
-        self._get_ranked_team_duel_games()
+        self._games: dict[str, list] = {}
+        self._team_games: dict[str, list[GeoguessrDuelGame]] = {}
+
+    def _cached(self, name: str, load) -> list:
+        if name not in self._games:
+            self._games[name] = load()
+        return self._games[name]
+
+    @property
+    def daily_challenge_games(self) -> list[GeoguessrChallengeGame]:
+        return self._cached("daily_challenge", self._get_daily_challenge_games)
+
+    @property
+    def standard_games(self) -> list[GeoguessrStandardGame]:
+        return self._cached("standard_games", self._get_standard_games)
+
+    @property
+    def ranked_duel_games(self) -> list[GeoguessrDuelGame]:
+        return self._cached("ranked_duels", self._get_ranked_duel_games)
+
+    @property
+    def unranked_duel_games(self) -> list[GeoguessrDuelGame]:
+        return self._cached("unranked_duels", self._get_unranked_duel_games)
+
+    @property
+    def party_duel_games(self) -> list[GeoguessrDuelGame]:
+        return self._cached("party_games", self._get_party_duel_games)
+
+    @property
+    def ranked_team_duel_games(self) -> dict[str, list[GeoguessrDuelGame]]:
+        """{teammate: games} for every stored team duel file; reads the files not read yet."""
+        return {teammate: self.team_duel_games(teammate) for teammate in team_duel_paths(self.username)}
+
+    def team_duel_games(self, teammate: str) -> list[GeoguessrDuelGame]:
+        """The stored ranked team duels with one teammate, newest first; [] if there are none."""
+        if teammate not in self._team_games:
+            path = duel_games_path(self.username, f"team:{teammate}")
+            self._team_games[teammate] = load_games(path, GeoguessrDuelGame.from_json)
+        return self._team_games[teammate]
 
     def __str__(self):
         return "  \n".join([
@@ -113,98 +253,41 @@ class PlayerData:
             f"  Ranked Team Duel Games: {', '.join([f'{teammate}: {len(games)}' for teammate, games in self.ranked_team_duel_games.items()])}"
         ])
 
-    def _get_daily_challenge_games(self):
-        """
-        Read data from output/USERNAME_daily_challenge.json and populate daily_challenge_games
-        """
-        filepath = f"output/{self.username}_daily_challenge.json"
-        if not os.path.exists(filepath):
-            return
-        with open(filepath, 'r', encoding='utf-8') as f:
-            raw_data = json.load(f)
-        for item in raw_data:
-            game = GeoguessrChallengeGame(
-                game_type=item.get('game_type', GameType.DAILY_CHALLENGE),
-                time=item.get('time', ""),
-                challenge_token=item.get('challenge_token', ""),
-                points=item.get('points', 0)
-            )
-            self.daily_challenge_games.append(game)
-
-    def _get_standard_games(self):
-        """Read data from output/USERNAME_standard_games.json and populate standard_games."""
-        filepath = f"output/{self.username}_standard_games.json"
-        if not os.path.exists(filepath):
-            return
-        with open(filepath, "r", encoding="utf-8") as f:
-            raw_data = json.load(f)
-        for item in raw_data:
-            self.standard_games.append(
-                GeoguessrStandardGame(
-                    game_type=item.get("game_type", GameType.STANDARD),
-                    time=item.get("time", ""),
-                    game_token=item.get("game_token", ""),
-                    map=item.get("map", ""),
-                    map_name=item.get("map_name", ""),
-                    mode=item.get("mode", ""),
-                    state=item.get("state", ""),
-                    round_count=item.get("round_count", 0),
-                    raw=item.get("raw", {}) if isinstance(item.get("raw", {}), dict) else {},
-                )
-            )
-
-    def _get_ranked_duel_games(self):
+    @staticmethod
+    def _challenge_from_json(item: dict) -> GeoguessrChallengeGame:
+        return GeoguessrChallengeGame(
+            game_type=item.get('game_type', GameType.DAILY_CHALLENGE),
+            time=item.get('time', ""),
+            challenge_token=item.get('challenge_token', ""),
+            points=item.get('points', 0)
+        )
+
+    def _get_daily_challenge_games(self) -> list[GeoguessrChallengeGame]:
         """
-        Read data from output/USERNAME_ranked_duels.json and populate ranked_duel_games
+        Read data from output/USERNAME_daily_challenge.jsonl and return the daily challenge games
         """
-        filepath = f"output/{self.username}_ranked_duels.json"
-        if not os.path.exists(filepath):
-            return
-        with open(filepath, 'r', encoding='utf-8') as f:
-            raw_data = json.load(f)
-        for item in raw_data:
-            self.ranked_duel_games.append(GeoguessrDuelGame.from_json(item) )
-
-    def _get_unranked_duel_games(self):
+        return load_games(games_path(self.username, "daily_challenge"), self._challenge_from_json)
+
+    def _get_standard_games(self) -> list[GeoguessrStandardGame]:
+        """Read data from output/USERNAME_standard_games.jsonl and return the standard games."""
+        return load_games(games_path(self.username, "standard_games"), GeoguessrStandardGame.from_json, _resolve_stored_guesses)
+
+    def _get_ranked_duel_games(self) -> list[GeoguessrDuelGame]:
         """
-        Read data from output/USERNAME_unranked_duels.json and populate unranked_duel_games
+        Read data from output/USERNAME_ranked_duels.jsonl and return the ranked duel games
         """
-        filepath = f"output/{self.username}_unranked_duels.json"
-        if not os.path.exists(filepath):
-            return
-        with open(filepath, 'r', encoding='utf-8') as f:
-            raw_data = json.load(f)
-        for item in raw_data:
-            self.unranked_duel_games.append(GeoguessrDuelGame.from_json(item))
-
-    def _get_party_duel_games(self):
-        """Read data from output/USERNAME_party_games.json and populate party_duel_games."""
-        filepath = f"output/{self.username}_party_games.json"
-        if not os.path.exists(filepath):
-            return
-        with open(filepath, "r", encoding="utf-8") as f:
-            raw_data = json.load(f)
-        if not isinstance(raw_data, list):
-            return
-        for item in raw_data:
-            # Party games are stored as duel-game JSON.
-            self.party_duel_games.append(GeoguessrDuelGame.from_json(item))
-    
-    def _get_ranked_team_duel_games(self):
+        return load_games(games_path(self.username, "ranked_duels"), GeoguessrDuelGame.from_json)
+
+    def _get_unranked_duel_games(self) -> list[GeoguessrDuelGame]:
         """
-        Read data from output/USERNAME_TEAMMATE_ranked_team_duels.json and populate ranked_team_duel_games
+        Read data from output/USERNAME_unranked_duels.jsonl and return the unranked duel games
         """
-        dirpath = "output"
-        for filename in os.listdir(dirpath):
-            if filename.startswith(f"{self.username}_") and filename.endswith("_ranked_team_duels.json"):
-                teammate = filename[len(self.username)+1:-len("_ranked_team_duels.json")]
-                filepath = os.path.join(dirpath, filename)
-                with open(filepath, 'r', encoding='utf-8') as f:
-                    raw_data = json.load(f)
-                games = []
-                for item in raw_data:
-                    games.append(GeoguessrDuelGame.from_json(item))
-                self.ranked_team_duel_games[teammate] = games
+        return load_games(games_path(self.username, "unranked_duels"), GeoguessrDuelGame.from_json)
+
+    def _get_party_duel_games(self) -> list[GeoguessrDuelGame]:
+        """Read data from output/USERNAME_party_games.jsonl and return the party duel games."""
+        # Party games are stored as duel-game JSON.
+        return load_games(games_path(self.username, "party_games"), GeoguessrDuelGame.from_json)
 
     def last_challenge_seed(self) -> str:
         """
@@ -252,6 +335,140 @@ class PlayerData:
             return ""
         return self.unranked_duel_games[0].game_id
     
+    def known_game_ids(self) -> set[str]:
+        """
+        Return the ids/tokens of every stored game: daily challenge tokens, standard game tokens and the
+        game ids of all duels (ranked, unranked, party and team). Duel ids are pooled because a duel can
+        be stored under a different category than the feed reports it in.
+        """
+        ids = {game.challenge_token for game in self.daily_challenge_games}
+        ids.update(game.game_token for game in self.standard_games)
+        duel_lists = [self.ranked_duel_games, self.unranked_duel_games, self.party_duel_games]
+        duel_lists.extend(self.ranked_team_duel_games.values())
+        for games in duel_lists:
+            ids.update(game.game_id for game in games)
+        ids.discard("")
+        return ids
+
+    def oldest_challenge_seed(self) -> str:
+        """Return the challenge_token of the oldest stored daily challenge game, or empty string if none."""
+        if not self.daily_challenge_games:
+            return ""
+        return self.daily_challenge_games[-1].challenge_token
+
+    def oldest_standard_game_token(self) -> str:
+        """Return the token of the oldest stored standard game, or empty string if none."""
+        if not self.standard_games:
+            return ""
+        return self.standard_games[-1].game_token
+
+    def oldest_ranked_duel_id(self) -> str:
+        """Return the game_id of the oldest stored ranked duel game, or empty string if none."""
+        if not self.ranked_duel_games:
+            return ""
+        return self.ranked_duel_games[-1].game_id
+
+    def oldest_unranked_duel_id(self) -> str:
+        """Return the game_id of the oldest stored unranked duel game, or empty string if none."""
+        if not self.unranked_duel_games:
+            return ""
+        return self.unranked_duel_games[-1].game_id
+
+    def oldest_team_duel_id(self) -> str:
+        """Return the game_id of the oldest stored ranked team duel game across all teammates, or empty string if none."""
+        oldest_id = ""
+        oldest_time = None
+        for game_list in self.ranked_team_duel_games.values():
+            if game_list:
+                time = game_list[-1].start_time
+                if oldest_time is None or time < oldest_time:
+                    oldest_id = game_list[-1].game_id
+                    oldest_time = time
+        return oldest_id
+
+    def _category_duel_games(self, category: str) -> list[GeoguessrDuelGame]:
+        """The stored games of one duel category, newest first; only that category's file is read."""
+        if category.startswith("team:"):
+            return list(self.team_duel_games(category.split(":", 1)[1]))
+        return list(getattr(self, {
+            "ranked": "ranked_duel_games",
+            "unranked": "unranked_duel_games",
+            "party": "party_duel_games",
+        }[category]))
+
+    def select_duel_games(
+        self,
+        include: Optional[str] = None,
+        mode: Optional[GameMode] = None,
+        max_days: Optional[float] = None,
+        max_games: Optional[int] = None,
+        country: Optional[str] = None,
+    ) -> list[tuple[str, GeoguessrDuelGame]]:
+        """
+        Return (category, game) for the duels selected by the `--include`, `--mode`, `--max-days` and
+        `--max-games` options, and optionally only those with a round in `country` (an ISO2 code).
+
+        Without `max_games` the games come in file order, category by category; with it, the most recent
+        `max_games` games (before the country filter) come newest first. When an SQLite index was created
+        (see geoguessr/sqlite_store.py) the filters run as indexed queries and only the selected games are
+        decoded; otherwise the category files are read and filtered here. Raises ValueError for an
+        unknown `include`.
+        """
+        categories = parse_include(include)
+        from geoguessr.sqlite_store import open_game_store
+
+        store = open_game_store()
+        if store is not None:
+            with store:
+                return store.select_duel_games(self.username, categories, mode, max_days, max_games, country)
+
+        selected = [(category, game) for category in categories for game in self._category_duel_games(category)]
+        if mode is not None:
+            selected = [(category, game) for category, game in selected if game.mode == mode]
+        if max_days is not None:
+            cutoff = time.time() - float(max_days) * 86400.0
+            selected = [(category, game) for category, game in selected if game.timestamp() >= cutoff]
+        if max_games is not None:
+            # Ensure we always take the most recent games (especially for --include both).
+            selected = sorted(selected, key=lambda item: item[1].timestamp(), reverse=True)[:max_games]
+        if country:
+            country = country.upper()
+            selected = [
+                (category, game)
+                for category, game in selected
+                if any(((duel_round.country_code or "").upper() or "??") == country for duel_round in game.rounds)
+            ]
+        return selected
+
+    def duel_round_table(
+        self,
+        include: Optional[str] = None,
+        mode: Optional[GameMode] = None,
+        max_days: Optional[float] = None,
+        max_games: Optional[int] = None,
+    ):
+        """
+        Return the rounds of the duels select_duel_games() would return as a RoundTable (see
+        geoguessr/round_table.py), or None when a table would not pay off: without an SQLite index to read
+        it from, without NumPy, or for fewer than VECTORIZE_MIN_ROUNDS rounds. Raises ValueError for an
+        unknown `include`.
+
+        Only `analyse` uses the table, and only from the index: once the games are decoded, building a
+        table from them (RoundTable.from_games) costs more than the loops it replaces, so games read from
+        the files, and the per-round listing of `country`, stay on CountryStats.from_rounds.
+        """
+        categories = parse_include(include)
+        from geoguessr.round_table import VECTORIZE_MIN_ROUNDS, numpy_available
+        from geoguessr.sqlite_store import open_game_store
+
+        if not numpy_available():
+            return None
+        store = open_game_store()
+        if store is None:
+            return None
+        with store:
+            return store.round_table(self.username, categories, mode, max_days, max_games, VECTORIZE_MIN_ROUNDS)
+
     def get_country_rounds(self, teammate: Optional[str] = None, mode: Optional[GameMode] = None) -> dict[str, list[GeoguessrDuelRound]]:
         """
         Get a dictionary mapping country codes in uppercase to lists of duel rounds played in those countries.
@@ -260,7 +477,7 @@ class PlayerData:
         rounds_by_country: dict[str, list[GeoguessrDuelRound]] = {}
         duel_games = self.ranked_duel_games
         if teammate:
-            duel_games = self.ranked_team_duel_games.get(teammate, [])
+            duel_games = self.team_duel_games(teammate)
         if mode:
             duel_games = [game for game in duel_games if game.mode == mode]
         for game in duel_games:
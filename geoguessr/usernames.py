@@ -0,0 +1,162 @@
+# Persistent cache of GeoGuessr user id -> username lookups
+
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Optional
+
+USERNAME_MAP_FILE = "output/username_map.json"
+
+# Players can rename themselves, so cached names are looked up again once they are this old.
+USERNAME_TTL_SECS = 30 * 24 * 3600
+
+
+class UsernameCache:
+    """
+    Thread-safe map of user ids to usernames, persisted in output/username_map.json.
+
+    Each entry records when it was fetched: `{"<user id>": {"name": "<nick>", "fetched": <unix time>}}`.
+    Entries older than the TTL are reported as unresolved so they get refreshed, but their old name is
+    still returned if the refresh fails. Files in the older flat `{"<user id>": "<nick>"}` format are
+    read as if every entry had just been fetched, so upgrading does not trigger a mass refresh (except
+    for entries whose name is the id itself, which were failed lookups and are looked up again).
+
+    One cache shared by several fetches (as in fetch-all) looks each id up only once at a time:
+    `get_or_lookup` (or `begin_lookup`/`finish_lookup` from async code) makes a fetch that needs an id
+    another fetch is already resolving wait for that lookup instead of repeating it.
+    """
+
+    def __init__(self, path: str = USERNAME_MAP_FILE, ttl_secs: float = USERNAME_TTL_SECS) -> None:
+        self.path = path
+        self.ttl_secs = ttl_secs
+        self._entries: dict[str, dict] = {}
+        self._lock = threading.Lock()
+        # Lookups avoided because another caller was already resolving (or had just resolved) the same id.
+        self.shared = 0
+        self._in_flight: dict[str, Future] = {}
+        self.load()
+
+    def _read_file(self) -> dict[str, dict]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                raw = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+        if not isinstance(raw, dict):
+            return {}
+        now = time.time()
+        entries = {}
+        for user_id, value in raw.items():
+            if isinstance(value, str):
+                # The flat format stored the id itself when a lookup failed; leave those unresolved so they are retried.
+                if value and value != user_id:
+                    entries[user_id] = {"name": value, "fetched": now}
+            elif isinstance(value, dict) and value.get("name"):
+                entries[user_id] = {"name": str(value["name"]), "fetched": float(value.get("fetched", 0) or 0)}
+        return entries
+
+    def load(self) -> None:
+        """(Re)load the map from disk."""
+        entries = self._read_file()
+        with self._lock:
+            self._entries = entries
+
+    def get(self, user_id: str) -> Optional[str]:
+        """Return the cached username (fresh or stale), or None if the id was never resolved."""
+        with self._lock:
+            entry = self._entries.get(user_id)
+        return entry["name"] if entry else None
+
+    def unresolved(self, user_ids) -> list[str]:
+        """Return the unique ids, in first-seen order, that are missing or older than the TTL."""
+        cutoff = time.time() - self.ttl_secs
+        out = []
+        seen = set()
+        with self._lock:
+            for user_id in user_ids:
+                if not user_id or user_id in seen:
+                    continue
+                seen.add(user_id)
+                entry = self._entries.get(user_id)
+                if entry is None or entry["fetched"] < cutoff:
+                    out.append(user_id)
+        return out
+
+    def set(self, user_id: str, name: str) -> None:
+        with self._lock:
+            self._entries[user_id] = {"name": name, "fetched": time.time()}
+
+    def begin_lookup(self, user_id: str) -> Optional[Future]:
+        """
+        Claim the lookup of an id, or join one already under way.
+
+        Returns None when the caller now owns the lookup and must call `finish_lookup` with its result.
+        Otherwise returns a future of the name found by the other caller (already done if the id was
+        resolved since it was reported as unresolved).
+        """
+        cutoff = time.time() - self.ttl_secs
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry["fetched"] >= cutoff:
+                self.shared += 1
+                done = Future()
+                done.set_result(entry["name"])
+                return done
+            pending = self._in_flight.get(user_id)
+            if pending is not None:
+                self.shared += 1
+                return pending
+            self._in_flight[user_id] = Future()
+            return None
+
+    def finish_lookup(self, user_id: str, name: Optional[str]) -> None:
+        """Store the result of a lookup claimed with `begin_lookup` (None if it failed) and wake its waiters."""
+        with self._lock:
+            if name:
+                self._entries[user_id] = {"name": name, "fetched": time.time()}
+            pending = self._in_flight.pop(user_id, None)
+        if pending is not None:
+            pending.set_result(name)
+
+    def get_or_lookup(self, user_id: str, lookup: Callable[[], Optional[str]]) -> Optional[str]:
+        """Call `lookup()` to resolve the id and cache the name, unless another caller is already doing so."""
+        pending = self.begin_lookup(user_id)
+        if pending is not None:
+            return pending.result()
+        name = None
+        try:
+            name = lookup()
+            return name
+        finally:
+            self.finish_lookup(user_id, name)
+
+    def save(self) -> None:
+        """
+        Write the map to disk.
+
+        Entries written by another process since we loaded are merged in (the most recently fetched
+        entry wins), and the file is replaced atomically.
+        """
+        on_disk = self._read_file()
+        with self._lock:
+            for user_id, entry in on_disk.items():
+                current = self._entries.get(user_id)
+                if current is None or entry["fetched"] > current["fetched"]:
+                    self._entries[user_id] = entry
+            entries = dict(self._entries)
+        directory = os.path.dirname(self.path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(entries, f, indent=2)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
@@ -11,18 +11,16 @@ from typing import Any, Literal, Optional
 from urllib.parse import urlencode
 
 from fastapi import FastAPI, Form, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import HTMLResponse, JSONResponse
 from fastapi.templating import Jinja2Templates
 
-from geoguessr.__main__ import analyse_command, country_command, fetch_command
+from geoguessr.__main__ import analyse_command, country_command, fetch_command_async
 from geoguessr.game import GameMode
 from geoguessr.countries import country_code_to_name
-from geoguessr.user import PlayerData
+from geoguessr.storage import team_duel_paths
+from geoguessr.user import PlayerData, enable_game_cache, load_games, parse_include
 
-try:
-    import reverse_geocoder as _rg
-except Exception:  # pragma: no cover
-    _rg = None
 
 
 TEAM_DUEL_PARTNER_MIN_GAMES = int(os.getenv("GG_TEAM_DUEL_MIN_GAMES", "10"))
@@ -168,31 +166,6 @@ def _classic_country_rows(
     # country_code -> stats
     stats: dict[str, dict[str, float]] = {}
 
-    # Cache reverse geocodes to keep things snappy.
-    geo_cache: dict[tuple[float, float], str] = {}
-
-    def guess_cc(lat: object, lng: object) -> str:
-        if _rg is None:
-            return ""
-        try:
-            lat_f = float(lat)
-            lng_f = float(lng)
-        except Exception:
-            return ""
-        key = (round(lat_f, 5), round(lng_f, 5))
-        if key in geo_cache:
-            return geo_cache[key]
-        try:
-            res = _rg.search((lat_f, lng_f), mode=1)
-            cc = ""
-            if isinstance(res, list) and res and isinstance(res[0], dict):
-                cc = str(res[0].get("cc") or "").upper()
-            geo_cache[key] = cc
-            return cc
-        except Exception:
-            geo_cache[key] = ""
-            return ""
-
     for g in games:
         raw = getattr(g, "raw", {}) or {}
         if not isinstance(raw, dict):
@@ -209,34 +182,14 @@ def _classic_country_rows(
             if gn not in map_set:
                 continue
 
-        rounds = raw.get("rounds")
-        guesses = raw.get("guesses")
-        if not isinstance(guesses, list):
-            player = raw.get("player")
-            if isinstance(player, dict):
-                guesses = player.get("guesses")
-
-        if not isinstance(rounds, list) or not isinstance(guesses, list):
-            continue
-        n = min(len(rounds), len(guesses))
-        for i in range(n):
-            r = rounds[i]
-            gu = guesses[i]
-            if not isinstance(r, dict) or not isinstance(gu, dict):
-                continue
-
-            correct = str(r.get("streakLocationCode") or "").upper()
+        for r in getattr(g, "rounds", []) or []:
+            correct = r.country_code.upper()
             if not correct:
                 continue
 
-            g_cc = guess_cc(gu.get("lat"), gu.get("lng"))
+            g_cc = (r.guess_country_code or "").upper()
             is_correct = 1.0 if (g_cc and g_cc == correct) else 0.0
-
-            score = 0.0
-            try:
-                score = float(gu.get("roundScoreInPoints") or 0)
-            except Exception:
-                score = 0.0
+            score = float(r.score or 0)
 
             s = stats.setdefault(correct, {"rounds": 0.0, "correct": 0.0, "score": 0.0})
             s["rounds"] += 1.0
@@ -333,13 +286,8 @@ def _classic_country_options_for_user(
             gn = (raw.get("mapName") or getattr(g, "map_name", "") or "").strip()
             if gn not in map_set:
                 continue
-        rounds = raw.get("rounds")
-        if not isinstance(rounds, list):
-            continue
-        for r in rounds:
-            if not isinstance(r, dict):
-                continue
-            cc = str(r.get("streakLocationCode") or "").upper()
+        for r in getattr(g, "rounds", []) or []:
+            cc = r.country_code.upper()
             if cc:
                 ccs.add(cc)
 
@@ -399,8 +347,6 @@ def _classic_country_round_rows(
             return []
         games = games[:max_games]
 
-    geo_cache: dict[tuple[float, float], str] = {}
-
     def decode_pano_id(pano_id: str) -> str:
         """Decode stored pano_id.
 
@@ -434,28 +380,6 @@ def _classic_country_round_rows(
             return ""
         return f"https://www.google.com/maps/@?api=1&map_action=pano&viewpoint={lat_f},{lng_f}"
 
-    def guess_cc(lat: object, lng: object) -> str:
-        if _rg is None:
-            return ""
-        try:
-            lat_f = float(lat)
-            lng_f = float(lng)
-        except Exception:
-            return ""
-        key = (round(lat_f, 5), round(lng_f, 5))
-        if key in geo_cache:
-            return geo_cache[key]
-        try:
-            res = _rg.search((lat_f, lng_f), mode=1)
-            cc = ""
-            if isinstance(res, list) and res and isinstance(res[0], dict):
-                cc = str(res[0].get("cc") or "").upper()
-            geo_cache[key] = cc
-            return cc
-        except Exception:
-            geo_cache[key] = ""
-            return ""
-
     rows: list[dict[str, object]] = []
     for g in games:
         raw = getattr(g, "raw", {}) or {}
@@ -472,17 +396,6 @@ def _classic_country_round_rows(
             if gn not in map_set:
                 continue
 
-        rounds = raw.get("rounds")
-        guesses = raw.get("guesses")
-        if not isinstance(guesses, list):
-            player = raw.get("player")
-            if isinstance(player, dict):
-                guesses = player.get("guesses")
-
-        if not isinstance(rounds, list) or not isinstance(guesses, list):
-            continue
-        n = min(len(rounds), len(guesses))
-
         dt = _parse_iso_datetime(getattr(g, "time", "") or "")
         date = dt.date().isoformat() if dt else ""
         mode_label = _classic_mode_label(raw)
@@ -491,50 +404,29 @@ def _classic_country_round_rows(
 
         ts = dt.timestamp() if dt else float("-inf")
 
-        for i in range(n):
-            r = rounds[i]
-            gu = guesses[i]
-            if not isinstance(r, dict) or not isinstance(gu, dict):
-                continue
-            correct = str(r.get("streakLocationCode") or "").upper()
+        for r in getattr(g, "rounds", []) or []:
+            correct = r.country_code.upper()
             if correct != target_cc:
                 continue
 
-            sv_url = streetview_url(r.get("panoId"), r.get("lat"), r.get("lng"))
+            sv_url = streetview_url(r.pano_id, r.lat, r.lng)
 
-            g_cc = guess_cc(gu.get("lat"), gu.get("lng"))
+            g_cc = (r.guess_country_code or "").upper()
             if not g_cc:
                 correct_flag = "?"
             else:
                 correct_flag = "Y" if g_cc == correct else "N"
 
-            score: Optional[float]
-            try:
-                raw_score = gu.get("roundScoreInPoints")
-                if raw_score is None:
-                    raw_score = gu.get("score")
-                score = float(raw_score) if raw_score is not None else None
-            except Exception:
-                score = None
-
-            distance_km = None
-            dist_m = gu.get("distanceInMeters")
-            if dist_m is None:
-                dist_m = gu.get("distance")
-            try:
-                if dist_m is not None:
-                    distance_km = float(dist_m) / 1000.0
-            except Exception:
-                distance_km = None
+            distance_km = r.distance_meters / 1000.0 if r.distance_meters is not None else None
 
             rows.append(
                 {
                     "date": date,
                     "mode": mode_label,
-                    "score": score,
+                    "score": r.score,
                     "correct": correct_flag,
                     "distance_km": distance_km,
-                    "round": i + 1,
+                    "round": r.round_number,
                     "game_url": game_url,
                     "sv_url": sv_url,
                     "_ts": ts,
@@ -626,39 +518,26 @@ def _wants_json(request: Request) -> bool:
     return "application/json" in accept
 
 
+def _team_duel_mode(game: dict) -> str:
+    return str(game.get("mode") or "").strip().lower()
+
+
 def _team_duel_teammates_for_user(repo_root: Path, username: str) -> list[str]:
     output_dir = repo_root / "output"
     if not username or not output_dir.exists():
         return []
-    pattern = re.compile(rf"^{re.escape(username)}_(?P<teammate>.+)_ranked_team_duels\.json$")
     teammates: set[str] = set()
-    for p in output_dir.glob(f"{username}_*_ranked_team_duels.json"):
-        m = pattern.match(p.name)
-        if not m:
-            continue
-        teammate = (m.group("teammate") or "").strip()
+    for teammate, path in team_duel_paths(username, str(output_dir)).items():
+        teammate = (teammate or "").strip()
         if not teammate:
             continue
 
-        max_mode_count = 0
-        try:
-            raw = json.loads(p.read_text(encoding="utf-8"))
-            games = raw
-            if isinstance(raw, dict) and isinstance(raw.get("games"), list):
-                games = raw.get("games")
-
-            if isinstance(games, list):
-                mode_counts: dict[str, int] = {}
-                for g in games:
-                    if not isinstance(g, dict):
-                        continue
-                    mode = str(g.get("mode") or "").strip().lower()
-                    if not mode:
-                        continue
-                    mode_counts[mode] = mode_counts.get(mode, 0) + 1
-                max_mode_count = max(mode_counts.values(), default=0)
-        except Exception:
-            max_mode_count = 0
+        mode_counts: dict[str, int] = {}
+        for mode in load_games(path, _team_duel_mode):
+            if not mode:
+                continue
+            mode_counts[mode] = mode_counts.get(mode, 0) + 1
+        max_mode_count = max(mode_counts.values(), default=0)
 
         if max_mode_count >= TEAM_DUEL_PARTNER_MIN_GAMES:
             teammates.add(teammate)
@@ -681,57 +560,13 @@ def _parse_mode(mode: Optional[str]) -> Optional[GameMode]:
 def _available_games_count(username: str, include: str, mode: Optional[str], max_days: Optional[int]) -> int:
     if not username:
         return 0
-    player_data = PlayerData(username)
-
-    if isinstance(include, str) and include.startswith("team:"):
-        teammate = include.split(":", 1)[1].strip()
-        team_map = getattr(player_data, "ranked_team_duel_games", {}) or {}
-        games = list(team_map.get(teammate, []))
-    elif include == "ranked":
-        games = list(getattr(player_data, "ranked_duel_games", []) or [])
-    elif include == "unranked":
-        games = list(getattr(player_data, "unranked_duel_games", []) or [])
-    elif include == "party":
-        games = list(getattr(player_data, "party_duel_games", []) or [])
-    else:
-        games = list(getattr(player_data, "ranked_duel_games", []) or []) + list(
-            getattr(player_data, "unranked_duel_games", []) or []
-        )
-
-    gm = _parse_mode(mode)
-    if gm is not None:
-        games = [g for g in games if getattr(g, "mode", None) == gm]
-
-
-    if max_days is not None:
-        if max_days <= 0:
-            return 0
-
-        from datetime import datetime, timezone
-
-        def _parse_ts(ts: str) -> float:
-            if not ts:
-                return float("-inf")
-            try:
-                import re
-
-                s = ts.replace("Z", "+00:00")
-                m = re.match(r"^(.*T\d\d:\d\d:\d\d)\.(\d+)([+-]\d\d:\d\d)$", s)
-                if m:
-                    base, frac, offset = m.group(1), m.group(2), m.group(3)
-                    frac = (frac[:6]).ljust(6, "0")
-                    s = f"{base}.{frac}{offset}"
-                return datetime.fromisoformat(s).timestamp()
-            except Exception:
-                return float("-inf")
-
-        cutoff = datetime.now(timezone.utc).timestamp() - (float(max_days) * 86400.0)
-
-        def game_ts(g) -> float:
-            return _parse_ts(getattr(g, "start_time", "") or getattr(g, "time", "") or "")
-
-        games = [g for g in games if game_ts(g) >= cutoff]
-    return len(games)
+    if max_days is not None and max_days <= 0:
+        return 0
+    try:
+        parse_include(include)
+    except ValueError:
+        include = "both"
+    return len(PlayerData(username).select_duel_games(include, _parse_mode(mode), max_days))
 
 
 _ANALYSE_ROW_RE = re.compile(
@@ -860,6 +695,8 @@ def create_app() -> FastAPI:
     templates = Jinja2Templates(directory=str(Path(__file__).resolve().parent / "templates"))
 
     app = FastAPI(title="GeoGuessr Stats")
+    # Parsed game files are kept between requests and reused until a file changes on disk.
+    game_cache = enable_game_cache()
 
     @app.get("/player-summary")
     def player_summary(username: str):
@@ -1427,7 +1264,7 @@ def create_app() -> FastAPI:
         )
 
     @app.post("/update-data", response_class=HTMLResponse)
-    def update_data(
+    async def update_data(
         request: Request,
         username: str = Form(...),
     ):
@@ -1438,29 +1275,40 @@ def create_app() -> FastAPI:
         args.username = username
         args.max_games = None
         args.overwrite = False
-
-        stdout_buf = io.StringIO()
-        stderr_buf = io.StringIO()
-        with redirect_stdout(stdout_buf), redirect_stderr(stderr_buf):
-            try:
-                fetch_command(args)
-            except SystemExit:
-                pass
-        stdout = stdout_buf.getvalue()
-        stderr = stderr_buf.getvalue()
-        stats = getattr(args, "_fetch_stats", None)
+        # The fetch's messages are collected for this request alone: it runs on the app's event loop
+        # (rather than holding a worker thread), so redirecting the process-wide stdout would also capture
+        # whatever else runs meanwhile.
+        args.output = io.StringIO()
+        from geoguessr.geoguessr import FeedRequestError
+
+        stats = None
+        error = ""
+        try:
+            stats = await fetch_command_async(args)
+        except FeedRequestError as e:
+            error = str(e)
+        finally:
+            # Don't rely on mtimes alone to notice the files the fetch just wrote.
+            game_cache.clear()
+        stdout = args.output.getvalue()
+        stderr = error
 
         if _wants_json(request):
             return JSONResponse(
                 {
-                    "ok": True,
+                    "ok": not error,
                     "username": username,
                     "stdout": stdout.strip(),
                     "stderr": stderr.strip(),
+                    "error": error,
                     "stats": stats,
                 }
             )
 
+        # Building the page reads the updated files, so keep it off the event loop.
+        return await run_in_threadpool(_render_update, request, username, stdout, stderr, stats)
+
+    def _render_update(request: Request, username: str, stdout: str, stderr: str, stats: Optional[dict]):
         analyse_available_games = _available_games_count(username, "both", None, None)
         country_available_games = analyse_available_games
 
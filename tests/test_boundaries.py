@@ -0,0 +1,86 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from geoguessr import boundaries
+from geoguessr.boundaries import CountryBoundaries, build_boundaries_file
+
+FIXTURE = os.path.join(os.path.dirname(__file__), "data", "country_boundaries.geojson")
+
+
+@pytest.fixture(scope="module")
+def index() -> CountryBoundaries:
+    return CountryBoundaries.from_geojson(FIXTURE)
+
+
+def test_features_without_a_code_are_skipped(index):
+    assert sorted(index.codes) == ["aa", "bb"]
+    # aa's polygon, and bb's mainland and island.
+    assert len(index.polygons) == 3
+
+
+def test_grid_classifies_cells(index):
+    rows, cols = index._cell(np.array([1.5, 5.5, 2.5, -10.0]), np.array([2.5, 2.5, 1.5, -10.0]))
+    assert index.grid[rows[0], cols[0]] == index.codes.index("aa")
+    assert index.grid[rows[1], cols[1]] == index.codes.index("bb")
+    # The cell holding the hole in aa needs a polygon test; open sea needs nothing.
+    assert index.grid[rows[2], cols[2]] == boundaries._BOUNDARY
+    assert index.grid[rows[3], cols[3]] == boundaries._EMPTY
+
+
+@pytest.mark.parametrize(
+    "point, code",
+    [
+        ((2.5, 1.5), "aa"),
+        ((2.5, 5.5), "bb"),
+        ((1.5, 2.5), ""),  # in the hole
+        ((2.0, 4.49), "aa"),
+        ((2.0, 4.51), "bb"),
+        ((0.4, 8.4), "bb"),  # island
+        ((0.47, 2.5), "aa"),  # 3 km off the coast
+        ((0.3, 2.5), ""),  # 22 km off the coast
+        ((4.01, 2.5), "aa"),  # 3 km off a coast in the grid row below
+        ((2.0, 7.01), "bb"),  # 3 km off a coast in the grid column to the west
+        ((4.03, 2.5), ""),  # 6 km off the coast
+        ((-10.0, -10.0), ""),
+        ((-19.5, -19.8), ""),  # polygon without a country code
+    ],
+)
+def test_lookup(index, point, code):
+    assert index.lookup([point]) == [code]
+
+
+def test_lookup_batches_keep_order(index):
+    points = [(2.5, 1.5), (1.5, 2.5), (2.5, 5.5), (1.4, 2.3), (0.4, 8.4)]
+    assert index.lookup(points) == ["aa", "", "bb", "", "bb"]
+    assert index.lookup([]) == []
+
+
+def test_build_boundaries_file(tmp_path, index):
+    path = str(tmp_path / "boundaries.geojson")
+    assert build_boundaries_file(FIXTURE, path, precision=1) == 2
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    assert [feature["properties"] for feature in data["features"]] == [{"ISO_A2": "AA"}, {"ISO_A2": "BB"}]
+    assert data["features"][0]["geometry"]["coordinates"][0][2] == [4.5, 4.0]
+
+    built = CountryBoundaries.from_geojson(path)
+    points = [(2.5, 1.5), (1.5, 2.5), (2.5, 5.5), (0.4, 8.4)]
+    assert built.lookup(points) == index.lookup(points)
+
+
+def test_signature_follows_file_contents(tmp_path):
+    path = str(tmp_path / "boundaries.geojson")
+    assert boundaries.boundaries_signature(path) == ""
+    build_boundaries_file(FIXTURE, path)
+    signature = boundaries.boundaries_signature(path)
+    assert signature and boundaries.boundaries_signature(path) == signature
+
+    # Same size and name, different outlines.
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text.replace("8.6", "8.7"))
+    assert boundaries.boundaries_signature(path) != signature
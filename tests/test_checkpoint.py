@@ -0,0 +1,134 @@
+import io
+import json
+import threading
+import time
+
+import pytest
+
+from benchmarks.mock_server import MockConfig, make_server
+from geoguessr.checkpoint import FetchCheckpoint
+from geoguessr.game import GameType
+from geoguessr.geoguessr import FEED_GAME_TYPES, FeedRequestError, FeedScan, Geoguessr
+from geoguessr.ratelimit import RateLimiter
+from geoguessr.usernames import UsernameCache
+
+PARAMS = {"username": "me", "max_games": 100}
+
+
+@pytest.fixture
+def mock():
+    config = MockConfig(games=30, page_size=10, latency_ms=0)
+    server = make_server(config)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def _fetch(url: str, checkpoint: FetchCheckpoint, username_cache: UsernameCache) -> Geoguessr:
+    return Geoguessr(
+        "me", "cookie", "", "", "", "", "",
+        max_games=100,
+        concurrency=2,
+        rate_limiter=RateLimiter(rate=1000.0, max_rate=1000.0, burst=10),
+        username_cache=username_cache,
+        checkpoint=checkpoint,
+        base_url=url,
+        game_server_url=url,
+        output=io.StringIO(),
+    )
+
+
+def test_interrupted_fetch_resumes_without_repeating_requests(tmp_path, mock, monkeypatch):
+    url = mock
+    path = str(tmp_path / "me_fetch_checkpoint.json")
+    username_cache = UsernameCache(str(tmp_path / "username_map.json"))
+    requested = []
+    make_request = Geoguessr._make_request
+
+    def flaky_make_request(self, endpoint, *args, **kwargs):
+        requested.append(endpoint)
+        # The second feed page fails (even after retries), once the 8 games of the first page that need
+        # details have been fetched.
+        if "paginationToken=10" in endpoint and len([e for e in requested if "/feed/" in e]) == 2:
+            deadline = time.monotonic() + 10
+            while sum(map(len, self.checkpoint.details.values())) < 8 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            return None
+        return make_request(self, endpoint, *args, **kwargs)
+
+    monkeypatch.setattr(Geoguessr, "_make_request", flaky_make_request)
+
+    with pytest.raises(FeedRequestError):
+        _fetch(url, FetchCheckpoint(path, PARAMS), username_cache)
+    with open(path, "r", encoding="utf-8") as f:
+        saved = json.load(f)
+    assert saved["pages_fetched"] == 1
+    fetched_ids = {key for games in saved["details"].values() for key in games}
+    assert len(fetched_ids) == 8
+
+    requested.clear()
+    checkpoint = FetchCheckpoint.load(path, PARAMS)
+    assert checkpoint.resumed
+    geo = _fetch(url, checkpoint, username_cache)
+
+    # No profile, no first feed page, and no game whose details were already saved.
+    assert not [endpoint for endpoint in requested if endpoint.endswith("/api/v3/profiles")]
+    assert [endpoint for endpoint in requested if "/feed/" in endpoint] == [
+        f"{url}/api/v4/feed/private?paginationToken=10",
+        f"{url}/api/v4/feed/private?paginationToken=20",
+    ]
+    assert not [endpoint for endpoint in requested if endpoint.rsplit("/", 1)[1] in fetched_ids]
+
+    # Every game of the feed was found once, across both runs.
+    assert len(geo.daily_challenge_games) == len(geo.standard_games) == 6
+    assert len(geo.ranked_duel_games) == len(geo.unranked_duel_games) == 6
+    assert sum(len(games) for games in geo.ranked_team_duel_games.values()) == 6
+
+
+def test_checkpoint_for_other_parameters_is_ignored(tmp_path):
+    path = str(tmp_path / "me_fetch_checkpoint.json")
+    checkpoint = FetchCheckpoint(path, PARAMS)
+    checkpoint.user_id = "me-id"
+    checkpoint.save()
+
+    assert FetchCheckpoint.load(path, PARAMS).resumed
+    other = FetchCheckpoint.load(path, {**PARAMS, "max_games": 10})
+    assert not other.resumed and other.user_id == ""
+
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('{"version": 1, "params": ')
+    assert not FetchCheckpoint.load(path, PARAMS).resumed
+
+
+def test_feed_progress_and_details_round_trip(tmp_path):
+    path = str(tmp_path / "me_fetch_checkpoint.json")
+    scan = FeedScan({game_type: "" for game_type in FEED_GAME_TYPES}, 100)
+    page = {game_type: [] for game_type in FEED_GAME_TYPES}
+    page[GameType.RANKED_DUELS] = ["duel1", "duel2"]
+    page[GameType.STANDARD] = [{"game_token": "std1", "time": "2024-01-02T00:00:00Z"}]
+    scan.add_page(page, "next")
+
+    checkpoint = FetchCheckpoint(path, PARAMS)
+    scan.record(checkpoint)
+    checkpoint.save()
+
+    resumed = FetchCheckpoint.load(path, PARAMS)
+    restored = FeedScan({game_type: "" for game_type in FEED_GAME_TYPES}, 100)
+    games = restored.restore(resumed)
+    assert restored.token == "next" and restored.pages_fetched == 1 and restored.total_game_ids == 3
+    assert (GameType.RANKED_DUELS, "duel2") in games
+    assert restored.games[GameType.STANDARD] == page[GameType.STANDARD]
+    assert resumed.get_details(GameType.RANKED_DUELS, "duel1") is None
+
+
+def test_detail_failures_are_counted_across_fetches(tmp_path):
+    path = str(tmp_path / "me_fetch_checkpoint.json")
+    checkpoint = FetchCheckpoint(path, PARAMS)
+    assert checkpoint.record_failed_details(["a", "b"]) == {"a": 1, "b": 1}
+    checkpoint.save()
+
+    resumed = FetchCheckpoint.load(path, PARAMS)
+    assert resumed.record_failed_details(["b"]) == {"b": 2}
+    assert resumed.detail_failures == {"a": 1, "b": 2}
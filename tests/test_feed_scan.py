@@ -0,0 +1,77 @@
+from geoguessr.game import GameType
+from geoguessr.geoguessr import FEED_GAME_TYPES, FeedScan
+
+
+def _page(duels=(), standard=()) -> dict:
+    page = {game_type: [] for game_type in FEED_GAME_TYPES}
+    page[GameType.RANKED_DUELS] = list(duels)
+    page[GameType.STANDARD] = [{"game_token": token} for token in standard]
+    return page
+
+
+def _scan(last_duel: str = "", known=(), max_games: int = 100, older_than=None) -> FeedScan:
+    last_ids = {game_type: "" for game_type in FEED_GAME_TYPES}
+    last_ids[GameType.RANKED_DUELS] = last_duel
+    return FeedScan(last_ids, max_games, older_than=older_than, known_game_ids=set(known))
+
+
+def _ids(new_games) -> list[str]:
+    return [game["game_token"] if isinstance(game, dict) else game for _game_type, game in new_games]
+
+
+def test_stops_at_the_last_stored_game():
+    scan = _scan(last_duel="d3", known={"d3", "d2"})
+    assert _ids(scan.add_page(_page(["d5", "d4", "d3", "d2"]), "next")) == ["d5", "d4"]
+    assert scan.complete_types[GameType.RANKED_DUELS]
+    assert not scan.done  # Other game types may still have new games.
+
+
+def test_skips_stored_games_when_the_last_one_is_missing():
+    # d3 was the last stored duel, but it left the feed (or was moved to another category).
+    scan = _scan(last_duel="d3", known={"d4", "d2", "d1"})
+    assert _ids(scan.add_page(_page(["d6", "d5", "d4"]), "next")) == ["d6", "d5"]
+    assert not scan.done
+    assert _ids(scan.add_page(_page(["d2", "d1"]), "next")) == []
+    # A page of stored games only: everything further down the feed is stored too.
+    assert scan.done
+
+
+def test_stops_at_max_games_and_at_the_end_of_the_feed():
+    scan = _scan(max_games=3)
+    assert _ids(scan.add_page(_page(["d5", "d4"], ["s2", "s1"]), "next")) == ["s2", "s1", "d5"]
+    assert scan.done
+
+    scan = _scan()
+    scan.add_page(_page(["d2"]), None)
+    assert scan.done
+
+
+def _older_than(duel: str = "", standard: str = "") -> dict:
+    older_than = {game_type: "" for game_type in FEED_GAME_TYPES}
+    older_than[GameType.RANKED_DUELS] = duel
+    older_than[GameType.STANDARD] = standard
+    return older_than
+
+
+def test_backfill_skips_down_to_the_oldest_stored_game():
+    scan = _scan(known={"d4", "d3", "s2"}, older_than=_older_than(duel="d3", standard="s2"))
+    # Games newer than the stored ones are left to a normal fetch.
+    assert _ids(scan.add_page(_page(["d6", "d4"], ["s3"]), "next")) == []
+    assert _ids(scan.add_page(_page(["d3", "d2"], ["s2", "s1"]), "next")) == ["s1", "d2"]
+    assert scan.passed_oldest[GameType.RANKED_DUELS] and scan.passed_oldest[GameType.STANDARD]
+    # Backfilling keeps paging past pages of stored games.
+    assert not scan.done
+
+
+def test_backfill_when_the_oldest_stored_game_left_the_feed():
+    scan = _scan(known={"d5", "d4"}, older_than=_older_than(duel="d3"))
+    assert _ids(scan.add_page(_page(["d6", "d5"]), "next")) == []
+    assert scan.seen_stored[GameType.RANKED_DUELS] and not scan.passed_oldest[GameType.RANKED_DUELS]
+    # The first unstored game after the stored ones is older than all of them.
+    assert _ids(scan.add_page(_page(["d4", "d2", "d1"]), "next")) == ["d2", "d1"]
+    assert scan.passed_oldest[GameType.RANKED_DUELS]
+
+
+def test_backfill_of_a_type_with_nothing_stored_takes_every_game():
+    scan = _scan(known={"d1"}, older_than=_older_than(duel="d1"))
+    assert _ids(scan.add_page(_page(["d2", "d1"], ["s2", "s1"]), "next")) == ["s2", "s1"]
@@ -0,0 +1,108 @@
+import json
+
+import pytest
+
+from geoguessr.game import GameMode
+from geoguessr.sqlite_store import SqliteGameStore
+from geoguessr.storage import duel_games_path, read_games, save_games, write_games
+
+
+def _duel(day: int, country: str = "FR", mode: str = "Moving") -> dict:
+    return {
+        "game_type": "Duels",
+        "game_id": f"duel{day}",
+        "mode": mode,
+        "start_time": f"2024-01-{day:02d}T12:00:00.000Z",
+        "rounds": [{"country_code": country, "damage_dealt": 1000, "damage_taken": 500}],
+    }
+
+
+@pytest.fixture
+def store(tmp_path):
+    with SqliteGameStore(str(tmp_path / "games.sqlite"), output_dir=str(tmp_path)) as store:
+        yield store
+
+
+def _ids(store: SqliteGameStore, **filters) -> list[str]:
+    return [game.game_id for _category, game in store.select_duel_games("me", ["ranked"], **filters)]
+
+
+def _game_rows(store: SqliteGameStore) -> int:
+    return store._db.execute("SELECT count(*) FROM games").fetchone()[0]
+
+
+def test_appended_games_are_imported_on_their_own(tmp_path, store):
+    path = duel_games_path("me", "ranked", str(tmp_path))
+    write_games(path, [_duel(2), _duel(1)])
+    assert store.sync("me", ["ranked"]) == 2
+    assert store.sync("me", ["ranked"]) == 0
+
+    stored = read_games(path)
+    assert save_games(path, [_duel(4), _duel(3), *stored], stored) == 2
+    assert store.sync("me", ["ranked"]) == 2
+    assert _ids(store) == ["duel4", "duel3", "duel2", "duel1"]
+    assert _game_rows(store) == 4
+
+
+def test_partial_last_line_waits_for_the_rest(tmp_path, store):
+    path = duel_games_path("me", "ranked", str(tmp_path))
+    write_games(path, [_duel(1)])
+    line = json.dumps(_duel(2)) + "\n"
+    # A fetch in the middle of appending a game.
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(line[:20])
+    assert store.sync("me", ["ranked"]) == 1
+
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(line[20:])
+    assert store.sync("me", ["ranked"]) == 1
+    assert _ids(store) == ["duel2", "duel1"]
+
+
+def test_rewritten_file_is_imported_again(tmp_path, store):
+    path = duel_games_path("me", "ranked", str(tmp_path))
+    write_games(path, [_duel(3), _duel(2), _duel(1)])
+    store.sync("me", ["ranked"])
+
+    # An atomic rewrite (e.g. reparse or fetch --older): one game dropped, one changed.
+    write_games(path, [_duel(3), _duel(2, country="DE", mode="NoMove")])
+    assert store.sync("me", ["ranked"]) == 2
+    assert _ids(store) == ["duel3", "duel2"]
+    assert _ids(store, mode=GameMode.NO_MOVE) == ["duel2"]
+    assert _ids(store, country="DE") == ["duel2"] and _ids(store, country="FR") == ["duel3"]
+    assert _game_rows(store) == 2
+    assert store._db.execute("SELECT count(*) FROM rounds").fetchone()[0] == 2
+
+
+def test_file_rewritten_in_place_is_imported_again(tmp_path, store):
+    path = duel_games_path("me", "ranked", str(tmp_path))
+    write_games(path, [_duel(2), _duel(1)])
+    store.sync("me", ["ranked"])
+
+    # Same file, grown, but its imported part changed: not an append.
+    with open(path, "w", encoding="utf-8") as f:
+        for game in (_duel(5), _duel(6), _duel(7)):
+            f.write(json.dumps(game) + "\n")
+    assert store.sync("me", ["ranked"]) == 3
+    assert _ids(store) == ["duel7", "duel6", "duel5"]
+
+
+def test_deleted_file_drops_its_games(tmp_path, store):
+    path = duel_games_path("me", "ranked", str(tmp_path))
+    write_games(path, [_duel(1)])
+    store.sync("me", ["ranked"])
+
+    (tmp_path / "me_ranked_duels.jsonl").unlink()
+    assert store.sync("me", ["ranked"]) == 0
+    assert _ids(store) == [] and _game_rows(store) == 0
+
+
+def test_selection_filters(tmp_path, store):
+    write_games(duel_games_path("me", "ranked", str(tmp_path)), [_duel(3), _duel(2, mode="NoMove"), _duel(1)])
+    write_games(duel_games_path("me", "unranked", str(tmp_path)), [_duel(4)])
+    assert _ids(store, max_games=2) == ["duel3", "duel2"]
+    assert [
+        (category, game.game_id)
+        for category, game in store.select_duel_games("me", ["ranked", "unranked"], max_games=2)
+    ] == [("unranked", "duel4"), ("ranked", "duel3")]
+    assert _ids(store, mode=GameMode.MOVING) == ["duel3", "duel1"]
@@ -0,0 +1,90 @@
+import json
+
+from geoguessr.storage import games_path, legacy_path, read_games, save_games, write_games
+
+
+def _lines(path: str) -> list[dict]:
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f.read().splitlines()]
+
+
+def test_save_appends_new_games(tmp_path):
+    path = str(tmp_path / "me_standard_games.jsonl")
+    write_games(path, [{"id": 2}, {"id": 1}])
+    stored = read_games(path)
+    assert stored == [{"id": 2}, {"id": 1}]
+
+    assert save_games(path, [{"id": 4}, {"id": 3}, *stored], stored) == 2
+    # Oldest first on disk, newest first when read.
+    assert [record["id"] for record in _lines(path)] == [1, 2, 3, 4]
+    assert [record["id"] for record in read_games(path)] == [4, 3, 2, 1]
+
+
+def test_save_without_new_games_leaves_the_file(tmp_path):
+    path = str(tmp_path / "me_standard_games.jsonl")
+    write_games(path, [{"id": 1}])
+    stored = read_games(path)
+    assert save_games(path, list(stored), stored) == 0
+    assert _lines(path) == [{"id": 1}]
+
+
+def test_save_rewrites_when_stored_games_change(tmp_path):
+    path = str(tmp_path / "me_standard_games.jsonl")
+    write_games(path, [{"id": 2}, {"id": 1}])
+
+    # Games added behind the stored ones (fetch --older).
+    stored = read_games(path)
+    assert save_games(path, [*stored, {"id": 0}], stored) == -1
+    assert [record["id"] for record in read_games(path)] == [2, 1, 0]
+
+    # A stored game dropped.
+    stored = read_games(path)
+    assert save_games(path, [{"id": 3}, stored[0], stored[2]], stored) == -1
+    assert [record["id"] for record in read_games(path)] == [3, 2, 0]
+
+    # Stored games changed in place.
+    stored = read_games(path)
+    stored[0]["rounds"] = []
+    assert save_games(path, [{"id": 4}, *stored], stored, changed=True) == -1
+    assert read_games(path)[1] == {"id": 3, "rounds": []}
+
+
+def test_save_rewrites_when_the_file_no_longer_matches(tmp_path):
+    path = str(tmp_path / "me_standard_games.jsonl")
+    write_games(path, [{"id": 1}])
+    stored = read_games(path)
+    # Another process appended a game since `stored` was read.
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"id":2}\n')
+    assert save_games(path, [{"id": 3}, *stored], stored) == -1
+    assert [record["id"] for record in read_games(path)] == [3, 1]
+
+
+def test_truncated_last_record_is_ignored_and_dropped_on_append(tmp_path):
+    path = str(tmp_path / "me_standard_games.jsonl")
+    write_games(path, [{"id": 2}, {"id": 1}])
+    # A crash in the middle of an append.
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"id":3,"rou')
+    stored = read_games(path)
+    assert stored == [{"id": 2}, {"id": 1}]
+
+    assert save_games(path, [{"id": 4}, *stored], stored) == 1
+    assert [record["id"] for record in _lines(path)] == [1, 2, 4]
+
+
+def test_legacy_file_is_read_and_converted(tmp_path):
+    output_dir = str(tmp_path)
+    path = games_path("me", "ranked_duels", output_dir)
+    assert path.endswith("me_ranked_duels.jsonl")
+    with open(legacy_path(path), "w", encoding="utf-8") as f:
+        json.dump([{"id": 2}, {"id": 1}, "not a game"], f, indent=2)
+
+    stored = read_games(path)
+    assert stored == [{"id": 2}, {"id": 1}]
+
+    # The games are all still there, but the file is in the old format.
+    assert save_games(path, [{"id": 3}, *stored], stored) == -1
+    assert [record["id"] for record in _lines(path)] == [1, 2, 3]
+    assert not (tmp_path / "me_ranked_duels.json").exists()
+    assert [record["id"] for record in read_games(path)] == [3, 2, 1]
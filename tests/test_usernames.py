@@ -0,0 +1,92 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from geoguessr.usernames import UsernameCache
+
+
+def test_entries_expire_after_the_ttl(tmp_path):
+    path = str(tmp_path / "username_map.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({
+            "fresh": {"name": "Fresh", "fetched": time.time() - 10},
+            "stale": {"name": "Stale", "fetched": time.time() - 1000},
+        }, f)
+    cache = UsernameCache(path, ttl_secs=100)
+
+    assert cache.unresolved(["fresh", "stale", "new", "new", ""]) == ["stale", "new"]
+    # A stale name is still used until it has been looked up again.
+    assert cache.get("stale") == "Stale"
+    assert cache.get("new") is None
+
+    cache.set("stale", "Renamed")
+    assert cache.unresolved(["stale"]) == []
+    assert cache.get("stale") == "Renamed"
+
+
+def test_flat_format_is_read_as_fresh_except_failed_lookups(tmp_path):
+    path = str(tmp_path / "username_map.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"a": "Alice", "b": "b"}, f)
+    cache = UsernameCache(path)
+
+    assert cache.unresolved(["a", "b"]) == ["b"]
+    cache.set("b", "Bob")
+    cache.save()
+    with open(path, "r", encoding="utf-8") as f:
+        saved = json.load(f)
+    assert {user_id: entry["name"] for user_id, entry in saved.items()} == {"a": "Alice", "b": "Bob"}
+
+
+def test_save_merges_entries_written_by_another_process(tmp_path):
+    path = str(tmp_path / "username_map.json")
+    first = UsernameCache(path)
+    second = UsernameCache(path)
+    first.set("a", "Alice")
+    first.save()
+    second.set("b", "Bob")
+    second.save()
+
+    assert UsernameCache(path).unresolved(["a", "b"]) == []
+
+
+def test_concurrent_lookups_of_an_id_share_one_request(tmp_path):
+    cache = UsernameCache(str(tmp_path / "username_map.json"))
+    calls = []
+    started = threading.Event()
+    release = threading.Event()
+
+    def lookup():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "Alice"
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        owner = executor.submit(cache.get_or_lookup, "a", lookup)
+        started.wait(5)
+        waiters = [executor.submit(cache.get_or_lookup, "a", lookup) for _ in range(3)]
+        # The waiters have joined the lookup under way before it finishes.
+        deadline = time.monotonic() + 5
+        while cache.shared < 3 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        release.set()
+        names = [owner.result(), *(waiter.result() for waiter in waiters)]
+
+    assert names == ["Alice"] * 4
+    assert len(calls) == 1 and cache.shared == 3
+    # Resolved ids are answered from the cache from then on.
+    assert cache.get_or_lookup("a", lookup) == "Alice" and len(calls) == 1
+
+
+def test_failed_lookup_is_shared_and_retried_later(tmp_path):
+    cache = UsernameCache(str(tmp_path / "username_map.json"))
+    assert cache.begin_lookup("a") is None
+    pending = cache.begin_lookup("a")
+    assert pending is not None and not pending.done()
+
+    cache.finish_lookup("a", None)
+    assert pending.result() is None
+    assert cache.unresolved(["a"]) == ["a"]
+    assert cache.begin_lookup("a") is None